@@ -0,0 +1,211 @@
+"""
+Detección de anomalías estadísticas en la serie horaria de cada unidad (config.VALIDACIONES_ANOMALIAS):
+valores atípicos frente a la mediana del mismo periodo en los días vecinos, medidores congelados en
+un mismo valor (línea plana) y cambios bruscos de nivel (escalón). Las filas se ordenan una vez por
+(Unidad, Fecha, Periodo) y cada detector es una pasada con ventanas móviles de pandas o con
+diferencias de NumPy sobre la serie de cada unidad, sin recorrer las filas en Python
+"""
+import time
+import logging
+import numpy as np
+import pandas as pd
+from config import RANGOS, VALIDACIONES_ANOMALIAS, COLUMNAS_ANOMALIAS, PARAMETROS_ANOMALIAS
+from cross_row_validation import COLUMNAS_CLAVE, codificar_clave
+from numeric_coercion import valores_numericos
+from error_matrix import MatrizErrores
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# Factor que convierte la MAD en una estimación de la desviación estándar de datos normales
+ESCALA_MAD = 1.4826
+
+
+def _reglas_anomalias(parametros):
+    """Texto de la regla incumplida de cada detector"""
+    return {
+        'atipicos': f"Dentro de {parametros['umbral_atipico']:g} MAD de la mediana del mismo periodo "
+                    f"en {parametros['ventana_dias']} días de la unidad",
+        'linea_plana': f"Sin repetir el mismo valor {parametros['periodos_linea_plana']} periodos seguidos",
+        'escalon': f"Sin cambios de nivel mayores a {parametros['umbral_escalon']:g} MAD "
+                   f"entre {parametros['ventana']} periodos"
+    }
+
+
+def columnas_anomalias(columnas, validaciones=None):
+    """
+    Columnas de la hoja que necesita la detección de anomalías (la clave y las series numéricas)
+
+    Args:
+        columnas: Columnas de la hoja
+        validaciones (list): Detectores a ejecutar; None usa config.VALIDACIONES_ANOMALIAS
+
+    Returns:
+        list: Columnas a cargar, vacía si no hay detectores o falta alguna columna de la clave
+    """
+    validaciones = VALIDACIONES_ANOMALIAS if validaciones is None else validaciones
+    if not validaciones or any(columna not in columnas for columna in COLUMNAS_CLAVE):
+        return []
+    return list(COLUMNAS_CLAVE) + [columna for columna in COLUMNAS_ANOMALIAS if columna in columnas]
+
+
+def _estacional(serie, periodos, ventana_dias, periodos_por_dia):
+    """
+    Mediana móvil centrada de cada fila entre las filas del mismo periodo en los `ventana_dias`
+    días vecinos, para que el ciclo diario no se confunda con la dispersión, y escala del ruido:
+    MAD de los residuos de la unidad en esos mismos días (todos los periodos, para que la estimen
+    cientos de filas y no solo `ventana_dias`)
+
+    Returns:
+        tuple: (mediana, MAD) como arreglos alineados con la serie
+    """
+    minimo = max(ventana_dias // 2, 1)
+    mediana = serie.groupby(periodos, sort=False).rolling(ventana_dias, center=True, min_periods=minimo).median()
+    mediana = mediana.reset_index(level=0, drop=True).reindex(serie.index)
+    ventana = ventana_dias * periodos_por_dia
+    mad = (serie - mediana).abs().rolling(ventana, center=True, min_periods=ventana // 2).median()
+    return mediana.to_numpy(), mad.to_numpy()
+
+
+def _atipicos(valores, mediana, mad, umbral):
+    """
+    Valores a más de `umbral` MAD de su mediana estacional; las ventanas sin variación (MAD 0)
+    no se evalúan
+
+    Returns:
+        tuple: (máscara de atípicos, puntaje z robusto)
+    """
+    escala = ESCALA_MAD * mad
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (valores - mediana) / escala
+        return (escala > 0) & (np.abs(z) > umbral), z
+
+
+def _linea_plana(valores, periodos_minimos, valores_reposo):
+    """
+    Filas de las rachas de al menos `periodos_minimos` valores iguales consecutivos, salvo las de
+    un valor de reposo (0 con la unidad apagada)
+
+    Returns:
+        tuple: (máscara de filas en línea plana, largo de la racha de cada fila)
+    """
+    if len(valores) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+    # NaN nunca es igual al anterior, así que una celda vacía corta la racha
+    nueva = np.concatenate(([True], valores[1:] != valores[:-1]))
+    racha = np.cumsum(nueva) - 1
+    largo = np.bincount(racha)[racha]
+    plana = (largo >= periodos_minimos) & np.isfinite(valores) & ~np.isin(valores, valores_reposo)
+    return plana, largo
+
+
+def _escalones(serie, mad, ventana, umbral):
+    """
+    Cambios de nivel: la mediana de los `ventana` periodos que empiezan en la fila se aleja de la
+    de los `ventana` anteriores más de `umbral` MAD del ruido de la unidad. Con ventanas de días
+    completos el ciclo diario no cambia las medianas, y solo se comparan ventanas sin celdas
+    vacías ni de reposo, así que los arranques y paradas no cuentan. De cada tramo de filas
+    consecutivas marcadas se reporta solo la del mayor salto
+
+    Returns:
+        tuple: (máscara de escalones, mediana anterior, mediana posterior)
+    """
+    mediana = serie.rolling(ventana).median()
+    antes = mediana.shift(1).to_numpy()
+    despues = mediana.shift(-(ventana - 1)).to_numpy()
+    salto = np.abs(despues - antes)
+    with np.errstate(invalid='ignore'):
+        marcada = (mad > 0) & (salto > umbral * ESCALA_MAD * mad) & np.isfinite(serie.to_numpy())
+    posiciones = np.flatnonzero(marcada)
+    if len(posiciones) == 0:
+        return marcada, antes, despues
+    tramo = np.cumsum(np.concatenate(([True], np.diff(posiciones) > 1)))
+    # dentro de cada tramo, orden descendente de salto: la primera fila es la del mayor
+    orden = np.lexsort((-salto[posiciones], tramo))
+    primera = np.concatenate(([True], tramo[orden][1:] != tramo[orden][:-1]))
+    escalon = np.zeros(len(marcada), dtype=bool)
+    escalon[posiciones[orden][primera]] = True
+    return escalon, antes, despues
+
+
+def validar_hoja_anomalias(df, validaciones=None, parametros=None):
+    """
+    Ejecuta los detectores de anomalías sobre la serie de cada unidad de una hoja completa
+
+    Args:
+        df: DataFrame de la hoja completa (o con al menos columnas_anomalias); su índice
+            determina la 'Fila de error'
+        validaciones (list): Detectores a ejecutar; None usa config.VALIDACIONES_ANOMALIAS
+        parametros (dict): Ventanas y umbrales; None usa config.PARAMETROS_ANOMALIAS
+
+    Returns:
+        MatrizErrores: Errores con una regla por detector y columna, en el formato de
+                       validar_dataframe, o None si no hay detectores, faltan columnas de la
+                       clave o ninguna columna de COLUMNAS_ANOMALIAS está en la hoja
+    """
+    validaciones = VALIDACIONES_ANOMALIAS if validaciones is None else validaciones
+    parametros = PARAMETROS_ANOMALIAS if parametros is None else parametros
+    columnas = columnas_anomalias(df.columns, validaciones)[len(COLUMNAS_CLAVE):]
+    if not columnas:
+        return None
+    for nombre in validaciones:
+        if nombre not in ('atipicos', 'linea_plana', 'escalon'):
+            raise ValueError(f"Detector de anomalías desconocido: {nombre}")
+
+    # filas con clave válida en orden de unidad y tiempo; la serie de cada unidad es un tramo contiguo
+    valida, unidades, dias, periodos = codificar_clave(df)
+    posiciones = np.flatnonzero(valida)
+    posiciones = posiciones[np.lexsort((periodos[posiciones], dias[posiciones], unidades[posiciones]))]
+    cortes = np.flatnonzero(np.diff(unidades[posiciones])) + 1
+    tramos = list(zip(np.concatenate(([0], cortes)).tolist(), np.concatenate((cortes, [len(posiciones)])).tolist()))
+    reglas = _reglas_anomalias(parametros)
+    reposo = parametros['valores_reposo']
+    periodos_por_dia = RANGOS['periodo'][1] - RANGOS['periodo'][0] + 1
+
+    tipo_comun = df.iloc[:0].to_numpy().dtype
+    numeros_columna = {}
+    columnas_reglas, errores = [], []
+    for nombre in validaciones:
+        for columna in columnas:
+            inicio = time.perf_counter()
+            if columna not in numeros_columna:
+                numeros_columna[columna] = valores_numericos(df[columna])[posiciones]
+            numeros = numeros_columna[columna]
+            mascara = np.zeros(len(posiciones), dtype=bool)
+            detalles = np.empty(len(posiciones), dtype=object)
+            for desde, hasta in tramos:
+                if nombre == 'linea_plana':
+                    marcada, largo = _linea_plana(numeros[desde:hasta], parametros['periodos_linea_plana'], reposo)
+                    detalle = [f"{n} periodos iguales" for n in largo[marcada].tolist()]
+                else:
+                    # una unidad apagada (o un valor infinito, que ya tiene su error de rango) no es
+                    # una anomalía ni entra en las medianas
+                    tramo = numeros[desde:hasta]
+                    serie = pd.Series(np.where(np.isin(tramo, reposo) | ~np.isfinite(tramo), np.nan, tramo))
+                    mediana, mad = _estacional(serie, periodos[posiciones[desde:hasta]], parametros['ventana_dias'],
+                                               periodos_por_dia)
+                    if nombre == 'atipicos':
+                        marcada, z = _atipicos(serie.to_numpy(), mediana, mad, parametros['umbral_atipico'])
+                        detalle = [f"mediana {m:.2f}, z {v:.1f}" for m, v in zip(mediana[marcada], z[marcada])]
+                    else:
+                        marcada, antes, despues = _escalones(serie, mad, parametros['ventana'],
+                                                             parametros['umbral_escalon'])
+                        detalle = [f"mediana antes {a:.2f}, después {d:.2f}"
+                                   for a, d in zip(antes[marcada], despues[marcada])]
+                mascara[desde:hasta] = marcada
+                detalles[desde + np.flatnonzero(marcada)] = detalle
+            filas = posiciones[mascara]
+            valores = df[columna].iloc[filas].to_numpy(dtype=tipo_comun)
+            errores.append((filas, np.full(len(filas), len(columnas_reglas), dtype=np.int64),
+                            [f"{valor} ({detalle})" for valor, detalle in zip(valores, detalles[mascara])],
+                            [reglas[nombre]] * len(filas)))
+            columnas_reglas.append(columna)
+            METRICAS.registrar_regla(columna, nombre, None, time.perf_counter() - inicio, len(df), len(filas))
+
+    posiciones_error = np.concatenate([filas for filas, _, _, _ in errores])
+    ids_regla = np.concatenate([ids for _, ids, _, _ in errores])
+    orden = np.lexsort((ids_regla, posiciones_error))
+    valores = np.array([v for _, _, vals, _ in errores for v in vals], dtype=object)
+    textos = np.array([t for _, _, _, txts in errores for t in txts], dtype=object)
+    return MatrizErrores(df.index, columnas_reglas, posiciones_error[orden], ids_regla[orden],
+                         valores[orden], textos[orden])
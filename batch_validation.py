@@ -0,0 +1,288 @@
+"""
+Validación por lotes: valida muchos libros (directorios, patrones glob o listas de
+archivos) en un pool de procesos, escribe los resultados de cada archivo en su propio
+directorio de salida y genera un resumen consolidado de errores por archivo y hoja
+"""
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import logging
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from config import HOJAS_POR_DEFECTO, ARCHIVO_METRICAS
+from main import parsear_argumentos as parsear_argumentos_archivo, ejecutar_validacion
+from parallel_validation import _inicializar_trabajador
+from metrics import METRICAS, RegistroMetricas
+from log_config import configurar_logging, detener_logging, LOGGER_DETALLE
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_ENTRADA = ('.xlsx', '.xlsm', '.parquet', '.csv')
+
+
+def expandir_entradas(entradas, directorio_salida=None):
+    """
+    Convierte directorios, patrones glob y rutas en la lista de archivos a validar
+
+    Args:
+        entradas (list): Directorios, patrones glob o archivos
+        directorio_salida (str): Directorio de resultados, cuyos archivos se excluyen
+
+    Returns:
+        list: Rutas de archivos sin repetir, en el orden en que se indicaron
+    """
+    salida = None if directorio_salida is None else os.path.abspath(directorio_salida)
+    archivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(os.path.join(entrada, nombre) for nombre in os.listdir(entrada))
+        elif glob.has_magic(entrada):
+            candidatos = sorted(glob.glob(entrada, recursive=True))
+        else:
+            candidatos = [entrada]
+        for ruta in candidatos:
+            nombre = os.path.basename(ruta)
+            # archivos de bloqueo de Excel abierto y resultados de ejecuciones anteriores
+            if nombre.startswith('~$') or not nombre.lower().endswith(EXTENSIONES_ENTRADA):
+                continue
+            if salida is not None and os.path.abspath(ruta).startswith(salida + os.sep):
+                continue
+            if ruta not in archivos:
+                archivos.append(ruta)
+    return archivos
+
+
+def asignar_directorio(ruta_archivo, directorio_salida, duenos):
+    """
+    Directorio de resultados de un archivo: el nombre del archivo sin extensión, con un sufijo
+    numérico si ya es de otro archivo (p. ej. 2024/enero.xlsx y 2025/enero.xlsx, o enero.xlsx y
+    enero.parquet), para que dos archivos nunca escriban en el mismo directorio
+
+    Args:
+        ruta_archivo (str): Archivo a validar
+        directorio_salida (str): Directorio de resultados del lote
+        duenos (dict): Archivo (ruta absoluta) de cada directorio ya asignado; se actualiza
+
+    Returns:
+        str: Directorio de resultados del archivo; el mismo archivo recibe siempre el mismo
+    """
+    archivo = os.path.abspath(ruta_archivo)
+    base = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    directorio, numero = os.path.join(directorio_salida, base), 2
+    while duenos.get(os.path.normcase(directorio), archivo) != archivo:
+        directorio, numero = os.path.join(directorio_salida, f"{base}_{numero}"), numero + 1
+    duenos[os.path.normcase(directorio)] = archivo
+    return directorio
+
+
+def validar_opciones_archivo(opciones):
+    """
+    Comprueba que las opciones de main.py se puedan aplicar a cada archivo de un lote
+
+    Args:
+        opciones (list): Opciones de main.py (p. ej. ['--incremental'])
+
+    Raises:
+        ValueError: Si alguna opción no es válida o no se puede usar dentro de un proceso del pool
+    """
+    if any(opcion.startswith(('--archivo', '--directorio-salida', '--hojas')) for opcion in opciones):
+        raise ValueError(f"opciones no válidas para el lote: {' '.join(opciones)}")
+    try:
+        args = parsear_argumentos_archivo(list(opciones))
+    except SystemExit:
+        raise ValueError(f"opciones no válidas: {' '.join(opciones)}")
+    if args.workers > 1:
+        raise ValueError("dentro del lote cada archivo se valida en un solo proceso; use --workers del lote")
+
+
+def validar_archivo_lote(ruta_archivo, hojas, directorio_archivo, opciones=()):
+    """
+    Valida un archivo dentro del lote con las mismas opciones que main.py
+
+    Args:
+        ruta_archivo (str): Archivo a validar
+        hojas (list): Hojas a validar
+        directorio_archivo (str): Directorio de resultados propio del archivo (asignar_directorio)
+        opciones (tuple): Opciones adicionales de main.py (p. ej. ('--incremental',))
+
+    Returns:
+        dict: 'archivo', 'directorio', 'hojas' (totales por hoja), 'estado', 'segundos' y las
+              métricas del archivo
+    """
+    METRICAS.reiniciar()
+    inicio = time.perf_counter()
+    resultado = {'archivo': ruta_archivo, 'directorio': directorio_archivo, 'hojas': {}, 'estado': 'ok'}
+    salida = io.StringIO()
+    try:
+        try:
+            args = parsear_argumentos_archivo(['--archivo', ruta_archivo, '--hojas', *hojas,
+                                               '--directorio-salida', directorio_archivo,
+                                               *opciones])
+        except SystemExit:
+            # argparse ya escribió el motivo en stderr (p. ej. --streaming con un .csv)
+            raise ValueError("opciones no válidas para este archivo")
+        # los mensajes de cada archivo se descartan para no mezclarlos entre procesos; el log los conserva
+        with redirect_stdout(salida):
+            totales = ejecutar_validacion(args)
+        if totales is None:
+            resultado['estado'] = 'archivo no encontrado'
+        else:
+            resultado['hojas'] = totales
+    except Exception as e:
+        resultado['estado'] = f"error: {str(e)}"
+        logger.error(f"Error al validar el archivo {ruta_archivo}: {str(e)}")
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    # copia de las métricas del archivo: METRICAS es global y con --workers 1 el siguiente archivo
+    # (y la suma del lote) la reinicia
+    resultado['metricas'] = RegistroMetricas()
+    resultado['metricas'].combinar(METRICAS)
+    return resultado
+
+
+def resumen_consolidado(resultados):
+    """
+    Returns:
+        pd.DataFrame: Una fila por archivo y hoja con sus totales de validación
+    """
+    filas = []
+    for resultado in resultados:
+        totales_por_hoja = resultado['hojas'] or {None: None}
+        for hoja, totales in totales_por_hoja.items():
+            totales = totales or {}
+            filas.append({
+                'Archivo': resultado['archivo'],
+                'Directorio': resultado['directorio'],
+                'Hoja': hoja,
+                'Filas': totales.get('filas'),
+                'Errores': totales.get('errores'),
+                'Filas con errores': totales.get('filas_con_errores'),
+                'Estado': resultado['estado'] if totales or hoja is None else 'hoja no validada',
+                'Segundos archivo': resultado['segundos']
+            })
+    return pd.DataFrame(filas)
+
+
+def guardar_resumen_consolidado(df_resumen, ruta_salida):
+    """Guarda el resumen del lote en un archivo Excel"""
+    try:
+        df_resumen.to_excel(ruta_salida, sheet_name='Resumen', index=False)
+        logger.info(f"Resumen del lote guardado correctamente en: {ruta_salida}")
+        print(f"Resumen del lote guardado correctamente en: {ruta_salida}")
+    except Exception as e:
+        mensaje = f"Error al guardar el resumen del lote {ruta_salida}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+
+
+def validar_lote(archivos, hojas, directorio_salida, workers, opciones=()):
+    """
+    Valida varios archivos en un pool de procesos, un archivo por tarea
+
+    Args:
+        archivos (list): Archivos a validar
+        hojas (list): Hojas a validar de cada archivo
+        directorio_salida (str): Directorio de resultados del lote
+        workers (int): Cantidad de procesos del pool
+        opciones (tuple): Opciones adicionales de main.py para cada archivo
+
+    Returns:
+        list: Resultados de validar_archivo_lote en el orden de los archivos
+    """
+    resultados = {}
+    duenos = {}
+    directorios = {ruta: asignar_directorio(ruta, directorio_salida, duenos) for ruta in archivos}
+    if workers == 1:
+        for ruta in archivos:
+            resultados[ruta] = validar_archivo_lote(ruta, hojas, directorios[ruta], opciones)
+            print(f"[{len(resultados)}/{len(archivos)}] {ruta}: {resultados[ruta]['estado']} "
+                  f"({resultados[ruta]['segundos']:.1f} s)")
+    else:
+        detalle = logging.getLogger(LOGGER_DETALLE).isEnabledFor(logging.WARNING)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_trabajador,
+                                 initargs=(detalle,)) as pool:
+            tareas = {pool.submit(validar_archivo_lote, ruta, hojas, directorios[ruta], opciones): ruta
+                      for ruta in archivos}
+            for tarea in as_completed(tareas):
+                ruta = tareas[tarea]
+                resultados[ruta] = tarea.result()
+                print(f"[{len(resultados)}/{len(archivos)}] {ruta}: {resultados[ruta]['estado']} "
+                      f"({resultados[ruta]['segundos']:.1f} s)")
+
+    # métricas del lote: suma de las de cada archivo
+    metricas = [resultado['metricas'] for resultado in resultados.values()]
+    METRICAS.reiniciar()
+    for registro in metricas:
+        METRICAS.combinar(registro)
+    return [resultados[ruta] for ruta in archivos]
+
+
+def parsear_argumentos(argv=None):
+    """
+    Lee las opciones de línea de comandos del modo por lotes
+
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+
+    Returns:
+        tuple: (argparse.Namespace con las opciones del lote, lista de opciones para cada archivo)
+    """
+    parser = argparse.ArgumentParser(
+        description="Validación por lotes de libros Excel",
+        epilog="Las opciones no reconocidas (p. ej. --incremental o --sin-snapshot) se aplican a cada archivo")
+    parser.add_argument('entradas', nargs='+',
+                        help="Directorios, patrones glob (entre comillas) o archivos .xlsx/.parquet/.csv")
+    parser.add_argument('--hojas', nargs='+', default=HOJAS_POR_DEFECTO,
+                        help="Hojas a validar de cada libro")
+    parser.add_argument('--directorio-salida', default='resultados_lote',
+                        help="Directorio de resultados; cada archivo escribe en un subdirectorio propio")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Cantidad de archivos que se validan a la vez")
+    parser.add_argument('--log-detallado', action='store_true',
+                        help="Registra en el log una línea por cada celda con error")
+    args, opciones = parser.parse_known_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser mayor o igual a 1")
+    # las opciones de cada archivo se validan aquí para no fallar dentro de los procesos
+    try:
+        validar_opciones_archivo(opciones)
+    except ValueError as e:
+        parser.error(str(e))
+    return args, opciones
+
+
+def main(argv=None):
+    """
+    Valida todos los archivos del lote y guarda el resumen consolidado
+
+    Returns:
+        int: 0 si todos los archivos se validaron, 1 si alguno falló o no hubo archivos
+    """
+    args, opciones = parsear_argumentos(argv)
+    listener = configurar_logging(detalle=args.log_detallado)
+    try:
+        archivos = expandir_entradas(args.entradas, args.directorio_salida)
+        if not archivos:
+            print("No se encontraron archivos para validar.")
+            logger.error("No se encontraron archivos para validar.")
+            return 1
+
+        print(f"Validando {len(archivos)} archivos con {min(args.workers, len(archivos))} procesos...")
+        os.makedirs(args.directorio_salida, exist_ok=True)
+        resultados = validar_lote(archivos, args.hojas, args.directorio_salida,
+                                  min(args.workers, len(archivos)), tuple(opciones))
+
+        df_resumen = resumen_consolidado(resultados)
+        print("\n" + df_resumen.to_string(index=False))
+        guardar_resumen_consolidado(df_resumen, os.path.join(args.directorio_salida, 'resumen_lote.xlsx'))
+        METRICAS.guardar_json(os.path.join(args.directorio_salida, ARCHIVO_METRICAS))
+        return 0 if all(resultado['estado'] == 'ok' for resultado in resultados) else 1
+    finally:
+        detener_logging(listener)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
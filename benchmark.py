@@ -0,0 +1,295 @@
+"""
+Banco de pruebas de rendimiento: genera libros sintéticos de distintos tamaños, mide
+por separado la carga, la validación con cada motor y cada escritor de resultados,
+y guarda los tiempos y picos de memoria en un archivo JSON comparable entre versiones
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import LOGGING_CONFIG, VERSION_REGLAS, RANGOS
+from validation_engine import ejecutar_motor
+from cross_row_validation import periodos_faltantes
+from file_operations import (cargar_libro_excel, guardar_errores_consolidados,
+                             guardar_filas_con_multiples_errores, guardar_datos_limpios, guardar_resultados)
+from log_config import configurar_logging, detener_logging
+from synthetic_data import generar_hoja, generar_hojas, guardar_libro_sintetico, MAX_FILAS_EXCEL
+
+logger = logging.getLogger(__name__)
+
+TAMANOS_POR_DEFECTO = [10000, 100000, 1000000, 5000000]
+
+
+def medir(funcion, *args, medir_memoria=True, **kwargs):
+    """
+    Ejecuta una etapa midiendo su duración y, opcionalmente, su pico de memoria con tracemalloc
+
+    Returns:
+        tuple: (resultado de la función, dict con 'segundos' y 'pico_memoria_mb')
+    """
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        # los mensajes de progreso de las etapas no se mezclan con el reporte del banco
+        with redirect_stdout(io.StringIO()):
+            resultado = funcion(*args, **kwargs)
+    finally:
+        duracion = time.perf_counter() - inicio
+        pico = None
+        if medir_memoria:
+            pico = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    return resultado, {'segundos': round(duracion, 4), 'pico_memoria_mb': None if pico is None else round(pico, 1)}
+
+
+def _validar_hojas(hojas, motor):
+    return {hoja: ejecutar_motor(df, motor) for hoja, df in hojas.items()}
+
+
+def _matrices_iguales(matrices_a, matrices_b):
+    """Compara los errores reportados y el conteo por fila de dos ejecuciones"""
+    for hoja, matriz in matrices_a.items():
+        otra = matrices_b[hoja]
+        if not np.array_equal(matriz.errores_por_fila, otra.errores_por_fila):
+            return False
+        if not matriz.a_dataframe_errores().equals(otra.a_dataframe_errores()):
+            return False
+    return True
+
+
+def verificar_periodos_faltantes(semilla=0):
+    """
+    Comprueba periodos_faltantes sobre una hoja sintética de diez días completos a la que se le
+    quita el día 2015-01-03 entero y una hora del 2015-01-06
+
+    Returns:
+        bool: True si se reportan exactamente esos dos días, el primero con todos sus periodos
+    """
+    df = generar_hoja(24 * 10, 'UG3.0', 0.0, semilla)
+    dias = pd.to_datetime(df['Fecha']).dt.normalize().to_numpy()
+    quinta_hora = df.index[dias == np.datetime64('2015-01-06')][4]
+    df = df[dias != np.datetime64('2015-01-03')].drop(index=quinta_hora)
+    reporte = periodos_faltantes(df, ['periodos_faltantes'])
+    minimo, maximo = RANGOS['periodo']
+    return (reporte['Fecha'].dt.strftime('%Y-%m-%d').tolist() == ['2015-01-03', '2015-01-06']
+            and reporte['Periodos faltantes'].tolist() == [", ".join(map(str, range(minimo, maximo + 1))),
+                                                           str(minimo + 4)])
+
+
+def ejecutar_caso(n_filas, tasa_errores, directorio, motores, max_filas_motor_filas,
+                  semilla=0, medir_memoria=True):
+    """
+    Ejecuta el banco de pruebas para un tamaño de datos
+
+    Args:
+        n_filas (int): Total de filas, repartidas entre G3.0 y G3.2
+        tasa_errores (float): Fracción de filas con valores inválidos
+        directorio (str): Directorio de los libros de entrada y salida
+        motores (list): Motores de validación a comparar
+        max_filas_motor_filas (int): Tamaño máximo en el que se ejecuta el motor 'filas'
+        semilla (int): Semilla de los datos sintéticos
+        medir_memoria (bool): Mide el pico de memoria de cada etapa (agrega sobrecarga a los tiempos)
+
+    Returns:
+        dict: Resultado del caso con sus etapas, omisiones y comparación entre motores
+    """
+    caso = {'filas': n_filas, 'tasa_errores': tasa_errores, 'etapas': {}, 'omitidas': {}}
+    etapas = caso['etapas']
+
+    hojas, etapas['generar'] = medir(generar_hojas, n_filas, tasa_errores, semilla, medir_memoria=medir_memoria)
+    cabe_en_excel = max(len(df) for df in hojas.values()) <= MAX_FILAS_EXCEL
+    motivo_excel = f"más de {MAX_FILAS_EXCEL} filas por hoja no caben en un libro Excel"
+
+    if cabe_en_excel:
+        ruta_entrada = os.path.join(directorio, f"benchmark_{n_filas}.xlsx")
+        _, etapas['preparar_libro'] = medir(guardar_libro_sintetico, hojas, ruta_entrada, medir_memoria=False)
+        hojas_cargadas, etapas['cargar'] = medir(cargar_libro_excel, ruta_entrada, list(hojas),
+                                                 usar_snapshot=False, medir_memoria=medir_memoria)
+        if any(df is None for df in hojas_cargadas.values()):
+            raise RuntimeError(f"No se pudo cargar el libro sintético {ruta_entrada}")
+        hojas = hojas_cargadas
+        os.remove(ruta_entrada)
+    else:
+        caso['omitidas']['cargar'] = motivo_excel
+
+    matrices = {}
+    for motor in motores:
+        if motor == 'filas' and n_filas > max_filas_motor_filas:
+            caso['omitidas']['validar_filas'] = f"más de {max_filas_motor_filas} filas (--max-filas-motor-filas)"
+            continue
+        matrices[motor], etapas[f'validar_{motor}'] = medir(_validar_hojas, hojas, motor,
+                                                            medir_memoria=medir_memoria)
+
+    if not matrices:
+        return caso
+    if len(matrices) > 1:
+        referencia = matrices[motores[0]]
+        caso['resultados_iguales'] = all(_matrices_iguales(referencia, m) for m in matrices.values())
+        base = etapas[f'validar_{motores[0]}']['segundos']
+        caso['aceleracion'] = {motor: round(base / etapas[f'validar_{motor}']['segundos'], 2)
+                               for motor in matrices if etapas[f'validar_{motor}']['segundos'] > 0}
+    caso['errores'] = int(sum(len(m) for m in next(iter(matrices.values())).values()))
+
+    if not cabe_en_excel:
+        for etapa in ('guardar_errores', 'guardar_multiples', 'guardar_limpios', 'guardar_resultados'):
+            caso['omitidas'][etapa] = motivo_excel
+        return caso
+
+    matrices = next(iter(matrices.values()))
+    errores_por_hoja = {hoja: m.a_dataframe_errores() for hoja, m in matrices.items()}
+    celdas_por_hoja = {hoja: m.celdas_con_errores() for hoja, m in matrices.items()}
+    rutas = [os.path.join(directorio, f"benchmark_{n_filas}_{nombre}.xlsx")
+             for nombre in ('errores', 'multiples', 'limpios')]
+
+    _, etapas['guardar_errores'] = medir(guardar_errores_consolidados, errores_por_hoja, rutas[0],
+                                         medir_memoria=medir_memoria)
+    _, etapas['guardar_multiples'] = medir(guardar_filas_con_multiples_errores, hojas, celdas_por_hoja, rutas[1],
+                                           medir_memoria=medir_memoria)
+    _, etapas['guardar_limpios'] = medir(guardar_datos_limpios, hojas, celdas_por_hoja, rutas[2],
+                                         medir_memoria=medir_memoria)
+    _, etapas['guardar_resultados'] = medir(guardar_resultados, hojas, matrices, *rutas,
+                                            medir_memoria=medir_memoria)
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    return caso
+
+
+def comparar_con_referencia(resultado, ruta_referencia, umbral):
+    """
+    Compara los tiempos con los de un archivo de resultados anterior
+
+    Args:
+        resultado (dict): Resultado de esta ejecución
+        ruta_referencia (str): JSON de una ejecución anterior
+        umbral (float): Cociente de tiempos a partir del cual una etapa se considera una regresión
+
+    Returns:
+        list: Regresiones encontradas (filas, etapa, segundos anteriores, segundos actuales)
+    """
+    with open(ruta_referencia, encoding='utf-8') as archivo:
+        referencia = json.load(archivo)
+    anteriores = {(caso['filas'], caso['tasa_errores']): caso['etapas'] for caso in referencia['casos']}
+    regresiones = []
+    for caso in resultado['casos']:
+        etapas_anteriores = anteriores.get((caso['filas'], caso['tasa_errores']), {})
+        for etapa, medida in caso['etapas'].items():
+            anterior = etapas_anteriores.get(etapa)
+            if anterior and anterior['segundos'] > 0 and medida['segundos'] / anterior['segundos'] > umbral:
+                regresiones.append((caso['filas'], etapa, anterior['segundos'], medida['segundos']))
+    return regresiones
+
+
+def imprimir_resumen(resultado):
+    """Muestra una tabla con los segundos de cada etapa por tamaño"""
+    etapas = []
+    for caso in resultado['casos']:
+        etapas.extend(etapa for etapa in caso['etapas'] if etapa not in etapas)
+    tabla = pd.DataFrame({caso['filas']: {etapa: caso['etapas'].get(etapa, {}).get('segundos')
+                                          for etapa in etapas}
+                          for caso in resultado['casos']})
+    print("\nSegundos por etapa y cantidad de filas:")
+    print(tabla.to_string(na_rep='-'))
+    for caso in resultado['casos']:
+        if 'resultados_iguales' in caso:
+            print(f"{caso['filas']} filas: resultados iguales entre motores = {caso['resultados_iguales']}, "
+                  f"aceleración = {caso['aceleracion']}")
+
+
+def parsear_argumentos(argv=None):
+    """
+    Lee las opciones de línea de comandos
+
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+
+    Returns:
+        argparse.Namespace: Opciones de ejecución
+    """
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento de la validación")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO,
+                        help="Total de filas de cada caso, repartidas entre G3.0 y G3.2")
+    parser.add_argument('--tasa-errores', type=float, default=0.01,
+                        help="Fracción de filas con valores inválidos")
+    parser.add_argument('--motores', nargs='+', default=['filas', 'vectorizado'],
+                        choices=['filas', 'vectorizado'],
+                        help="Motores a medir; el primero es la referencia de resultados y aceleración")
+    parser.add_argument('--max-filas-motor-filas', type=int, default=100000,
+                        help="Tamaño máximo en el que se ejecuta el motor por filas (iterrows)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--sin-memoria', action='store_true',
+                        help="No mide el pico de memoria, para tiempos sin la sobrecarga de tracemalloc")
+    parser.add_argument('--directorio', default='.',
+                        help="Directorio de los libros temporales del banco")
+    parser.add_argument('--salida', default='benchmark_resultados.json',
+                        help="Archivo JSON de resultados")
+    parser.add_argument('--referencia',
+                        help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument('--umbral-regresion', type=float, default=1.2,
+                        help="Cociente de tiempos a partir del cual una etapa se reporta como regresión")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Ejecuta todos los casos del banco de pruebas y guarda sus resultados
+
+    Returns:
+        int: 0 si no hay diferencias entre motores, regresiones ni fallas en la verificación de
+             periodos faltantes, 1 en otro caso
+    """
+    args = parsear_argumentos(argv)
+    os.makedirs(args.directorio, exist_ok=True)
+    listener = configurar_logging(nombre_archivo=os.path.join(args.directorio, LOGGING_CONFIG['filename']))
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version_reglas': VERSION_REGLAS,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'memoria_medida': not args.sin_memoria,
+        'casos': [],
+        'periodos_faltantes_correctos': verificar_periodos_faltantes(args.semilla)
+    }
+    for n_filas in args.tamanos:
+        print(f"Ejecutando caso de {n_filas} filas...")
+        caso = ejecutar_caso(n_filas, args.tasa_errores, args.directorio, args.motores,
+                             args.max_filas_motor_filas, args.semilla, not args.sin_memoria)
+        resultado['casos'].append(caso)
+        logger.info(f"Banco de pruebas, caso de {n_filas} filas: {caso['etapas']}")
+
+    detener_logging(listener)
+
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en: {args.salida}")
+    imprimir_resumen(resultado)
+
+    codigo = 0
+    if any(caso.get('resultados_iguales') is False for caso in resultado['casos']):
+        print("Los motores de validación no produjeron los mismos resultados.")
+        codigo = 1
+    if not resultado['periodos_faltantes_correctos']:
+        print("La verificación de periodos faltantes no reportó el día eliminado de la hoja sintética.")
+        codigo = 1
+    if args.referencia:
+        for filas, etapa, anterior, actual in comparar_con_referencia(resultado, args.referencia,
+                                                                      args.umbral_regresion):
+            print(f"Regresión en {filas} filas, etapa '{etapa}': {anterior:.3f} s -> {actual:.3f} s")
+            codigo = 1
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Instantáneas columnares de las hojas cargadas: la primera lectura de un libro guarda
+cada hoja en Parquet (o pickle si pyarrow no está instalado o la hoja tiene columnas
+con tipos mezclados) y las siguientes la cargan sin volver a parsear el XML del XLSX
+"""
+import os
+import glob
+import hashlib
+import logging
+import pandas as pd
+from config import SUFIJO_SNAPSHOT
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = ('.parquet', '.pkl')
+
+
+def clave_snapshot(ruta_archivo, columnas=None):
+    """
+    Clave de la instantánea: fecha de modificación y tamaño del archivo de origen,
+    más las columnas leídas (COLUMNAS_SALIDA cambia lo que se carga de cada hoja)
+
+    Returns:
+        str: Clave para el nombre del archivo de la instantánea
+    """
+    estado = os.stat(ruta_archivo)
+    columnas_txt = '*' if columnas is None else '|'.join(sorted(map(str, columnas)))
+    return f"{estado.st_mtime_ns}-{estado.st_size}-{hashlib.sha1(columnas_txt.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _directorio(ruta_archivo):
+    return ruta_archivo + SUFIJO_SNAPSHOT
+
+
+def _es_tabular(df):
+    """
+    Indica si Parquet conserva la hoja tal cual: nombres de columna de texto y columnas
+    object solo con textos (1, 1.0 y '1' mezclados en una columna no sobreviven el viaje)
+    """
+    if not all(isinstance(col, str) for col in df.columns):
+        return False
+    for col in df.columns:
+        if df[col].dtype == object and not df[col].dropna().map(type).eq(str).all():
+            return False
+    return True
+
+
+def cargar_snapshot(ruta_archivo, nombre_hoja, columnas=None):
+    """
+    Carga la instantánea de una hoja si corresponde a la versión actual del archivo
+
+    Args:
+        ruta_archivo (str): Ruta al archivo de origen
+        nombre_hoja (str): Nombre de la hoja
+        columnas (set): Columnas leídas de la hoja; None si se leen todas
+
+    Returns:
+        pd.DataFrame: Datos de la hoja o None si no hay instantánea vigente
+    """
+    clave = clave_snapshot(ruta_archivo, columnas)
+    for extension in EXTENSIONES:
+        ruta = os.path.join(_directorio(ruta_archivo), f"{nombre_hoja}-{clave}{extension}")
+        if not os.path.exists(ruta):
+            continue
+        try:
+            if extension == '.parquet':
+                if not PARQUET_DISPONIBLE:
+                    continue
+                return pd.read_parquet(ruta, engine='pyarrow', memory_map=True)
+            return pd.read_pickle(ruta)
+        except Exception as e:
+            mensaje = f"Error al leer la instantánea {ruta}: {str(e)}"
+            logger.error(mensaje)
+            print(mensaje)
+    return None
+
+
+def guardar_snapshot(df, ruta_archivo, nombre_hoja, columnas=None):
+    """
+    Guarda la instantánea de una hoja y elimina las de versiones anteriores del archivo
+
+    Args:
+        df (pd.DataFrame): Datos de la hoja tal como se cargaron
+        ruta_archivo (str): Ruta al archivo de origen
+        nombre_hoja (str): Nombre de la hoja
+        columnas (set): Columnas leídas de la hoja; None si se leen todas
+    """
+    directorio = _directorio(ruta_archivo)
+    clave = clave_snapshot(ruta_archivo, columnas)
+    extension = '.parquet' if PARQUET_DISPONIBLE and _es_tabular(df) else '.pkl'
+    ruta = os.path.join(directorio, f"{nombre_hoja}-{clave}{extension}")
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        for anterior in glob.glob(os.path.join(glob.escape(directorio), glob.escape(nombre_hoja) + '-*')):
+            os.remove(anterior)
+        temporal = ruta + '.tmp'
+        if extension == '.parquet':
+            df.to_parquet(temporal, engine='pyarrow', index=False)
+        else:
+            df.to_pickle(temporal, compression=None)
+        os.replace(temporal, ruta)
+        logger.info(f"Instantánea de la hoja '{nombre_hoja}' guardada en: {ruta}")
+    except Exception as e:
+        mensaje = f"Error al guardar la instantánea {ruta}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
@@ -0,0 +1,224 @@
+"""
+Carga compacta de hojas: cada columna se guarda con el tipo más pequeño que permite
+reconstruir exactamente sus valores (categorías para textos repetidos como Unidad, enteros
+pequeños, float32 cuando alcanza la precisión) y las celdas no numéricas de columnas
+numéricas se guardan aparte en lugar de convertir toda la columna a object
+"""
+import logging
+import numpy as np
+import pandas as pd
+from config import MAX_DECIMALES_FLOAT32, PROPORCION_MAX_CATEGORIAS
+
+logger = logging.getLogger(__name__)
+
+
+def _decimales_float32(valores):
+    """
+    Menor cantidad de decimales con la que float32 reconstruye exactamente los valores
+    (float32 -> float64 -> redondeo), o None si ninguna alcanza
+
+    Args:
+        valores: Arreglo float64 (los NaN e infinitos se conservan)
+    """
+    with np.errstate(over='ignore', invalid='ignore'):
+        comprimidos = valores.astype(np.float32).astype(np.float64)
+        for decimales in range(MAX_DECIMALES_FLOAT32 + 1):
+            if np.array_equal(np.round(comprimidos, decimales), valores, equal_nan=True):
+                return decimales
+    return None
+
+
+def _flotantes(valores):
+    """Arreglo compacto de flotantes: float32 con sus decimales si es exacto, si no float64"""
+    decimales = _decimales_float32(valores)
+    if decimales is None:
+        return valores, None
+    return valores.astype(np.float32), decimales
+
+
+def _enteros(valores):
+    """Enteros con el tipo más pequeño que los contiene"""
+    return pd.to_numeric(pd.Series(valores, copy=False), downcast='integer').to_numpy()
+
+
+def _compactar_objetos(valores):
+    """
+    Compacta una columna object: textos repetidos como categorías, o números nativos con
+    las celdas restantes (textos, None, fechas, booleanos) guardadas aparte
+
+    Returns:
+        tuple: (arreglo compacto, información para restaurar) o (None, None) si no conviene
+    """
+    n = len(valores)
+    tipos = pd.Series([type(v) for v in valores], dtype=object)
+    es_texto = (tipos == str).to_numpy()
+    es_nulo = pd.isna(valores)
+    if (es_texto | es_nulo).all():
+        # las categorías devuelven NaN en las celdas vacías, así que no se usan si hay None
+        if (tipos[es_nulo] != float).any() or pd.unique(valores[es_texto]).size > n * PROPORCION_MAX_CATEGORIAS:
+            return None, None
+        return pd.Categorical(valores), {'forma': 'categoria'}
+
+    # solo int y float de Python, que es lo que entrega la lectura del libro
+    es_entero = (tipos == int).to_numpy()
+    es_numero = es_entero | (tipos == float).to_numpy()
+    if es_numero.sum() < (n - es_nulo.sum()) / 2:
+        return None, None
+    numeros = np.full(n, np.nan)
+    numeros[es_numero] = valores[es_numero].astype(np.float64)
+    # los enteros enormes no sobreviven al paso por float64
+    if es_entero.any() and np.abs(numeros[es_entero]).max() >= 2 ** 53:
+        return None, None
+
+    atipicos = np.flatnonzero(~es_numero)
+    info = {'forma': 'numeros', 'atipicos_posiciones': atipicos,
+            'atipicos_valores': valores[atipicos].copy()}
+    if es_entero[es_numero].all():
+        arreglo = numeros.copy()
+        arreglo[~es_numero] = 0
+        info['enteros'] = True
+        return _enteros(arreglo.astype(np.int64)), info
+
+    arreglo, info['decimales'] = _flotantes(numeros)
+    info['enteros'] = np.packbits(es_entero) if es_entero.any() else None
+    return arreglo, info
+
+
+class HojaCompacta:
+    """
+    Hoja cargada con tipos compactos; restaurar() devuelve un rango de filas idéntico
+    (valores y tipos) al DataFrame original, para validarlo o escribirlo por bloques
+
+    Atributos:
+        datos: DataFrame con las columnas compactas
+        info: Información para restaurar cada columna transformada
+        tipos: Tipo original de cada columna
+        index: Índice original (su posición + 2 es la 'Fila de error')
+        memoria_original: Bytes del DataFrame original (memory_usage con deep=True)
+    """
+
+    def __init__(self, df):
+        self.index = df.index
+        self.tipos = df.dtypes.to_dict()
+        self.info = {}
+        self.memoria_original = int(df.memory_usage(deep=True).sum())
+        columnas = {}
+        for columna in df.columns:
+            serie = df[columna]
+            arreglo, info = None, None
+            if serie.dtype.kind in 'iu':
+                arreglo, info = _enteros(serie.to_numpy()), {'forma': 'entero'}
+            elif serie.dtype.kind == 'f':
+                arreglo, decimales = _flotantes(serie.to_numpy())
+                info = None if decimales is None else {'forma': 'flotante', 'decimales': decimales}
+            elif serie.dtype == object:
+                arreglo, info = _compactar_objetos(serie.to_numpy())
+            elif pd.api.types.is_string_dtype(serie.dtype):
+                arreglo, info = _compactar_objetos(serie.to_numpy(dtype=object, na_value=np.nan))
+                if info is not None and info['forma'] != 'categoria':
+                    arreglo, info = None, None
+            if info is None:
+                columnas[columna] = serie.array
+                continue
+            columnas[columna] = arreglo
+            self.info[columna] = info
+        self.datos = pd.DataFrame(columnas, index=pd.RangeIndex(len(df)), copy=False)
+
+    def __len__(self):
+        return len(self.datos)
+
+    @property
+    def columns(self):
+        return self.datos.columns
+
+    @property
+    def empty(self):
+        return self.datos.empty
+
+    def memoria(self):
+        """Bytes de las columnas compactas y de las celdas guardadas aparte"""
+        total = int(self.datos.memory_usage(deep=True, index=False).sum()) + self.index.memory_usage(deep=True)
+        for info in self.info.values():
+            if info['forma'] == 'numeros':
+                total += info['atipicos_posiciones'].nbytes + int(
+                    pd.Series(info['atipicos_valores'], dtype=object).memory_usage(deep=True, index=False))
+                if isinstance(info['enteros'], np.ndarray):
+                    total += info['enteros'].nbytes
+        return total
+
+    def celdas_atipicas(self):
+        """Cantidad de celdas guardadas aparte por columna"""
+        return {columna: len(info['atipicos_posiciones']) for columna, info in self.info.items()
+                if info['forma'] == 'numeros' and len(info['atipicos_posiciones'])}
+
+    def _restaurar_columna(self, columna, inicio, fin):
+        info = self.info.get(columna)
+        if info is None:
+            return self.datos[columna].array[inicio:fin]
+        valores = self.datos[columna].to_numpy()[inicio:fin]
+        tipo = self.tipos[columna]
+        if info['forma'] == 'entero':
+            return valores.astype(tipo)
+        if info['forma'] == 'flotante':
+            return np.round(valores.astype(np.float64), info['decimales'])
+        if info['forma'] == 'categoria':
+            objetos = np.asarray(self.datos[columna].array[inicio:fin], dtype=object)
+            return objetos if tipo == object else pd.array(objetos, dtype=tipo)
+
+        restaurados = np.empty(fin - inicio, dtype=object)
+        if info['enteros'] is True:
+            restaurados[:] = valores.astype(np.int64).tolist()
+        else:
+            numeros = valores.astype(np.float64)
+            if info['decimales'] is not None:
+                numeros = np.round(numeros, info['decimales'])
+            restaurados[:] = numeros.tolist()
+            if info['enteros'] is not None:
+                enteros = np.unpackbits(info['enteros'], count=len(self))[inicio:fin].astype(bool)
+                restaurados[enteros] = numeros[enteros].astype(np.int64).tolist()
+        posiciones = info['atipicos_posiciones']
+        desde, hasta = np.searchsorted(posiciones, [inicio, fin])
+        restaurados[posiciones[desde:hasta] - inicio] = info['atipicos_valores'][desde:hasta]
+        return restaurados
+
+    def restaurar(self, inicio=0, fin=None, columnas=None):
+        """
+        Reconstruye un rango de filas con los valores y tipos originales
+
+        Args:
+            inicio (int): Primera posición del rango
+            fin (int): Posición siguiente a la última; None llega al final
+            columnas (list): Columnas a restaurar; None restaura todas, en su orden original
+
+        Returns:
+            pd.DataFrame: Igual a df.iloc[inicio:fin] del DataFrame original
+        """
+        fin = len(self) if fin is None else min(fin, len(self))
+        columnas = list(self.columns) if columnas is None else [c for c in self.columns if c in columnas]
+        indice = self.index[inicio:fin]
+        # el tipo se fija explícitamente: pandas volvería a inferirlo en las columnas object
+        return pd.DataFrame({columna: pd.Series(self._restaurar_columna(columna, inicio, fin), index=indice,
+                                                dtype=self.tipos[columna], copy=False)
+                             for columna in columnas}, index=indice, columns=columnas)
+
+
+def compactar_hoja(df, nombre_hoja):
+    """
+    Convierte una hoja cargada a HojaCompacta y reporta la memoria antes y después
+
+    Args:
+        df: DataFrame de la hoja
+        nombre_hoja (str): Nombre de la hoja, para el reporte
+
+    Returns:
+        HojaCompacta: Hoja con tipos compactos
+    """
+    hoja = HojaCompacta(df)
+    memoria = hoja.memoria()
+    atipicas = hoja.celdas_atipicas()
+    mensaje = (f"Hoja '{nombre_hoja}': memoria {hoja.memoria_original / 2**20:.1f} MB -> {memoria / 2**20:.1f} MB "
+               f"({len(hoja.info)} columnas compactadas, {sum(atipicas.values())} celdas no numéricas guardadas aparte "
+               f"en {len(atipicas)} columnas)")
+    logger.info(mensaje)
+    print(mensaje)
+    return hoja
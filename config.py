@@ -1,6 +1,7 @@
 """
 Módulo de configuración con constantes y límites de validación
 """
+import hashlib
 
 # Límites  UG3.0
 LIMITES_UG30 = {
@@ -16,6 +17,12 @@ LIMITES_UG32 = {
     'total_carbon_max': 200
 }
 
+# Límites por unidad; agregar una unidad (p. ej. UG3.3) solo requiere una nueva entrada
+LIMITES_POR_UNIDAD = {
+    'UG3.0': LIMITES_UG30,
+    'UG3.2': LIMITES_UG32
+}
+
 LOGGING_CONFIG = {
     'filename': 'errores_validacion.log',
     'level': 'INFO',
@@ -23,8 +30,104 @@ LOGGING_CONFIG = {
     'datefmt': '%Y-%m-%d %H:%M:%S'
 }
 
+# Logging de errores: el archivo se escribe en un hilo en segundo plano; por defecto cada
+# regla registra un resumen (cantidad y primeros ejemplos) y no una línea por celda,
+# cuyo detalle completo ya está en el archivo de errores consolidado
+LOGGING_ASINCRONO = True
+DETALLE_ERRORES_POR_CELDA = False
+EJEMPLOS_POR_REGLA = 5
+
+# Métricas de rendimiento por etapa y por regla, escritas al final de cada ejecución,
+# y perfil de cProfile de la opción --perfil
+ARCHIVO_METRICAS = 'metricas_validacion.json'
+ARCHIVO_PERFIL = 'perfil_validacion.prof'
+
+# Formatos de fecha conocidos, probados en orden sobre columnas completas antes de
+# recurrir a la inferencia de pd.to_datetime celda por celda
+FORMATOS_FECHA = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S']
+
+# Números escritos como texto en columnas numéricas: separador decimal y separador de miles
+# (None si no se usa), p. ej. ',' y '.' para '1.234,5'. Se aceptan espacios alrededor del número
+SEPARADOR_DECIMAL = '.'
+SEPARADOR_MILES = None
+
+# Hojas que se validan de cada libro cuando no se indican con --hojas
+HOJAS_POR_DEFECTO = ["G3.0", "G3.2"]
+
+# Motor de validación por defecto: 'vectorizado' o 'filas' (recorrido con iterrows)
+MOTOR_VALIDACION = 'vectorizado'
+
+# Columnas que se conservan en los archivos de salida además de las que usan las reglas.
+# None carga la hoja completa; una lista limita la lectura a las columnas de REGLAS más esas
+COLUMNAS_SALIDA = None
+
+# Filas por bloque en el modo de validación en streaming (memoria acotada)
+TAMANO_BLOQUE_STREAMING = 50000
+
+# Filas por tarea al validar en paralelo (opción --workers)
+FILAS_POR_PARTICION = 100000
+
+# Carga compacta (opción --compacto): tipos pequeños por columna que reconstruyen exactamente
+# los valores originales. float32 se usa si con hasta MAX_DECIMALES_FLOAT32 decimales recupera
+# cada valor, y una columna de textos pasa a categorías si sus valores distintos no superan
+# esta proporción de las filas
+CARGA_COMPACTA = False
+MAX_DECIMALES_FLOAT32 = 6
+PROPORCION_MAX_CATEGORIAS = 0.5
+
+# Formato del archivo de datos limpios (opción --formato-limpios): 'xlsx', o 'parquet'/'csv'
+# para cargadores posteriores, con un archivo por hoja escrito por bloques de FILAS_POR_PARTICION
+FORMATO_DATOS_LIMPIOS = 'xlsx'
+
+# Reporte de errores consolidado (opción --reporte-errores): 'detallado' (un renglón por celda),
+# 'rangos' (filas consecutivas con la misma columna, regla y valor en un solo renglón) o
+# 'ambos' (la hoja de rangos se agrega junto a la detallada)
+REPORTE_ERRORES = 'detallado'
+
+# Copia anotada de las hojas completas (opción --anotado): las celdas con error se resaltan con
+# formato condicional por tramos de filas de cada columna, y las primeras MAX_COMENTARIOS_ANOTADO
+# celdas con error de cada hoja llevan un comentario con las reglas que incumplen (0 no comenta;
+# None comenta todas, lo que en hojas grandes multiplica el tiempo y el tamaño del archivo)
+LIBRO_ANOTADO = False
+MAX_COMENTARIOS_ANOTADO = 1000
+AUTOR_COMENTARIOS = 'Validación'
+
+# Chequeo rápido de un libro (quick_check.py): se detiene al llegar a estos errores por regla
+# o por hoja, leyendo bloques de FILAS_BLOQUE_CHEQUEO filas, o valida una muestra de
+# FILAS_POR_ESTRATO_CHEQUEO filas por unidad y mes. Una hoja se rechaza si llega a un límite,
+# si le faltan columnas de las reglas o si la cota inferior de la tasa de error de alguna
+# regla (intervalo de Wilson con CONFIANZA_CHEQUEO) supera TASA_MAXIMA_CHEQUEO
+MAX_ERRORES_POR_REGLA_CHEQUEO = 50
+MAX_ERRORES_POR_HOJA_CHEQUEO = 500
+FILAS_BLOQUE_CHEQUEO = 2000
+FILAS_POR_ESTRATO_CHEQUEO = 50
+CONFIANZA_CHEQUEO = 0.95
+TASA_MAXIMA_CHEQUEO = 0.01
+
+# Base SQLite donde cada ejecución agrega sus metadatos, conteos por regla y errores (None la
+# desactiva) y cantidad de errores por lote de inserción
+BASE_RESULTADOS = None
+FILAS_POR_LOTE_SQLITE = 50000
+
+# Instantáneas columnares de cada hoja (Parquet, o pickle sin pyarrow) en el directorio
+# ruta del libro + sufijo, vigentes mientras no cambien la fecha y el tamaño del libro
+USAR_SNAPSHOT = True
+SUFIJO_SNAPSHOT = '.snapshot'
+
+# Revalidación incremental (opción --incremental): archivo de caché junto al libro
+# (ruta del libro + sufijo) y filas por bloque con hash propio
+SUFIJO_CACHE_INCREMENTAL = '.cache_validacion'
+FILAS_POR_BLOQUE_CACHE = 10000
+
+# Servicio de validación (validation_service.py): dirección HTTP local, procesos
+# precalentados y segundos entre revisiones de la carpeta de entrada
+HOST_SERVICIO = '127.0.0.1'
+PUERTO_SERVICIO = 8765
+WORKERS_SERVICIO = 2
+INTERVALO_CARPETA_ENTRADA = 2.0
+
 # valores validaciones
-UNIDADES_VALIDAS = ["UG3.0", "UG3.2"]
+UNIDADES_VALIDAS = list(LIMITES_POR_UNIDAD)
 TIPOS_EVENTO_VALIDOS = [-1, 0, 1]
 
 # Rangos generales
@@ -36,4 +139,116 @@ RANGOS = {
     'combustible_liquido': (0, 25000),
     'g_ln': (0, 164),
     'a_ln': (0, 188000)
-}
\ No newline at end of file
+}
+
+# Especificación declarativa de reglas, en el orden en que se reportan los errores de una fila.
+# Claves de cada regla:
+#   columnas: columnas a las que aplica (las ausentes en la hoja se ignoran)
+#   tipo: 'fecha', 'entero', 'numero' o 'enum'
+#   rango: (mínimo, máximo) fijo
+#   limite_unidad: clave de LIMITES_POR_UNIDAD con el máximo de cada unidad (mínimo 0,
+#                  o -máximo si simetrico=True); las filas de otras unidades no se validan
+#   unidades: restringe la regla a filas de esas unidades
+#   es_porcentaje: usa el texto de regla con '%'
+#   valores / separador: valores permitidos de un enum y separador del texto de la regla
+REGLAS = [
+    {'columnas': ['Fecha'], 'tipo': 'fecha'},
+    {'columnas': ['Periodo'], 'tipo': 'entero', 'rango': RANGOS['periodo']},
+    {'columnas': ['Unidad'], 'tipo': 'enum', 'valores': UNIDADES_VALIDAS, 'separador': ' o '},
+    {'columnas': ['Disponibilidad declarada(MWh)', 'Despacho programado(MWh)',
+                  'Despacho final(real)(MWh)', 'Energía neta despachada (MWh)'],
+     'tipo': 'numero', 'limite_unidad': 'disponibilidad_max'},
+    {'columnas': ['Energía desviada (MWh)'], 'tipo': 'numero',
+     'limite_unidad': 'disponibilidad_max', 'simetrico': True},
+    {'columnas': ['%Desviación (%)'], 'tipo': 'numero',
+     'rango': RANGOS['porcentaje_desviacion'], 'es_porcentaje': True},
+    {'columnas': ['Energía bruta generada (kWh)', 'Energía consumida (kWh)',
+                  'Energía reactiva generada (kVAr)', 'Energía reactiva consumida (kVAr)'],
+     'tipo': 'numero', 'limite_unidad': 'bruta_max'},
+    {'columnas': [f'Alimentador {i} de carbón (Ton)' for i in range(1, 9)],
+     'tipo': 'numero', 'rango': RANGOS['alimentador_carbon']},
+    {'columnas': ['Total carbón Alimentado caldera (Ton)'], 'tipo': 'numero',
+     'limite_unidad': 'total_carbon_max'},
+    {'columnas': ['Suministro caliza (Ton)'], 'tipo': 'numero', 'rango': RANGOS['suministro_caliza']},
+    {'columnas': ['Consumo combustible líquido FO (gal)'], 'tipo': 'numero',
+     'rango': RANGOS['combustible_liquido']},
+    {'columnas': ['G-LN764', 'G-LN765'], 'tipo': 'numero', 'rango': RANGOS['g_ln'], 'unidades': ['UG3.0']},
+    {'columnas': ['A-LN764', 'A-LN765'], 'tipo': 'numero', 'rango': RANGOS['a_ln'], 'unidades': ['UG3.0']},
+    {'columnas': ['Fecha Evento'], 'tipo': 'fecha'},
+    {'columnas': ['Tipo de evento'], 'tipo': 'enum', 'valores': TIPOS_EVENTO_VALIDOS}
+]
+
+# Tolerancias (diferencia absoluta admitida) de las reglas de consistencia entre columnas
+TOLERANCIAS_CONSISTENCIA = {
+    'total_carbon': 0.5,
+    'energia_desviada': 0.01,
+    'porcentaje_desviacion': 0.5
+}
+
+# Reglas de consistencia entre columnas de una misma fila, evaluadas con aritmética sobre
+# columnas completas y reportadas después de las reglas por celda. Claves de cada regla:
+#   columna: columna que se compara con el valor calculado (donde se reporta el error)
+#   tipo: 'suma' (suma de 'sumandos'), 'diferencia' ('minuendo' - 'sustraendo') o
+#         'porcentaje' (100 * 'numerador' / 'denominador', sin evaluar si el denominador es 0)
+#   tolerancia: diferencia absoluta admitida entre la columna y el valor calculado
+#   descripcion: texto de la regla en el reporte
+# Las filas con alguna de las celdas vacías, de texto o no finitas no se evalúan
+REGLAS_CONSISTENCIA = [
+    {'columna': 'Total carbón Alimentado caldera (Ton)', 'tipo': 'suma',
+     'sumandos': [f'Alimentador {i} de carbón (Ton)' for i in range(1, 9)],
+     'tolerancia': TOLERANCIAS_CONSISTENCIA['total_carbon'],
+     'descripcion': 'Suma de los alimentadores 1 a 8 de carbón'},
+    {'columna': 'Energía desviada (MWh)', 'tipo': 'diferencia',
+     'minuendo': 'Despacho final(real)(MWh)', 'sustraendo': 'Despacho programado(MWh)',
+     'tolerancia': TOLERANCIAS_CONSISTENCIA['energia_desviada'],
+     'descripcion': 'Despacho final menos despacho programado'},
+    {'columna': '%Desviación (%)', 'tipo': 'porcentaje',
+     'numerador': 'Energía desviada (MWh)', 'denominador': 'Despacho programado(MWh)',
+     'tolerancia': TOLERANCIAS_CONSISTENCIA['porcentaje_desviacion'],
+     'descripcion': 'Energía desviada sobre despacho programado (%)'}
+]
+
+# Reglas de REGLAS_CONSISTENCIA que se evalúan, identificadas por su 'columna'. Vacía por
+# defecto: sus errores sacan filas del archivo de datos limpios, así que se activan
+# explícitamente (p. ej. ['Total carbón Alimentado caldera (Ton)'])
+VALIDACIONES_CONSISTENCIA = []
+
+# Validaciones entre filas sobre la clave horaria (Fecha, Periodo, Unidad) de la hoja completa:
+# 'duplicados' (clave repetida) y 'orden' (fila anterior en el tiempo a la fila previa de su
+# unidad) se reportan como errores de fila después de las reglas por celda; 'periodos_faltantes'
+# (periodos de RANGOS['periodo'] ausentes por fecha y unidad) es un hallazgo de la hoja y se
+# guarda en su propio archivo sin afectar los datos limpios. Vacía por defecto: los errores de
+# fila sacan filas del archivo de datos limpios, así que se activan explícitamente
+VALIDACIONES_CRUZADAS = []
+
+# Detección de anomalías estadísticas en la serie horaria de cada unidad (filas con clave válida en
+# orden de Fecha y Periodo), reportada después de las validaciones entre filas: 'atipicos' (valor
+# lejos de la mediana móvil centrada, medido en MAD), 'linea_plana' (mismo valor repetido muchos
+# periodos seguidos, como un medidor congelado) y 'escalon' (cambio de nivel entre las medianas de
+# los periodos anteriores y posteriores). Solo se evalúan las columnas de COLUMNAS_ANOMALIAS y una
+# lista vacía la desactiva
+VALIDACIONES_ANOMALIAS = []
+COLUMNAS_ANOMALIAS = ['Despacho final(real)(MWh)', 'Energía neta despachada (MWh)',
+                      'Energía bruta generada (kWh)', 'Energía consumida (kWh)',
+                      'Energía reactiva generada (kVAr)', 'Energía reactiva consumida (kVAr)',
+                      'Total carbón Alimentado caldera (Ton)']
+# ventana_dias: días vecinos (impar) con los que se compara cada valor del mismo periodo;
+# ventana: periodos antes y después de un escalón (días completos, para que el ciclo diario no
+# cambie las medianas); umbral_atipico / umbral_escalon: distancia admitida en MAD (escalada a
+# desviación estándar); periodos_linea_plana: largo mínimo de una racha de valores iguales;
+# valores_reposo: valores de la unidad apagada, que no son anomalías
+PARAMETROS_ANOMALIAS = {
+    'ventana_dias': 15,
+    'ventana': 48,
+    'umbral_atipico': 6.0,
+    'umbral_escalon': 6.0,
+    'periodos_linea_plana': 12,
+    'valores_reposo': [0]
+}
+
+# Versión del conjunto de reglas: cambia con cualquier regla, límite, formato de fecha o
+# separador numérico e invalida automáticamente la caché de la revalidación incremental
+VERSION_REGLAS = hashlib.sha1(
+    repr((REGLAS, REGLAS_CONSISTENCIA, VALIDACIONES_CONSISTENCIA, LIMITES_POR_UNIDAD, FORMATOS_FECHA,
+          SEPARADOR_DECIMAL, SEPARADOR_MILES)).encode('utf-8')
+).hexdigest()[:16]
@@ -0,0 +1,105 @@
+"""
+Reglas de consistencia entre columnas de una misma fila (config.REGLAS_CONSISTENCIA, activadas
+en config.VALIDACIONES_CONSISTENCIA): el valor esperado de cada fila se calcula con aritmética
+sobre columnas completas y se compara con la columna reportada dentro de su tolerancia
+"""
+import time
+import logging
+import numpy as np
+from config import REGLAS_CONSISTENCIA, VALIDACIONES_CONSISTENCIA
+from error_matrix import MatrizErrores
+from numeric_coercion import valores_numericos
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+
+def _columnas_regla(regla):
+    """Columnas que usa una regla de consistencia: la reportada y las del cálculo"""
+    if regla['tipo'] == 'suma':
+        operandos = list(regla['sumandos'])
+    elif regla['tipo'] == 'diferencia':
+        operandos = [regla['minuendo'], regla['sustraendo']]
+    elif regla['tipo'] == 'porcentaje':
+        operandos = [regla['numerador'], regla['denominador']]
+    else:
+        raise ValueError(f"Tipo de regla de consistencia desconocido: {regla['tipo']}")
+    return [regla['columna']] + operandos
+
+
+def reglas_activas(validaciones=None):
+    """
+    Reglas de consistencia a evaluar
+
+    Args:
+        validaciones (list): Columnas de las reglas a evaluar; None usa config.VALIDACIONES_CONSISTENCIA
+
+    Returns:
+        list: Reglas de config.REGLAS_CONSISTENCIA cuya 'columna' está en validaciones
+    """
+    validaciones = VALIDACIONES_CONSISTENCIA if validaciones is None else validaciones
+    conocidas = {regla['columna'] for regla in REGLAS_CONSISTENCIA}
+    for columna in validaciones:
+        if columna not in conocidas:
+            raise ValueError(f"Regla de consistencia desconocida: {columna}")
+    return [regla for regla in REGLAS_CONSISTENCIA if regla['columna'] in validaciones]
+
+
+def _valor_calculado(regla, numeros):
+    """Valor esperado de la columna de la regla en cada fila (NaN donde no se puede calcular)"""
+    if regla['tipo'] == 'suma':
+        return np.sum([numeros[columna] for columna in regla['sumandos']], axis=0)
+    if regla['tipo'] == 'diferencia':
+        return numeros[regla['minuendo']] - numeros[regla['sustraendo']]
+    denominador = numeros[regla['denominador']]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominador != 0, 100 * numeros[regla['numerador']] / denominador, np.nan)
+
+
+def validar_consistencia(df, reglas=None):
+    """
+    Evalúa las reglas de consistencia cuyas columnas están todas en la hoja
+
+    Args:
+        df: DataFrame (o partición de filas) a validar
+        reglas (list): Reglas a evaluar; None usa las activadas en config.VALIDACIONES_CONSISTENCIA
+
+    Returns:
+        MatrizErrores: Errores con una regla por regla de consistencia aplicable, o None si
+                       no hay ninguna. El valor reportado es el de la celda seguido del calculado
+    """
+    reglas = reglas_activas() if reglas is None else reglas
+    aplicables = [regla for regla in reglas if all(columna in df.columns for columna in _columnas_regla(regla))]
+    if not aplicables:
+        return None
+
+    tipo_comun = df.iloc[:0].to_numpy().dtype
+    numeros = {}
+    bloques = []
+    for id_regla, regla in enumerate(aplicables):
+        inicio = time.perf_counter()
+        for columna in _columnas_regla(regla):
+            if columna not in numeros:
+                numeros[columna] = valores_numericos(df[columna])
+        reportado = numeros[regla['columna']]
+        calculado = _valor_calculado(regla, numeros)
+        # las comparaciones con NaN son falsas: las filas incompletas no son error
+        with np.errstate(invalid='ignore'):
+            mascara = (np.isfinite(reportado) & np.isfinite(calculado)
+                       & (np.abs(reportado - calculado) > regla['tolerancia']))
+        posiciones = np.flatnonzero(mascara)
+        valores = df[regla['columna']].iloc[posiciones].to_numpy(dtype=tipo_comun)
+        textos = [f"{valor} (calculado: {esperado:.2f})" for valor, esperado in zip(valores, calculado[posiciones])]
+        bloques.append((posiciones, np.full(len(posiciones), id_regla), textos,
+                        [f"{regla['descripcion']} ± {regla['tolerancia']}"] * len(posiciones)))
+        METRICAS.registrar_regla(regla['columna'], 'consistencia', None, time.perf_counter() - inicio,
+                                 len(df), len(posiciones))
+
+    posiciones = np.concatenate([b[0] for b in bloques])
+    ids_regla = np.concatenate([b[1] for b in bloques])
+    indice = np.lexsort((ids_regla, posiciones))
+    return MatrizErrores(
+        df.index, [regla['columna'] for regla in aplicables], posiciones[indice], ids_regla[indice],
+        np.array([v for b in bloques for v in b[2]], dtype=object)[indice],
+        np.array([t for b in bloques for t in b[3]], dtype=object)[indice]
+    )
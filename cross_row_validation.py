@@ -0,0 +1,215 @@
+"""
+Validaciones entre filas de una hoja completa sobre la clave horaria (Fecha, Periodo, Unidad):
+claves duplicadas y filas fuera de orden, reportadas como errores de fila, y periodos faltantes
+por fecha y unidad, reportados como hallazgos de la hoja. La clave se codifica como un entero por
+fila y cada validación es una pasada lineal con hash o bincount
+"""
+import time
+import logging
+from datetime import date
+import numpy as np
+import pandas as pd
+from config import RANGOS, VALIDACIONES_CRUZADAS
+from error_matrix import MatrizErrores
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_CLAVE = ('Fecha', 'Periodo', 'Unidad')
+
+# Columna donde se reporta cada validación de filas y texto de la regla incumplida
+REGLAS_CRUZADAS = {
+    'duplicados': ('Periodo', 'Clave (Fecha, Periodo, Unidad) única'),
+    'orden': ('Fecha', 'Filas en orden de Fecha y Periodo dentro de cada unidad')
+}
+
+# Validación de la hoja: un periodo faltante no tiene fila a la que atribuirle el error
+VALIDACION_HOJA = 'periodos_faltantes'
+
+
+def _dias(valores):
+    """
+    Día de cada fecha como entero (días desde 1970-01-01), convirtiendo una vez cada valor distinto
+
+    Returns:
+        tuple: (días, máscara de valores que son fechas o textos de fecha válidos)
+    """
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        fechas = pd.DatetimeIndex(valores)
+    else:
+        codigos, unicos = pd.factorize(valores)
+        unicos = pd.Series([v if isinstance(v, (date, str)) else None for v in unicos], dtype=object)
+        convertidas = pd.DatetimeIndex(pd.to_datetime(unicos, errors='coerce', format='mixed'))
+        # el código -1 (celda vacía) toma el NaT agregado al final
+        fechas = convertidas.append(pd.DatetimeIndex([pd.NaT])).take(codigos)
+    validas = ~fechas.isna()
+    dias = np.where(validas, fechas.to_numpy().astype('datetime64[D]').astype(np.int64), 0)
+    return dias, validas
+
+
+def codificar_clave(df):
+    """
+    Codifica la clave horaria de cada fila
+
+    Args:
+        df: DataFrame con las columnas Fecha, Periodo y Unidad
+
+    Returns:
+        tuple: (máscara de filas con clave válida, código de unidad, día, periodo); las filas con
+               fecha, periodo o unidad vacíos o inválidos quedan fuera (los inválidos ya tienen
+               su error por celda)
+    """
+    minimo, maximo = RANGOS['periodo']
+    dias, fechas_validas = _dias(df['Fecha'])
+    periodos = pd.to_numeric(df['Periodo'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    unidades, _ = pd.factorize(df['Unidad'])
+    valida = (fechas_validas & (unidades >= 0) & (periodos >= minimo) & (periodos <= maximo)
+              & (periodos == np.floor(periodos)))
+    periodos = np.where(valida, periodos, minimo).astype(np.int64)
+    return valida, unidades.astype(np.int64), dias, periodos
+
+
+def _primera_posicion(grupos, posiciones, n_grupos):
+    """Primera posición de cada grupo (asignando en orden inverso gana la primera)"""
+    primera = np.empty(n_grupos, dtype=np.int64)
+    primera[grupos[::-1]] = posiciones[::-1]
+    return primera
+
+
+def _clave_dia(unidad, dia):
+    """Un entero por (unidad, día), contiguo desde el primer día de la hoja"""
+    dia_relativo = dia - (dia.min() if len(dia) else 0)
+    n_dias = int(dia_relativo.max()) + 1 if len(dia) else 1
+    return unidad * n_dias + dia_relativo
+
+
+def _texto_clave(dias, periodos, unidades):
+    """Clave horaria como texto 'AAAA-MM-DD | periodo | unidad' para el reporte"""
+    return [f"{d} | {p} | {u}" for d, p, u in zip(dias.astype('datetime64[D]'), periodos.tolist(), unidades)]
+
+
+def validar_hoja_cruzada(df, validaciones=None):
+    """
+    Ejecuta las validaciones entre filas sobre una hoja completa; 'periodos_faltantes' se omite
+    porque se reporta por hoja con periodos_faltantes
+
+    Args:
+        df: DataFrame de la hoja completa; su índice determina la 'Fila de error'
+        validaciones (list): Validaciones a ejecutar; None usa config.VALIDACIONES_CRUZADAS
+
+    Returns:
+        MatrizErrores: Errores con una regla por validación, en el formato de validar_dataframe,
+                       o None si no hay validaciones de filas o faltan columnas de la clave
+    """
+    validaciones = VALIDACIONES_CRUZADAS if validaciones is None else validaciones
+    validaciones = [nombre for nombre in validaciones if nombre != VALIDACION_HOJA]
+    if not validaciones or any(columna not in df.columns for columna in COLUMNAS_CLAVE):
+        return None
+
+    valida, codigos_unidad, dias, periodos = codificar_clave(df)
+    posiciones = np.flatnonzero(valida)
+    unidad, dia, periodo = codigos_unidad[posiciones], dias[posiciones], periodos[posiciones]
+    minimo, maximo = RANGOS['periodo']
+    n_periodos = maximo - minimo + 1
+    # un entero por (unidad, día, periodo)
+    clave = _clave_dia(unidad, dia) * n_periodos + (periodo - minimo)
+
+    errores = []
+    for id_regla, nombre in enumerate(validaciones):
+        inicio = time.perf_counter()
+        if nombre == 'duplicados':
+            grupos, _ = pd.factorize(clave)
+            primera = _primera_posicion(grupos, posiciones, grupos.max() + 1 if len(grupos) else 0)[grupos]
+            repetida = primera != posiciones
+            filas = posiciones[repetida]
+            valores = [f"{texto} (repite la fila {fila})" for texto, fila in zip(
+                _texto_clave(dia[repetida], periodo[repetida], df['Unidad'].to_numpy()[filas]),
+                (df.index.to_numpy()[primera[repetida]] + 2).tolist())]
+        elif nombre == 'orden':
+            tiempo = pd.Series(dia * n_periodos + (periodo - minimo))
+            anterior = tiempo.groupby(unidad, sort=False).shift()
+            atras = (tiempo < anterior).to_numpy()
+            filas = posiciones[atras]
+            valores = _texto_clave(dia[atras], periodo[atras], df['Unidad'].to_numpy()[filas])
+        else:
+            raise ValueError(f"Validación entre filas desconocida: {nombre}")
+        columna, regla = REGLAS_CRUZADAS[nombre]
+        METRICAS.registrar_regla(columna, nombre, None, time.perf_counter() - inicio, len(df), len(filas))
+        errores.append((filas, np.full(len(filas), id_regla, dtype=np.int64), valores, [regla] * len(filas)))
+
+    posiciones_error = np.concatenate([filas for filas, _, _, _ in errores])
+    ids_regla = np.concatenate([ids for _, ids, _, _ in errores])
+    orden = np.lexsort((ids_regla, posiciones_error))
+    valores = np.array([v for _, _, vals, _ in errores for v in vals], dtype=object)
+    textos = np.array([t for _, _, _, txts in errores for t in txts], dtype=object)
+    return MatrizErrores(df.index, [REGLAS_CRUZADAS[nombre][0] for nombre in validaciones],
+                         posiciones_error[orden], ids_regla[orden], valores[orden], textos[orden])
+
+
+def periodos_faltantes(df, validaciones=None):
+    """
+    Periodos de RANGOS['periodo'] ausentes en cada fecha y unidad de una hoja completa, entre
+    el primer y el último día de cada unidad: los días sin ninguna fila se reportan con todos
+    sus periodos faltantes. Son hallazgos de la hoja, no de una fila: no entran en la matriz de
+    errores, así que no cuentan en los errores por fila ni sacan filas de los datos limpios
+
+    Args:
+        df: DataFrame de la hoja completa (o con al menos las columnas de la clave)
+        validaciones (list): Validaciones activas; None usa config.VALIDACIONES_CRUZADAS
+
+    Returns:
+        pd.DataFrame: Una fila por fecha y unidad incompletas, en orden de unidad y fecha, con
+                      'Fecha', 'Unidad', 'Primera fila' (fila de Excel de la primera fila del
+                      grupo, vacía en los días sin filas) y 'Periodos faltantes', o None si
+                      'periodos_faltantes' no está activa o faltan columnas de la clave
+    """
+    validaciones = VALIDACIONES_CRUZADAS if validaciones is None else validaciones
+    if VALIDACION_HOJA not in validaciones or any(columna not in df.columns for columna in COLUMNAS_CLAVE):
+        return None
+
+    inicio = time.perf_counter()
+    valida, codigos_unidad, dias, periodos = codificar_clave(df)
+    posiciones = np.flatnonzero(valida)
+    unidad, dia, periodo = codigos_unidad[posiciones], dias[posiciones], periodos[posiciones]
+    minimo, maximo = RANGOS['periodo']
+    n_periodos = maximo - minimo + 1
+    completo = (1 << n_periodos) - 1
+    grupos, _ = pd.factorize(_clave_dia(unidad, dia))
+    n_grupos = grupos.max() + 1 if len(grupos) else 0
+    # cada (grupo, periodo) distinto aporta su bit una sola vez, así que la suma es un OR
+    pares = pd.unique(grupos * n_periodos + (periodo - minimo))
+    presentes = np.bincount(pares // n_periodos, weights=np.left_shift(1, pares % n_periodos),
+                            minlength=n_grupos).astype(np.int64)
+    # primera fila, unidad y día de cada grupo, en orden de unidad y día
+    primeras = _primera_posicion(grupos, np.arange(len(posiciones)), n_grupos)
+    orden = np.lexsort((dia[primeras], unidad[primeras]))
+    primeras, presentes = primeras[orden], presentes[orden]
+    unidad_grupo, dia_grupo = unidad[primeras], dia[primeras]
+
+    # días sin filas entre dos días con filas de la misma unidad: todos sus periodos faltan
+    misma_unidad = unidad_grupo[1:] == unidad_grupo[:-1]
+    huecos = np.flatnonzero(misma_unidad & (np.diff(dia_grupo) > 1))
+    largos = dia_grupo[huecos + 1] - dia_grupo[huecos] - 1
+    desplazamientos = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos)
+    dias_vacios = np.repeat(dia_grupo[huecos], largos) + 1 + desplazamientos
+    grupo_vacio = np.repeat(huecos, largos)
+
+    incompletos = np.flatnonzero(presentes != completo)
+    # grupo de referencia (el anterior de la misma unidad para los días vacíos) y su día
+    grupo = np.concatenate((incompletos, grupo_vacio))
+    dia_reporte = np.concatenate((dia_grupo[incompletos], dias_vacios))
+    bits = np.concatenate((presentes[incompletos], np.zeros(len(dias_vacios), dtype=np.int64)))
+    con_filas = np.concatenate((np.ones(len(incompletos), dtype=bool), np.zeros(len(dias_vacios), dtype=bool)))
+    orden = np.lexsort((dia_reporte, unidad_grupo[grupo]))
+    grupo, dia_reporte, bits, con_filas = grupo[orden], dia_reporte[orden], bits[orden], con_filas[orden]
+    filas = posiciones[primeras[grupo]]
+    primera_fila = pd.array(df.index.to_numpy()[filas] + 2, dtype='Int64')
+    primera_fila[~con_filas] = pd.NA
+    METRICAS.registrar_regla('Periodo', VALIDACION_HOJA, None, time.perf_counter() - inicio, len(df), len(filas))
+    return pd.DataFrame({
+        'Fecha': dia_reporte.astype('datetime64[D]').astype('datetime64[ns]'),
+        'Unidad': df['Unidad'].to_numpy()[filas],
+        'Primera fila': primera_fila,
+        'Periodos faltantes': [", ".join(str(p + minimo) for p in range(n_periodos) if not (b >> p) & 1)
+                               for b in bits.tolist()]
+    })
@@ -0,0 +1,253 @@
+"""
+Representación columnar de los errores de una hoja: la fila y la regla de cada error,
+el conteo de errores por fila y los valores de las celdas con error
+"""
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+
+
+class MatrizErrores:
+    """
+    Errores de una hoja como arreglos planos de (fila, regla), con el conteo por fila del que
+    salen las selecciones de filas limpias y con múltiples errores
+
+    Atributos:
+        etiquetas: Índice original de cada fila (la 'Fila de error' es etiqueta + 2)
+        columnas_reglas: Columna validada por cada regla, indexada por el orden de la regla
+        errores_por_fila: Cantidad de errores de cada fila
+        posiciones, ids_regla, valores, textos: Un elemento por error, ordenados por
+            fila y luego por regla (valor original como texto y regla incumplida)
+    """
+
+    def __init__(self, etiquetas, columnas_reglas, posiciones, ids_regla, valores, textos):
+        self.etiquetas = np.asarray(etiquetas)
+        self.columnas_reglas = list(columnas_reglas)
+        self.posiciones = np.asarray(posiciones, dtype=np.int64)
+        self.ids_regla = np.asarray(ids_regla, dtype=np.int64)
+        self.valores = np.asarray(valores, dtype=object)
+        self.textos = np.asarray(textos, dtype=object)
+
+        self.errores_por_fila = np.bincount(self.posiciones, minlength=len(self.etiquetas))
+        self._seleccion = None
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    @classmethod
+    def concatenar(cls, matrices):
+        """Une las matrices de particiones consecutivas de filas de una misma hoja"""
+        desplazamientos = np.cumsum([0] + [len(m.etiquetas) for m in matrices[:-1]])
+        return cls(
+            np.concatenate([m.etiquetas for m in matrices]),
+            matrices[0].columnas_reglas,
+            np.concatenate([m.posiciones + d for m, d in zip(matrices, desplazamientos)]),
+            np.concatenate([m.ids_regla for m in matrices]),
+            np.concatenate([m.valores for m in matrices]),
+            np.concatenate([m.textos for m in matrices])
+        )
+
+    def unir_reglas(self, otra):
+        """
+        Une los errores de otra matriz de las mismas filas con reglas propias (p. ej. las
+        validaciones entre filas), que se numeran después de las de esta matriz
+
+        Returns:
+            MatrizErrores: Errores de ambas, ordenados por fila y luego por regla
+        """
+        posiciones = np.concatenate([self.posiciones, otra.posiciones])
+        ids_regla = np.concatenate([self.ids_regla, otra.ids_regla + len(self.columnas_reglas)])
+        orden = np.lexsort((ids_regla, posiciones))
+        return MatrizErrores(
+            self.etiquetas,
+            self.columnas_reglas + otra.columnas_reglas,
+            posiciones[orden],
+            ids_regla[orden],
+            np.concatenate([self.valores, otra.valores])[orden],
+            np.concatenate([self.textos, otra.textos])[orden]
+        )
+
+    def mascara_filas_limpias(self):
+        """Máscara de las filas sin errores"""
+        return self.errores_por_fila == 0
+
+    def mascara_filas_multiples(self, minimo=2):
+        """Máscara de las filas con al menos `minimo` errores"""
+        return self.errores_por_fila >= minimo
+
+    def seleccion_filas(self):
+        """
+        Máscaras de filas limpias y de filas con múltiples errores, calculadas una sola vez
+        y compartidas por los escritores de resultados y los totales de la hoja
+
+        Returns:
+            tuple: (máscara de filas limpias, máscara de filas con 2 o más errores)
+        """
+        if self._seleccion is None:
+            self._seleccion = (self.mascara_filas_limpias(), self.mascara_filas_multiples())
+        return self._seleccion
+
+    def _columnas_errores(self):
+        return np.asarray(self.columnas_reglas, dtype=object)[self.ids_regla]
+
+    def a_dataframe_errores(self):
+        """
+        Returns:
+            pd.DataFrame: Un renglón por error con el formato del reporte consolidado
+        """
+        if len(self) == 0:
+            return pd.DataFrame([])
+        return pd.DataFrame({
+            'Fila de error': (self.etiquetas[self.posiciones] + 2).tolist(),
+            'Columna problema': self._columnas_errores().tolist(),
+            'Valor original incorrecto': self.valores.tolist(),
+            'Reglas de negocio': self.textos.tolist()
+        })
+
+    def a_dataframe_rangos(self):
+        """
+        Returns:
+            pd.DataFrame: Errores comprimidos por tramos: las filas consecutivas con la misma
+                          columna, regla y valor ocupan un solo renglón con su fila inicial y final
+        """
+        if len(self) == 0:
+            return pd.DataFrame([])
+        filas = self.etiquetas[self.posiciones] + 2
+        codigos_valor, _ = pd.factorize(self.valores)
+        codigos_texto, _ = pd.factorize(self.textos)
+        # agrupados por regla, texto y valor, y dentro de cada grupo por fila
+        orden = np.lexsort((filas, codigos_valor, codigos_texto, self.ids_regla))
+        filas, ids_regla = filas[orden], self.ids_regla[orden]
+        codigos_valor, codigos_texto = codigos_valor[orden], codigos_texto[orden]
+        nuevo_tramo = np.ones(len(orden), dtype=bool)
+        nuevo_tramo[1:] = ((ids_regla[1:] != ids_regla[:-1]) | (codigos_texto[1:] != codigos_texto[:-1])
+                           | (codigos_valor[1:] != codigos_valor[:-1]) | (filas[1:] != filas[:-1] + 1))
+        inicios = np.flatnonzero(nuevo_tramo)
+        finales = np.append(inicios[1:], len(orden)) - 1
+        tramos = np.lexsort((ids_regla[inicios], filas[inicios]))
+        inicios, finales = inicios[tramos], finales[tramos]
+        return pd.DataFrame({
+            'Fila inicial': filas[inicios].tolist(),
+            'Fila final': filas[finales].tolist(),
+            'Cantidad de filas': (finales - inicios + 1).tolist(),
+            'Columna problema': self._columnas_errores()[orden[inicios]].tolist(),
+            'Valor original incorrecto': self.valores[orden[inicios]].tolist(),
+            'Reglas de negocio': self.textos[orden[inicios]].tolist()
+        })
+
+    def a_dataframe_multiples(self):
+        """
+        Returns:
+            pd.DataFrame: Errores de las filas con más de un error, con su cantidad por fila
+        """
+        cantidad = self.errores_por_fila[self.posiciones]
+        seleccion = cantidad > 1
+        if not seleccion.any():
+            return pd.DataFrame([])
+        return pd.DataFrame({
+            'Fila de error': (self.etiquetas[self.posiciones[seleccion]] + 2).tolist(),
+            'Columna problema': self._columnas_errores()[seleccion].tolist(),
+            'Valor original incorrecto': self.valores[seleccion].tolist(),
+            'Reglas de negocio': self.textos[seleccion].tolist(),
+            'Cantidad de errores en fila': cantidad[seleccion]
+        })
+
+    def resumen_por_regla(self, max_ejemplos=5):
+        """
+        Agrupa los errores por columna y regla incumplida, en el orden de su primera aparición
+
+        Args:
+            max_ejemplos (int): Cantidad de ejemplos (fila, valor) por grupo
+
+        Returns:
+            list: Tuplas (columna, regla, cantidad, lista de ejemplos (fila de error, valor))
+        """
+        if len(self) == 0:
+            return []
+        errores = pd.DataFrame({
+            'columna': self._columnas_errores(),
+            'regla': self.textos,
+            'fila': self.etiquetas[self.posiciones] + 2,
+            'valor': self.valores
+        })
+        grupos = errores.groupby(['columna', 'regla'], sort=False)
+        cantidades = grupos.size()
+        ejemplos = grupos.head(max_ejemplos)
+        ejemplos_por_grupo = {clave: list(zip(g['fila'].tolist(), g['valor'].tolist()))
+                              for clave, g in ejemplos.groupby(['columna', 'regla'], sort=False)}
+        return [(columna, regla, int(cantidad), ejemplos_por_grupo[(columna, regla)])
+                for (columna, regla), cantidad in cantidades.items()]
+
+    def columnas_por_posicion(self, mascara_filas=None):
+        """
+        Columnas con error de cada fila, opcionalmente solo de las filas seleccionadas
+
+        Args:
+            mascara_filas: Máscara booleana de filas a incluir; None incluye todas
+
+        Returns:
+            dict: Posición (0-based) de la fila -> lista de columnas con error
+        """
+        seleccion = slice(None) if mascara_filas is None else mascara_filas[self.posiciones]
+        posiciones = self.posiciones[seleccion]
+        if len(posiciones) == 0:
+            return {}
+        columnas = self._columnas_errores()[seleccion]
+        cortes = np.flatnonzero(np.diff(posiciones)) + 1
+        inicios = np.concatenate(([0], cortes))
+        return {posicion: grupo.tolist()
+                for posicion, grupo in zip(posiciones[inicios].tolist(), np.split(columnas, cortes))}
+
+    def reglas_por_celda(self, max_celdas=None):
+        """
+        Reglas incumplidas de cada celda con error, para anotar las celdas de la hoja
+
+        Args:
+            max_celdas (int): Cantidad máxima de celdas, las primeras en orden de fila; None incluye todas
+
+        Returns:
+            dict: Posición (0-based) de la fila -> {columna: reglas incumplidas, una por línea}
+        """
+        celdas = defaultdict(dict)
+        cantidad = 0
+        for posicion, columna, texto in zip(self.posiciones.tolist(), self._columnas_errores(), self.textos):
+            reglas = celdas[posicion].get(columna) if posicion in celdas else None
+            if reglas is not None:
+                celdas[posicion][columna] = f"{reglas}\n{texto}"
+            elif max_celdas is None or cantidad < max_celdas:
+                celdas[posicion][columna] = texto
+                cantidad += 1
+        return dict(celdas)
+
+    def tramos_por_columna(self):
+        """
+        Tramos de filas consecutivas con error de cada columna, sin importar la regla, para
+        resaltar las celdas con error por rangos en lugar de celda por celda
+
+        Returns:
+            dict: Columna -> lista de (posición inicial, posición final), 0-based e inclusivas
+        """
+        if len(self) == 0:
+            return {}
+        codigos, columnas = pd.factorize(self._columnas_errores())
+        orden = np.lexsort((self.posiciones, codigos))
+        codigos, posiciones = codigos[orden], self.posiciones[orden]
+        nuevo_tramo = np.ones(len(orden), dtype=bool)
+        nuevo_tramo[1:] = (codigos[1:] != codigos[:-1]) | (posiciones[1:] > posiciones[:-1] + 1)
+        inicios = np.flatnonzero(nuevo_tramo)
+        finales = np.append(inicios[1:], len(orden)) - 1
+        tramos = defaultdict(list)
+        for codigo, inicio, final in zip(codigos[inicios].tolist(), posiciones[inicios].tolist(),
+                                         posiciones[finales].tolist()):
+            tramos[columnas[codigo]].append((inicio, final))
+        return dict(tramos)
+
+    def celdas_con_errores(self):
+        """
+        Returns:
+            defaultdict: 'Fila de error' -> lista de columnas con error, como en el motor por filas
+        """
+        celdas = defaultdict(list)
+        for posicion, columnas in self.columnas_por_posicion().items():
+            celdas[int(self.etiquetas[posicion]) + 2] = columnas
+        return celdas
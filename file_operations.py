@@ -1,10 +1,23 @@
 """
 Módulo para operaciones de lectura y escritura de archivos Excel
 """
+import os
+import time
+from datetime import datetime
+import numpy as np
 import pandas as pd
-from openpyxl.styles import PatternFill
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.comments import Comment
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import PatternFill, NamedStyle
 from openpyxl.utils import get_column_letter
 import logging
+from config import (USAR_SNAPSHOT, CARGA_COMPACTA, FILAS_POR_PARTICION, FORMATO_DATOS_LIMPIOS,
+                    AUTOR_COMENTARIOS, MAX_COMENTARIOS_ANOTADO, REPORTE_ERRORES)
+from columnar_snapshot import PARQUET_DISPONIBLE, cargar_snapshot, guardar_snapshot
+from compact_dtypes import compactar_hoja
+from metrics import METRICAS
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +52,123 @@ def cargar_hoja_excel(ruta_archivo, nombre_hoja):
         return None
 
 
+def _registrar_hoja_cargada(hojas, nombre_hoja, df, origen, duracion, compacto=False):
+    """
+    Registra una hoja cargada y la agrega al diccionario de hojas si no está vacía,
+    convertida a HojaCompacta si se pide la carga compacta
+    """
+    METRICAS.registrar_etapa('cargar', duracion, len(df))
+    logger.info(f"Hoja '{nombre_hoja}' cargada correctamente del archivo: {origen} "
+                f"({len(df)} filas, {len(df.columns)} columnas, {duracion:.2f} s)")
+    print(f"Hoja '{nombre_hoja}' cargada correctamente del archivo: {origen} "
+          f"({len(df)} filas, {len(df.columns)} columnas, {duracion:.2f} s)")
+    
+    if df.empty:
+        mensaje = f"La hoja '{nombre_hoja}' del archivo Excel está vacía."
+        logger.warning(mensaje)
+        print(mensaje)
+        return
+    
+    hojas[nombre_hoja] = compactar_hoja(df, nombre_hoja) if compacto else df
+
+
+def cargar_libro_excel(ruta_archivo, nombres_hojas, columnas=None, usar_snapshot=USAR_SNAPSHOT,
+                       compacto=CARGA_COMPACTA):
+    """
+    Carga varias hojas de un archivo Excel abriendo y descomprimiendo el libro una sola vez;
+    las hojas con una instantánea vigente se cargan de ella sin abrir el libro
+    
+    Args:
+        ruta_archivo (str): Ruta al archivo Excel
+        nombres_hojas (list): Nombres de las hojas a cargar
+        columnas (set): Columnas a leer; None lee todas las columnas de cada hoja
+        usar_snapshot (bool): Lee y guarda instantáneas columnares de cada hoja
+        compacto (bool): Convierte cada hoja a HojaCompacta apenas se carga
+    
+    Returns:
+        dict: Diccionario con hojas como claves y DataFrames (o HojaCompacta, o None si hay
+              error) como valores
+    """
+    hojas = {nombre_hoja: None for nombre_hoja in nombres_hojas}
+    usecols = None if columnas is None else (lambda col: col in columnas)
+    
+    pendientes = []
+    for nombre_hoja in nombres_hojas:
+        inicio = time.perf_counter()
+        df = cargar_snapshot(ruta_archivo, nombre_hoja, columnas) if usar_snapshot else None
+        if df is None:
+            pendientes.append(nombre_hoja)
+            continue
+        _registrar_hoja_cargada(hojas, nombre_hoja, df, f"{ruta_archivo} (instantánea)",
+                                time.perf_counter() - inicio, compacto)
+    if not pendientes:
+        return hojas
+    
+    try:
+        libro = pd.ExcelFile(ruta_archivo, engine='openpyxl')
+    except Exception as e:
+        mensaje = f"Error al abrir el archivo {ruta_archivo}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return hojas
+    
+    with libro:
+        for nombre_hoja in pendientes:
+            try:
+                inicio = time.perf_counter()
+                df = libro.parse(nombre_hoja, usecols=usecols)
+                duracion = time.perf_counter() - inicio
+            except Exception as e:
+                mensaje = f"Error al cargar la hoja '{nombre_hoja}' del archivo {ruta_archivo}: {str(e)}"
+                logger.error(mensaje)
+                print(mensaje)
+                continue
+            
+            if usar_snapshot:
+                guardar_snapshot(df, ruta_archivo, nombre_hoja, columnas)
+            _registrar_hoja_cargada(hojas, nombre_hoja, df, ruta_archivo, duracion, compacto)
+    
+    return hojas
+
+
+def cargar_tabla(ruta_archivo, columnas=None, compacto=CARGA_COMPACTA):
+    """
+    Carga una tabla Parquet o CSV como una sola hoja, cuyo nombre es el del archivo sin extensión
+    
+    Args:
+        ruta_archivo (str): Ruta al archivo .parquet o .csv
+        columnas (set): Columnas a leer; None lee todas las columnas
+        compacto (bool): Convierte la hoja a HojaCompacta
+    
+    Returns:
+        dict: Diccionario con el nombre de la hoja como clave y el DataFrame (o None si hay error) como valor
+    """
+    nombre_hoja = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    hojas = {nombre_hoja: None}
+    try:
+        inicio = time.perf_counter()
+        if ruta_archivo.lower().endswith('.parquet'):
+            df = pd.read_parquet(ruta_archivo, memory_map=True)
+            if columnas is not None:
+                df = df[[col for col in df.columns if col in columnas]]
+        else:
+            df = pd.read_csv(ruta_archivo, usecols=None if columnas is None else (lambda col: col in columnas))
+        duracion = time.perf_counter() - inicio
+    except Exception as e:
+        mensaje = f"Error al cargar el archivo {ruta_archivo}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return hojas
+    
+    _registrar_hoja_cargada(hojas, nombre_hoja, df, ruta_archivo, duracion, compacto)
+    return hojas
+
+
+def es_tabla_columnar(ruta_archivo):
+    """Indica si el archivo de entrada es una tabla Parquet o CSV en lugar de un libro Excel"""
+    return ruta_archivo.lower().endswith(('.parquet', '.csv'))
+
+
 def guardar_errores_consolidados(errores_por_hoja, ruta_salida):
     """
     Guarda los errores encontrados en un archivo Excel con múltiples hojas
@@ -67,6 +197,36 @@ def guardar_errores_consolidados(errores_por_hoja, ruta_salida):
         print(mensaje)
 
 
+def guardar_periodos_faltantes(periodos_por_hoja, ruta_salida):
+    """
+    Guarda los periodos faltantes por fecha y unidad de cada hoja en un archivo Excel aparte de
+    los errores por fila
+    
+    Args:
+        periodos_por_hoja (dict): Diccionario con hojas como claves y DataFrames de periodos_faltantes
+                                  (o None) como valores
+        ruta_salida (str): Ruta donde se guardará el archivo de periodos faltantes
+    """
+    if not any(df is not None and not df.empty for df in periodos_por_hoja.values()):
+        logger.info(f"No hay periodos faltantes para guardar en el archivo: {ruta_salida}")
+        print(f"No hay periodos faltantes para guardar en el archivo: {ruta_salida}")
+        return
+    
+    try:
+        with pd.ExcelWriter(ruta_salida, engine='openpyxl') as writer:
+            for hoja, df_periodos in periodos_por_hoja.items():
+                if df_periodos is not None and not df_periodos.empty:
+                    hoja_sin_punto = hoja.replace(".", "")
+                    df_periodos.to_excel(writer, sheet_name=hoja_sin_punto, index=False)
+        
+        logger.info(f"Archivo de periodos faltantes guardado correctamente en: {ruta_salida}")
+        print(f"Archivo de periodos faltantes guardado correctamente en: {ruta_salida}")
+    except Exception as e:
+        mensaje = f"Error al guardar el archivo de periodos faltantes: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+
+
 def guardar_filas_con_multiples_errores(datos_originales, celdas_con_errores, ruta_salida):
     """
     Guarda las filas con múltiples errores en un archivo Excel
@@ -76,6 +236,7 @@ def guardar_filas_con_multiples_errores(datos_originales, celdas_con_errores, ru
         celdas_con_errores (dict): Diccionario con hojas como claves y diccionarios de celdas con errores
         ruta_salida (str): Ruta donde se guardará el archivo
     """
+    purple_fill = PatternFill(start_color='D8BFD8', end_color='D8BFD8', fill_type='solid')
     try:
         with pd.ExcelWriter(ruta_salida, engine='openpyxl') as writer:
             for hoja, df_original in datos_originales.items():
@@ -90,18 +251,17 @@ def guardar_filas_con_multiples_errores(datos_originales, celdas_con_errores, ru
                 if not filas_con_multiples_errores:
                     continue
                 
-                indices_filas = [fila_num - 2 for fila_num in filas_con_multiples_errores.keys()]
-                df_filtrado = df_original.iloc[indices_filas].copy()
-                
-                df_filtrado['Cantidad_Errores'] = [len(filas_con_multiples_errores[fila_num]) 
-                                                  for fila_num in filas_con_multiples_errores.keys()]
+                # la selección por posiciones ya es un DataFrame nuevo: se le agrega la columna sin otra copia
+                indices_filas = np.fromiter(filas_con_multiples_errores.keys(), dtype=np.int64,
+                                            count=len(filas_con_multiples_errores)) - 2
+                df_filtrado = df_original.iloc[indices_filas].assign(
+                    Cantidad_Errores=[len(columnas) for columnas in filas_con_multiples_errores.values()])
                 
                 # guardar en Excel
                 hoja_sin_punto = hoja.replace(".", "")
                 df_filtrado.to_excel(writer, sheet_name=hoja_sin_punto, index=False)
                 
                 worksheet = writer.sheets[hoja_sin_punto]
-                purple_fill = PatternFill(start_color='D8BFD8', end_color='D8BFD8', fill_type='solid')
                 
                 columnas_indices = {col: idx for idx, col in enumerate(df_filtrado.columns)}
                 
@@ -148,13 +308,9 @@ def guardar_datos_limpios(datos_originales, celdas_con_errores, ruta_salida):
                     print(f"Hoja '{hoja}' guardada sin cambios (no se encontraron errores)")
                 else:
                     # fila_num es 2-based (fila 2 en Excel = índice 0 en DataFrame)
-                    indices_sin_errores = []
-                    for idx in range(len(df_original)):
-                        fila_num = idx + 2  
-                        if fila_num not in filas_con_errores:
-                            indices_sin_errores.append(idx)
-                    
-                    df_limpio = df_original.iloc[indices_sin_errores].copy()
+                    limpias = np.ones(len(df_original), dtype=bool)
+                    limpias[np.fromiter(filas_con_errores, dtype=np.int64, count=len(filas_con_errores)) - 2] = False
+                    df_limpio = df_original[limpias]
                     
                     hoja_sin_punto = hoja.replace(".", "")
                     df_limpio.to_excel(writer, sheet_name=hoja_sin_punto, index=False)
@@ -175,4 +331,380 @@ def guardar_datos_limpios(datos_originales, celdas_con_errores, ruta_salida):
     except Exception as e:
         mensaje = f"Error al guardar el archivo de datos limpios: {str(e)}"
         logger.error(mensaje)
-        print(mensaje)
\ No newline at end of file
+        print(mensaje)
+
+
+def valores_para_excel(df):
+    """
+    Convierte las columnas de un DataFrame en listas de valores nativos listos para openpyxl,
+    con las mismas convenciones que DataFrame.to_excel (nulos vacíos, infinitos como 'inf')
+    
+    Returns:
+        list: Una lista de valores por columna
+    """
+    columnas = []
+    for col in df.columns:
+        serie = df[col]
+        if serie.dtype.kind == 'f':
+            valores = serie.to_numpy()
+            lista = valores.astype(object)
+            lista[np.isnan(valores)] = None
+            lista[np.isposinf(valores)] = 'inf'
+            lista[np.isneginf(valores)] = '-inf'
+            columnas.append(lista.tolist())
+        elif serie.dtype.kind in 'iub':
+            columnas.append(serie.tolist())
+        else:
+            valores = serie.to_numpy(dtype=object, copy=True)
+            valores[pd.isna(valores)] = None
+            columnas.append(valores.tolist())
+    return columnas
+
+
+def _bloques_de_filas(df):
+    """
+    Recorre una hoja por bloques consecutivos de FILAS_POR_PARTICION filas: vistas de iloc de
+    un DataFrame, o bloques restaurados de una HojaCompacta (que nunca se reconstruye completa)
+    
+    Yields:
+        tuple: (posición de la primera fila, DataFrame del bloque)
+    """
+    for inicio in range(0, len(df), FILAS_POR_PARTICION):
+        if hasattr(df, 'restaurar'):
+            yield inicio, df.restaurar(inicio, inicio + FILAS_POR_PARTICION)
+        else:
+            yield inicio, df.iloc[inicio:inicio + FILAS_POR_PARTICION]
+
+
+def _filas_para_excel(df):
+    """Recorre las filas de una hoja como tuplas de valores listos para openpyxl"""
+    if not hasattr(df, 'restaurar'):
+        yield from zip(*valores_para_excel(df))
+        return
+    for _, bloque in _bloques_de_filas(df):
+        yield from zip(*valores_para_excel(bloque))
+
+
+def ruta_datos_limpios_hoja(ruta_limpios, hoja, formato):
+    """Archivo Parquet o CSV de datos limpios de una hoja, junto al archivo XLSX de datos limpios"""
+    return f"{os.path.splitext(ruta_limpios)[0]}_{hoja.replace('.', '')}.{formato}"
+
+
+def _tipo_valor_parquet(tipo):
+    """Tipo Parquet que le corresponde a una celda de un tipo de Python"""
+    if issubclass(tipo, (bool, np.bool_)):
+        return 'boolean'
+    if issubclass(tipo, (int, np.integer)):
+        return 'Int64'
+    if issubclass(tipo, (float, np.floating)):
+        return 'float64'
+    if issubclass(tipo, datetime):
+        return 'datetime64[ns]'
+    return 'string'
+
+
+def _tipos_parquet(df, limpias):
+    """
+    Tipo Parquet de cada columna object según sus filas limpias, ya que Parquet exige uno por
+    columna: el de sus celdas no vacías si todas son del mismo tipo (fechas, enteros, números o
+    booleanos; los enteros con vacíos quedan como enteros anulables), float64 si mezcla enteros
+    y números o no tiene celdas, y texto si mezcla otros tipos
+    
+    Returns:
+        dict: Columna -> 'datetime64[ns]', 'Int64', 'float64', 'boolean' o 'string'
+    """
+    tipos = None
+    for inicio, bloque in _bloques_de_filas(df):
+        bloque = bloque[limpias[inicio:inicio + len(bloque)]]
+        objetos = [col for col in bloque.columns if bloque[col].dtype == object]
+        if tipos is None:
+            tipos = {col: set() for col in objetos}
+        for col in objetos:
+            if 'string' not in tipos[col]:
+                tipos[col] |= {_tipo_valor_parquet(tipo) for tipo in set(map(type, bloque[col].dropna()))}
+    resultado = {}
+    for col, tipos_col in (tipos or {}).items():
+        if not tipos_col or tipos_col == {'Int64', 'float64'}:
+            resultado[col] = 'float64'
+        elif len(tipos_col) == 1:
+            resultado[col] = tipos_col.pop()
+        else:
+            resultado[col] = 'string'
+    return resultado
+
+
+def guardar_datos_limpios_tabla(df, limpias, ruta_salida, formato):
+    """
+    Escribe las filas limpias de una hoja en Parquet o CSV por bloques de filas: cada bloque
+    toma sus filas con la máscara de la matriz de errores, sin copiar la hoja completa.
+    En Parquet las columnas object se escriben con el tipo de _tipos_parquet
+    
+    Args:
+        df: DataFrame (o HojaCompacta) de la hoja
+        limpias (np.ndarray): Máscara de filas sin errores
+        ruta_salida (str): Archivo a escribir
+        formato (str): 'parquet' o 'csv'
+    
+    Returns:
+        int: Cantidad de filas escritas
+    """
+    escritas = 0
+    escritor = None
+    tipos = _tipos_parquet(df, limpias) if formato == 'parquet' else {}
+    try:
+        for inicio, bloque in _bloques_de_filas(df):
+            bloque = bloque[limpias[inicio:inicio + len(bloque)]]
+            if formato == 'csv':
+                bloque.to_csv(ruta_salida, mode='w' if inicio == 0 else 'a', header=inicio == 0, index=False)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                tabla = pa.Table.from_pandas(bloque.astype(tipos) if tipos else bloque, preserve_index=False,
+                                             schema=None if escritor is None else escritor.schema)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(ruta_salida, tabla.schema)
+                escritor.write_table(tabla)
+            escritas += len(bloque)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return escritas
+
+
+def _relleno_error():
+    """Relleno de las celdas con error resaltadas"""
+    return PatternFill(start_color='D8BFD8', end_color='D8BFD8', fill_type='solid')
+
+
+def _registrar_estilos_error(libro):
+    """
+    Registra en el libro los estilos compartidos por todas las celdas con error resaltadas
+    
+    Returns:
+        tuple: (nombre del estilo general, nombre del estilo para fechas)
+    """
+    relleno = _relleno_error()
+    estilo = NamedStyle(name='celda_con_error', fill=relleno)
+    estilo_fecha = NamedStyle(name='celda_con_error_fecha', fill=relleno, number_format='YYYY-MM-DD HH:MM:SS')
+    libro.add_named_style(estilo)
+    libro.add_named_style(estilo_fecha)
+    return estilo.name, estilo_fecha.name
+
+
+def _celdas_comentadas(hoja_salida, encabezado, fila, reglas_celdas, estilos):
+    """
+    Valores de una fila con un comentario en cada celda con error con las reglas que incumple;
+    la celda comentada lleva además el estilo compartido, sin el cual openpyxl reutiliza la
+    misma celda (y su comentario) para los valores siguientes de la fila
+    
+    Args:
+        hoja_salida: Hoja de solo escritura donde se agrega la fila
+        encabezado (list): Columnas de la hoja
+        fila (tuple): Valores de la fila
+        reglas_celdas (dict): Columna -> reglas incumplidas
+        estilos (tuple): (nombre del estilo general, nombre del estilo para fechas)
+    
+    Returns:
+        list: Valores y WriteOnlyCell de la fila
+    """
+    celdas_fila = []
+    for col, valor in zip(encabezado, fila):
+        reglas = reglas_celdas.get(col)
+        if reglas is not None:
+            es_fecha = isinstance(valor, datetime)
+            valor = WriteOnlyCell(hoja_salida, valor)
+            valor.style = estilos[1] if es_fecha else estilos[0]
+            valor.comment = Comment(reglas, AUTOR_COMENTARIOS)
+        celdas_fila.append(valor)
+    return celdas_fila
+
+
+def _resaltar_tramos(hoja_salida, encabezado, tramos_por_columna):
+    """
+    Resalta las celdas con error con una sola regla de formato condicional cuyos rangos son
+    los tramos de filas consecutivas con error de cada columna (la fila 1 es el encabezado)
+    
+    Args:
+        hoja_salida: Hoja donde se agrega el formato condicional
+        encabezado (list): Columnas de la hoja
+        tramos_por_columna (dict): Columna -> lista de (posición inicial, posición final)
+    """
+    rangos = []
+    for col, tramos in tramos_por_columna.items():
+        letra = get_column_letter(encabezado.index(col) + 1)
+        rangos.extend(f"{letra}{inicio + 2}" if inicio == final else f"{letra}{inicio + 2}:{letra}{final + 2}"
+                      for inicio, final in tramos)
+    if rangos:
+        hoja_salida.conditional_formatting.add(" ".join(rangos),
+                                               FormulaRule(formula=['TRUE'], fill=_relleno_error()))
+
+
+def guardar_resultados(datos_originales, matrices_por_hoja, ruta_errores, ruta_multiples, ruta_limpios,
+                       formato_limpios=FORMATO_DATOS_LIMPIOS, ruta_anotado=None, reporte_errores=REPORTE_ERRORES,
+                       max_comentarios=MAX_COMENTARIOS_ANOTADO):
+    """
+    Genera en una sola pasada por hoja los tres archivos de resultados (errores consolidados,
+    filas con múltiples errores y datos limpios) con hojas de solo escritura; las filas de cada
+    archivo se eligen con las máscaras de la matriz de errores, sin copiar la hoja
+    
+    Args:
+        datos_originales (dict): Diccionario con hojas como claves y DataFrames originales (o
+                                 HojaCompacta) como valores
+        matrices_por_hoja (dict): Diccionario con hojas como claves y MatrizErrores como valores
+        ruta_errores (str): Ruta del archivo de errores consolidado
+        ruta_multiples (str): Ruta del archivo con filas de múltiples errores
+        ruta_limpios (str): Ruta del archivo de datos limpios
+        formato_limpios (str): 'xlsx', o 'parquet'/'csv' para escribir los datos limpios de
+                               cada hoja en su propio archivo (ver ruta_datos_limpios_hoja)
+        ruta_anotado (str): Ruta de la copia anotada de las hojas completas, con las celdas con
+                            error resaltadas por formato condicional; None no la genera
+        reporte_errores (str): 'detallado', 'rangos' o 'ambos' (ver config.REPORTE_ERRORES)
+        max_comentarios (int): Celdas con error comentadas por hoja en la copia anotada
+                               (ver config.MAX_COMENTARIOS_ANOTADO)
+    """
+    if formato_limpios == 'parquet' and not PARQUET_DISPONIBLE:
+        raise ValueError("El formato parquet para los datos limpios requiere pyarrow")
+    limpios_en_xlsx = formato_limpios == 'xlsx'
+    libro_errores = Workbook(write_only=True)
+    libro_multiples = Workbook(write_only=True)
+    libro_limpios = Workbook(write_only=True)
+    estilo_error, estilo_error_fecha = _registrar_estilos_error(libro_multiples)
+    libro_anotado = None
+    if ruta_anotado is not None:
+        libro_anotado = Workbook(write_only=True)
+        estilos_anotado = _registrar_estilos_error(libro_anotado)
+    total_filas_eliminadas = 0
+    
+    try:
+        for hoja, df_original in datos_originales.items():
+            matriz = matrices_por_hoja.get(hoja)
+            if df_original is None or df_original.empty or matriz is None:
+                continue
+            hoja_sin_punto = hoja.replace(".", "")
+            
+            with METRICAS.etapa('guardar_errores', len(matriz)):
+                reportes = []
+                if reporte_errores != 'rangos':
+                    reportes.append((hoja_sin_punto, matriz.a_dataframe_errores()))
+                if reporte_errores != 'detallado':
+                    nombre = hoja_sin_punto if reporte_errores == 'rangos' else f"{hoja_sin_punto} rangos"
+                    reportes.append((nombre, matriz.a_dataframe_rangos()))
+                for nombre, df_errores in reportes:
+                    if df_errores.empty:
+                        continue
+                    hoja_errores = libro_errores.create_sheet(nombre)
+                    hoja_errores.append(list(df_errores.columns))
+                    for fila in zip(*valores_para_excel(df_errores)):
+                        hoja_errores.append(fila)
+            
+            inicio = time.perf_counter()
+            # selección de filas derivada de la matriz: limpias y con 2 o más errores
+            limpias, multiples = matriz.seleccion_filas()
+            columnas_multiples = matriz.columnas_por_posicion(multiples)
+            
+            encabezado = list(df_original.columns)
+            hoja_limpios = None
+            if limpios_en_xlsx:
+                hoja_limpios = libro_limpios.create_sheet(hoja_sin_punto)
+                hoja_limpios.append(encabezado)
+            else:
+                ruta_hoja = ruta_datos_limpios_hoja(ruta_limpios, hoja, formato_limpios)
+                guardar_datos_limpios_tabla(df_original, limpias, ruta_hoja, formato_limpios)
+                logger.info(f"Datos limpios de la hoja '{hoja}' guardados en: {ruta_hoja}")
+                print(f"Datos limpios de la hoja '{hoja}' guardados en: {ruta_hoja}")
+            hoja_multiples = None
+            hoja_anotada = None
+            if libro_anotado is not None:
+                hoja_anotada = libro_anotado.create_sheet(hoja_sin_punto)
+                hoja_anotada.append(encabezado)
+                comentarios = matriz.reglas_por_celda(max_comentarios) if max_comentarios != 0 else {}
+            # la pasada es compartida: se cronometran solo las filas con múltiples errores (pocas)
+            # y las de la copia anotada, y el resto del tiempo se atribuye a los datos limpios
+            segundos_multiples = 0.0
+            segundos_anotado = 0.0
+            
+            # una sola pasada por las filas: cada una va al archivo limpio o, con 2+ errores, al de
+            # revisión, y a la copia anotada; sin archivo limpio XLSX ni copia anotada solo hace
+            # falta si hay filas para revisar
+            recorrer = limpios_en_xlsx or hoja_anotada is not None or columnas_multiples
+            for idx, fila in enumerate(_filas_para_excel(df_original) if recorrer else ()):
+                if hoja_anotada is not None:
+                    inicio_fila = time.perf_counter()
+                    reglas_celdas = comentarios.get(idx)
+                    hoja_anotada.append(fila if reglas_celdas is None else _celdas_comentadas(
+                        hoja_anotada, encabezado, fila, reglas_celdas, estilos_anotado))
+                    segundos_anotado += time.perf_counter() - inicio_fila
+                if limpias[idx]:
+                    if hoja_limpios is not None:
+                        hoja_limpios.append(fila)
+                    continue
+                columnas_error = columnas_multiples.get(idx)
+                if columnas_error is None:
+                    continue
+                inicio_fila = time.perf_counter()
+                if hoja_multiples is None:
+                    hoja_multiples = libro_multiples.create_sheet(hoja_sin_punto)
+                    hoja_multiples.append(encabezado + ['Cantidad_Errores'])
+                celdas_fila = []
+                for col, valor in zip(encabezado, fila):
+                    if col in columnas_error:
+                        es_fecha = isinstance(valor, datetime)
+                        valor = WriteOnlyCell(hoja_multiples, valor)
+                        valor.style = estilo_error_fecha if es_fecha else estilo_error
+                    celdas_fila.append(valor)
+                hoja_multiples.append(celdas_fila + [len(columnas_error)])
+                segundos_multiples += time.perf_counter() - inicio_fila
+            
+            if hoja_anotada is not None:
+                inicio_tramos = time.perf_counter()
+                _resaltar_tramos(hoja_anotada, encabezado, matriz.tramos_por_columna())
+                segundos_anotado += time.perf_counter() - inicio_tramos
+            
+            filas_eliminadas = int((~limpias).sum())
+            METRICAS.registrar_etapa('guardar_multiples', segundos_multiples, len(columnas_multiples))
+            if hoja_anotada is not None:
+                METRICAS.registrar_etapa('guardar_anotado', segundos_anotado, len(df_original))
+            METRICAS.registrar_etapa('guardar_limpios',
+                                     time.perf_counter() - inicio - segundos_multiples - segundos_anotado,
+                                     len(df_original) - filas_eliminadas)
+            total_filas_eliminadas += filas_eliminadas
+            if filas_eliminadas:
+                logger.info(f"Hoja '{hoja}': {filas_eliminadas} filas con errores eliminadas, "
+                          f"{len(df_original) - filas_eliminadas} filas guardadas")
+                print(f"Hoja '{hoja}': {filas_eliminadas} filas con errores eliminadas, "
+                      f"{len(df_original) - filas_eliminadas} filas guardadas")
+            else:
+                logger.info(f"Hoja '{hoja}' guardada sin cambios (no se encontraron errores)")
+                print(f"Hoja '{hoja}' guardada sin cambios (no se encontraron errores)")
+    except Exception as e:
+        mensaje = f"Error al generar los archivos de resultados: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return
+    
+    destinos = [
+        (libro_errores, ruta_errores, "Archivo de errores consolidado", 'guardar_errores'),
+        (libro_multiples, ruta_multiples, "Archivo con filas de múltiples errores", 'guardar_multiples'),
+        (libro_limpios, ruta_limpios, "Archivo de datos limpios", 'guardar_limpios')
+    ]
+    if not limpios_en_xlsx:
+        destinos.pop()
+    if libro_anotado is not None:
+        destinos.append((libro_anotado, ruta_anotado, "Archivo anotado", 'guardar_anotado'))
+    for libro, ruta_salida, descripcion, etapa in destinos:
+        if not libro.worksheets:
+            logger.info(f"No hay datos para guardar en el archivo: {ruta_salida}")
+            print(f"No hay datos para guardar en el archivo: {ruta_salida}")
+            continue
+        try:
+            with METRICAS.etapa(etapa):
+                libro.save(ruta_salida)
+            logger.info(f"{descripcion} guardado correctamente en: {ruta_salida}")
+            print(f"{descripcion} guardado correctamente en: {ruta_salida}")
+        except Exception as e:
+            mensaje = f"Error al guardar el archivo {ruta_salida}: {str(e)}"
+            logger.error(mensaje)
+            print(mensaje)
+    
+    logger.info(f"Total de filas eliminadas: {total_filas_eliminadas}")
+    print(f"Total de filas eliminadas: {total_filas_eliminadas}")
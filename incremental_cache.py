@@ -0,0 +1,143 @@
+"""
+Revalidación incremental: guarda en un archivo de caché local el hash de cada bloque
+de filas y sus errores, y en la siguiente ejecución solo valida los bloques que cambiaron
+"""
+import os
+import pickle
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from config import VERSION_REGLAS, MOTOR_VALIDACION, FILAS_POR_BLOQUE_CACHE
+from validation_engine import ejecutar_motor, combinar_resultados, agregar_validaciones_cruzadas, registrar_resumen
+from parallel_validation import particionar
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_vacia():
+    return {'version': VERSION_REGLAS, 'hojas': {}}
+
+
+def cargar_cache(ruta_cache):
+    """
+    Lee la caché de una ejecución anterior
+
+    Args:
+        ruta_cache (str): Ruta del archivo de caché
+
+    Returns:
+        dict: Caché con 'version' y 'hojas'; vacía si no existe, no se puede leer o
+              se generó con otra versión de las reglas
+    """
+    if not os.path.exists(ruta_cache):
+        return _cache_vacia()
+    try:
+        with open(ruta_cache, 'rb') as archivo:
+            cache = pickle.load(archivo)
+    except Exception as e:
+        mensaje = f"Error al leer la caché {ruta_cache}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return _cache_vacia()
+
+    if cache.get('version') != VERSION_REGLAS:
+        logger.info(f"La caché {ruta_cache} corresponde a otra versión de las reglas; se descarta")
+        print(f"La caché {ruta_cache} corresponde a otra versión de las reglas; se descarta")
+        return _cache_vacia()
+    return cache
+
+
+def guardar_cache(ruta_cache, cache):
+    """
+    Escribe la caché en disco
+
+    Args:
+        ruta_cache (str): Ruta del archivo de caché
+        cache (dict): Caché actualizada por validar_hoja_incremental
+    """
+    try:
+        with open(ruta_cache, 'wb') as archivo:
+            pickle.dump(cache, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.info(f"Caché de validación guardada en: {ruta_cache}")
+    except Exception as e:
+        mensaje = f"Error al guardar la caché {ruta_cache}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+
+
+def _firma_hoja(df):
+    """
+    Columnas y tipos de la hoja completa: determinan qué reglas aplican y cómo se
+    muestra cada valor con error, así que un cambio invalida todos los bloques
+    """
+    return repr((list(df.columns), [str(tipo) for tipo in df.dtypes]))
+
+
+def _hash_bloque(bloque):
+    """
+    Hash del contenido de un bloque, incluido su índice (la 'Fila de error') y el
+    tipo de cada valor de las columnas object (1, 1.0 y '1' no validan igual)
+    """
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(bloque, index=True).to_numpy().tobytes())
+    for columna in bloque.columns:
+        if bloque[columna].dtype == object:
+            tipos = np.array([type(valor).__name__ for valor in bloque[columna].to_numpy()], dtype=object)
+            h.update(pd.util.hash_array(tipos).tobytes())
+    return h.hexdigest()
+
+
+def validar_hoja_incremental(df, nombre_hoja, cache, motor=MOTOR_VALIDACION,
+                             filas_por_bloque=FILAS_POR_BLOQUE_CACHE):
+    """
+    Valida una hoja reutilizando los resultados de los bloques de filas sin cambios
+
+    Args:
+        df: DataFrame de la hoja completa
+        nombre_hoja (str): Nombre de la hoja
+        cache (dict): Caché leída con cargar_cache; se actualiza con los bloques actuales
+        motor (str): Motor de validación para los bloques nuevos o modificados
+        filas_por_bloque (int): Cantidad de filas por bloque
+
+    Returns:
+        MatrizErrores: Igual a la de validar la hoja completa
+    """
+    firma = _firma_hoja(df)
+    anterior = cache['hojas'].get(nombre_hoja)
+    bloques_anteriores = anterior['bloques'] if anterior and anterior['firma'] == firma else {}
+
+    bloques = particionar(df, filas_por_bloque)
+    if not bloques:
+        with METRICAS.etapa('validar', len(df)):
+            matriz = ejecutar_motor(df, motor)
+        registrar_resumen(nombre_hoja, len(matriz))
+        return matriz
+
+    matrices = []
+    bloques_actuales = {}
+    reutilizados = 0
+    for bloque in bloques:
+        clave = _hash_bloque(bloque)
+        matriz = bloques_anteriores.get(clave)
+        if matriz is None:
+            with METRICAS.etapa('validar', len(bloque)) as medida:
+                matriz = ejecutar_motor(bloque, motor)
+                medida['errores'] = len(matriz)
+        else:
+            reutilizados += 1
+        bloques_actuales[clave] = matriz
+        matrices.append(matriz)
+
+    # solo se conservan los bloques de la versión actual de la hoja
+    cache['hojas'][nombre_hoja] = {'firma': firma, 'bloques': bloques_actuales}
+    logger.info(f"Hoja '{nombre_hoja}': {reutilizados} de {len(bloques)} bloques tomados de la caché, "
+                f"{len(bloques) - reutilizados} validados")
+    print(f"Hoja '{nombre_hoja}': {reutilizados} de {len(bloques)} bloques tomados de la caché, "
+          f"{len(bloques) - reutilizados} validados")
+
+    # las validaciones entre filas dependen de la hoja completa y no se guardan por bloque
+    matriz = agregar_validaciones_cruzadas(df, combinar_resultados(matrices))
+    registrar_resumen(nombre_hoja, len(matriz))
+    return matriz
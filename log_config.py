@@ -0,0 +1,55 @@
+"""
+Configuración del logging: el archivo de log se escribe desde un hilo en segundo plano
+(QueueHandler + QueueListener) y el detalle de errores por celda va a un logger propio,
+desactivado salvo que se pida
+"""
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from config import LOGGING_CONFIG, LOGGING_ASINCRONO, DETALLE_ERRORES_POR_CELDA
+
+# Logger con una línea por celda con error; el resumen por regla usa los loggers de cada módulo
+LOGGER_DETALLE = 'errores_por_celda'
+
+
+def activar_detalle(activo=DETALLE_ERRORES_POR_CELDA):
+    """Activa o desactiva las líneas de log por celda con error"""
+    logging.getLogger(LOGGER_DETALLE).setLevel(logging.WARNING if activo else logging.CRITICAL + 1)
+
+
+def configurar_logging(asincrono=LOGGING_ASINCRONO, detalle=DETALLE_ERRORES_POR_CELDA, nombre_archivo=None):
+    """
+    Configura el logger raíz con el archivo de LOGGING_CONFIG, como logging.basicConfig,
+    y no hace nada si ya tiene handlers
+
+    Args:
+        asincrono (bool): Escribe el archivo desde un QueueListener en segundo plano
+        detalle (bool): Registra también una línea por cada celda con error
+        nombre_archivo (str): Archivo de log; None usa LOGGING_CONFIG['filename']
+
+    Returns:
+        QueueListener: Listener iniciado (hay que detenerlo con detener_logging) o None
+    """
+    activar_detalle(detalle)
+    raiz = logging.getLogger()
+    if raiz.handlers:
+        return None
+
+    manejador = logging.FileHandler(nombre_archivo or LOGGING_CONFIG['filename'])
+    manejador.setFormatter(logging.Formatter(LOGGING_CONFIG['format'], LOGGING_CONFIG['datefmt']))
+    raiz.setLevel(getattr(logging, LOGGING_CONFIG['level']))
+    if not asincrono:
+        raiz.addHandler(manejador)
+        return None
+
+    cola = queue.SimpleQueue()
+    raiz.addHandler(QueueHandler(cola))
+    listener = QueueListener(cola, manejador, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def detener_logging(listener):
+    """Vacía la cola de log pendiente y detiene el hilo del listener"""
+    if listener is not None:
+        listener.stop()
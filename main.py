@@ -2,17 +2,26 @@
 Programa principal para validación de archivos Excel
 """
 import os
+import argparse
+import cProfile
 import logging
-from config import LOGGING_CONFIG
-from file_operations import cargar_hoja_excel, guardar_errores_consolidados, guardar_filas_con_multiples_errores, guardar_datos_limpios
-from validation_engine import validar_dataframe
-
-logging.basicConfig(
-    filename=LOGGING_CONFIG['filename'],
-    level=getattr(logging, LOGGING_CONFIG['level']),
-    format=LOGGING_CONFIG['format'],
-    datefmt=LOGGING_CONFIG['datefmt']
-)
+from config import (COLUMNAS_SALIDA, TAMANO_BLOQUE_STREAMING, SUFIJO_CACHE_INCREMENTAL,
+                    ARCHIVO_METRICAS, ARCHIVO_PERFIL, HOJAS_POR_DEFECTO, CARGA_COMPACTA,
+                    FORMATO_DATOS_LIMPIOS, LIBRO_ANOTADO, REPORTE_ERRORES, BASE_RESULTADOS,
+                    VALIDACIONES_CRUZADAS)
+from file_operations import (cargar_hoja_excel, cargar_libro_excel, cargar_tabla, es_tabla_columnar,
+                             guardar_resultados, guardar_periodos_faltantes)
+from validation_engine import (validar_dataframe, validar_dataframe_matriz, validar_hoja_compacta,
+                               periodos_faltantes_por_hoja)
+from cross_row_validation import VALIDACION_HOJA
+from rule_compiler import columnas_requeridas
+from streaming_validation import validar_archivo_streaming
+from parallel_validation import validar_hojas_en_paralelo
+from incremental_cache import cargar_cache, guardar_cache, validar_hoja_incremental
+from columnar_snapshot import PARQUET_DISPONIBLE
+from metrics import METRICAS, guardar_perfil
+from results_store import guardar_ejecucion
+from log_config import configurar_logging, detener_logging
 
 logger = logging.getLogger(__name__)
 
@@ -40,57 +49,245 @@ def validar_archivo_excel(ruta_archivo, nombre_hoja):
     return validar_dataframe(df, nombre_hoja)
 
 
-def main():
+def validar_hoja(df, nombre_hoja, ruta_archivo):
+    """
+    Valida una hoja ya cargada
+    
+    Args:
+        df (pd.DataFrame): Datos de la hoja (o HojaCompacta) o None si no se pudo cargar
+        nombre_hoja (str): Nombre de la hoja a validar
+        ruta_archivo (str): Ruta al archivo Excel, para logging
+    
+    Returns:
+        MatrizErrores: Errores de la hoja o None si no se pudo cargar
+    """
+    if df is None:
+        return None
+    
+    logger.info(f"Iniciando validación de la hoja '{nombre_hoja}' del archivo: {ruta_archivo}")
+    if hasattr(df, 'restaurar'):
+        return validar_hoja_compacta(df, nombre_hoja)
+    return validar_dataframe_matriz(df, nombre_hoja)
+
+
+def parsear_argumentos(argv=None):
     """
-    Función principal que ejecuta la validación del archivo Excel
+    Lee las opciones de línea de comandos
+    
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+    
+    Returns:
+        argparse.Namespace: Opciones de ejecución
+    """
+    parser = argparse.ArgumentParser(description="Validación de archivos Excel")
+    parser.add_argument('--archivo', default="DATA_BASE.xlsx",
+                        help="Libro Excel a validar, o una tabla .parquet/.csv con una sola hoja")
+    parser.add_argument('--hojas', nargs='+', default=HOJAS_POR_DEFECTO,
+                        help="Hojas del libro a validar")
+    parser.add_argument('--directorio-salida', default='.',
+                        help="Directorio donde se escriben los tres archivos de resultados")
+    parser.add_argument('--formato-limpios', choices=['xlsx', 'parquet', 'csv'], default=FORMATO_DATOS_LIMPIOS,
+                        help="Formato de los datos limpios; parquet y csv escriben un archivo por hoja")
+    parser.add_argument('--reporte-errores', choices=['detallado', 'rangos', 'ambos'], default=REPORTE_ERRORES,
+                        help="Errores consolidados por celda, por tramos de filas consecutivas con la misma "
+                             "columna, regla y valor, o ambos")
+    parser.add_argument('--anotado', action='store_true', default=LIBRO_ANOTADO,
+                        help="Genera una copia completa de las hojas con las celdas con error resaltadas y las "
+                             "primeras comentadas (config.MAX_COMENTARIOS_ANOTADO); escribirla cuesta lo mismo "
+                             "que el archivo de datos limpios: unos 400 s y 190 MB más por millón de filas")
+    parser.add_argument('--sin-snapshot', action='store_true',
+                        help="Parsea siempre el libro Excel sin usar ni guardar instantáneas columnares")
+    parser.add_argument('--compacto', action='store_true', default=CARGA_COMPACTA,
+                        help="Guarda cada hoja con tipos compactos (categorías, enteros pequeños, float32) "
+                             "y la valida y escribe por bloques restaurados")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Valida por bloques de filas con memoria acotada, escribiendo los resultados a medida que avanza")
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE_STREAMING,
+                        help="Cantidad de filas por bloque en modo streaming")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Cantidad de procesos para validar hojas y rangos de filas en paralelo")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Solo valida los bloques de filas que cambiaron desde la ejecución anterior")
+    parser.add_argument('--base-resultados', default=BASE_RESULTADOS,
+                        help="Base SQLite donde se agregan los metadatos, conteos por regla y errores de la ejecución")
+    parser.add_argument('--metricas', default=ARCHIVO_METRICAS,
+                        help="Archivo JSON con las métricas de rendimiento por etapa y por regla")
+    parser.add_argument('--log-detallado', action='store_true',
+                        help="Registra en el log una línea por cada celda con error además del resumen por regla")
+    parser.add_argument('--perfil', action='store_true',
+                        help=f"Perfila la ejecución con cProfile y guarda las estadísticas en {ARCHIVO_PERFIL}")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser mayor o igual a 1")
+    if args.streaming and args.workers > 1:
+        parser.error("--workers no se puede combinar con --streaming")
+    if args.incremental and (args.streaming or args.workers > 1):
+        parser.error("--incremental no se puede combinar con --streaming ni con --workers")
+    if args.compacto and (args.streaming or args.workers > 1 or args.incremental):
+        parser.error("--compacto no se puede combinar con --streaming, --workers ni --incremental")
+    if args.streaming and args.formato_limpios != 'xlsx':
+        parser.error("--formato-limpios parquet o csv no se puede combinar con --streaming")
+    if args.streaming and args.anotado:
+        parser.error("--anotado no se puede combinar con --streaming")
+    if args.streaming and args.reporte_errores != 'detallado':
+        parser.error("--reporte-errores rangos o ambos no se puede combinar con --streaming")
+    if args.streaming and args.base_resultados:
+        parser.error("--base-resultados no se puede combinar con --streaming")
+    if args.formato_limpios == 'parquet' and not PARQUET_DISPONIBLE:
+        parser.error("--formato-limpios parquet requiere pyarrow")
+    if args.streaming and es_tabla_columnar(args.archivo):
+        parser.error("--streaming solo admite libros Excel")
+    return args
+
+
+def rutas_salida(ruta_archivo, directorio_salida='.'):
+    """
+    Nombres de los archivos de resultados de un archivo de entrada
+    
+    Args:
+        ruta_archivo (str): Archivo validado
+        directorio_salida (str): Directorio de los resultados
+    
+    Returns:
+        tuple: (errores consolidados, filas con múltiples errores, datos limpios)
+    """
+    base = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    return (os.path.join(directorio_salida, f"errores_{base}_consolidado.xlsx"),
+            os.path.join(directorio_salida, "Posibles_filas_a_borrar.xlsx"),
+            os.path.join(directorio_salida, f"{base}_limpio.xlsx"))
+
+
+def ruta_anotado(ruta_archivo, directorio_salida='.'):
+    """Nombre de la copia anotada de un archivo de entrada"""
+    base = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    return os.path.join(directorio_salida, f"{base}_anotado.xlsx")
+
+
+def ruta_periodos_faltantes(ruta_archivo, directorio_salida='.'):
+    """Nombre del reporte de periodos faltantes por fecha y unidad de un archivo de entrada"""
+    base = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    return os.path.join(directorio_salida, f"periodos_faltantes_{base}.xlsx")
+
+
+def _totales_hoja(df, matriz):
+    """Totales de validación de una hoja cargada, con las mismas claves que el modo streaming"""
+    if df is None or matriz is None:
+        return None
+    filas_limpias = int(matriz.seleccion_filas()[0].sum())
+    return {'filas': len(df), 'errores': len(matriz), 'filas_con_errores': len(df) - filas_limpias,
+            'filas_limpias': filas_limpias}
+
+
+def ejecutar_validacion(args):
+    """
+    Ejecuta la validación del archivo Excel con las opciones indicadas
+    
+    Args:
+        args (argparse.Namespace): Opciones de ejecución
+    
+    Returns:
+        dict: Diccionario con hojas como claves y totales de validación (o None si la hoja
+              no se pudo validar) como valores; None si el archivo no existe
     """
     # Archivo Excel a procesar
-    ruta_archivo = "DATA_BASE.xlsx"
+    ruta_archivo = args.archivo
     
     # Validar que el archivo exista
     if not os.path.exists(ruta_archivo):
         logger.error(f"El archivo {ruta_archivo} no existe.")
         print(f"El archivo {ruta_archivo} no existe.")
-        return
+        return None
     
     # Hojas a procesar
-    hojas = ["G3.0", "G3.2"]
-    
-    # Diccionarios para almacenar resultados
-    errores_por_hoja = {}
-    multiples_errores_por_hoja = {}
-    datos_originales = {}
-    celdas_con_errores_por_hoja = {}
-    
-    # Procesar cada hoja
-    for hoja in hojas:
-        print(f"\n{'='*50}")
-        print(f"Procesando hoja: {hoja}")
-        print(f"{'='*50}")
-        
-        df_errores, df_multiples_errores, df_original, celdas_con_errores = validar_archivo_excel(
-            ruta_archivo, hoja
-        )
-        
-        # Almacenar resultados
-        errores_por_hoja[hoja] = df_errores
-        multiples_errores_por_hoja[hoja] = df_multiples_errores
-        datos_originales[hoja] = df_original
-        celdas_con_errores_por_hoja[hoja] = celdas_con_errores
-    
-    # Guardar resultados
-    ruta_errores_consolidados = "errores_DATA_BASE_consolidado.xlsx"
-    guardar_errores_consolidados(errores_por_hoja, ruta_errores_consolidados)
-    
-    ruta_filas_a_borrar = "Posibles_filas_a_borrar.xlsx"
-    guardar_filas_con_multiples_errores(datos_originales, celdas_con_errores_por_hoja, ruta_filas_a_borrar)
-    
-    # Guardar archivo limpio sin filas con errores
-    ruta_datos_limpios = "DATA_BASE_limpio.xlsx"
-    guardar_datos_limpios(datos_originales, celdas_con_errores_por_hoja, ruta_datos_limpios)
+    hojas = list(args.hojas)
+    
+    # Archivos de resultados
+    os.makedirs(args.directorio_salida, exist_ok=True)
+    ruta_errores_consolidados, ruta_filas_a_borrar, ruta_datos_limpios = rutas_salida(
+        ruta_archivo, args.directorio_salida)
+    
+    if args.streaming:
+        totales = validar_archivo_streaming(ruta_archivo, hojas, ruta_errores_consolidados, ruta_filas_a_borrar,
+                                            ruta_datos_limpios, args.tamano_bloque)
+        print("\nProceso de validación completado para todas las hojas.")
+        logger.info("Proceso de validación completado para todas las hojas.")
+        return totales
+    
+    # Cargar todas las hojas abriendo el libro una sola vez (o de sus instantáneas)
+    columnas = None if COLUMNAS_SALIDA is None else columnas_requeridas(COLUMNAS_SALIDA)
+    if es_tabla_columnar(ruta_archivo):
+        hojas_cargadas = cargar_tabla(ruta_archivo, columnas, args.compacto)
+        hojas = list(hojas_cargadas)
+    else:
+        hojas_cargadas = cargar_libro_excel(ruta_archivo, hojas, columnas, not args.sin_snapshot, args.compacto)
+    
+    # Errores de cada hoja en forma columnar (fila y regla de cada error)
+    if args.workers > 1:
+        matrices_por_hoja = validar_hojas_en_paralelo(hojas_cargadas, args.workers)
+    elif args.incremental:
+        ruta_cache = ruta_archivo + SUFIJO_CACHE_INCREMENTAL
+        cache = cargar_cache(ruta_cache)
+        matrices_por_hoja = {}
+        for hoja in hojas:
+            print(f"\n{'='*50}")
+            print(f"Procesando hoja: {hoja}")
+            print(f"{'='*50}")
+            
+            df = hojas_cargadas[hoja]
+            matrices_por_hoja[hoja] = None if df is None else validar_hoja_incremental(df, hoja, cache)
+        guardar_cache(ruta_cache, cache)
+    else:
+        matrices_por_hoja = {}
+        for hoja in hojas:
+            print(f"\n{'='*50}")
+            print(f"Procesando hoja: {hoja}")
+            print(f"{'='*50}")
+            
+            matrices_por_hoja[hoja] = validar_hoja(hojas_cargadas[hoja], hoja, ruta_archivo)
+    
+    # Guardar los tres archivos de resultados en una sola pasada por hoja
+    guardar_resultados(hojas_cargadas, matrices_por_hoja,
+                       ruta_errores_consolidados, ruta_filas_a_borrar, ruta_datos_limpios, args.formato_limpios,
+                       ruta_anotado(ruta_archivo, args.directorio_salida) if args.anotado else None,
+                       args.reporte_errores)
+    
+    # Periodos faltantes por fecha y unidad: hallazgos de cada hoja, en su propio archivo
+    if VALIDACION_HOJA in VALIDACIONES_CRUZADAS:
+        guardar_periodos_faltantes(periodos_faltantes_por_hoja(hojas_cargadas),
+                                   ruta_periodos_faltantes(ruta_archivo, args.directorio_salida))
+    
+    # Agregar la ejecución al historial de resultados
+    if args.base_resultados:
+        guardar_ejecucion(args.base_resultados, ruta_archivo, hojas_cargadas, matrices_por_hoja)
     
     print("\nProceso de validación completado para todas las hojas.")
     logger.info("Proceso de validación completado para todas las hojas.")
+    return {hoja: _totales_hoja(hojas_cargadas.get(hoja), matrices_por_hoja.get(hoja)) for hoja in hojas}
+
+
+def main(argv=None):
+    """
+    Función principal que ejecuta la validación del archivo Excel y reporta sus métricas
+    """
+    args = parsear_argumentos(argv)
+    listener = configurar_logging(detalle=args.log_detallado)
+    METRICAS.reiniciar()
+    
+    perfil = None
+    if args.perfil:
+        perfil = cProfile.Profile()
+        perfil.enable()
+    try:
+        with METRICAS.etapa('total'):
+            ejecutar_validacion(args)
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            guardar_perfil(perfil, ARCHIVO_PERFIL)
+        METRICAS.guardar_json(args.metricas)
+        print("\n" + METRICAS.resumen())
+        detener_logging(listener)
 
 
 if __name__ == "__main__":
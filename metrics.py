@@ -0,0 +1,133 @@
+"""
+Métricas de rendimiento de la ejecución: tiempo, filas y errores por etapa del
+proceso y por regla, con un reporte JSON y una tabla resumen al final
+"""
+import io
+import json
+import time
+import pstats
+import logging
+from contextlib import contextmanager
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroMetricas:
+    """
+    Acumula métricas por etapa ('cargar', 'validar', 'guardar_limpios', ...) y por regla
+    (columna, tipo, unidad); cada registro es una suma en un diccionario, así que se puede
+    dejar activo siempre
+    """
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta las métricas acumuladas"""
+        self.etapas = {}
+        self.reglas = {}
+
+    @contextmanager
+    def etapa(self, nombre, filas=0):
+        """
+        Mide una etapa; el diccionario entregado permite fijar 'filas' y 'errores' al terminar
+
+        Ejemplo:
+            with METRICAS.etapa('cargar') as medida:
+                df = ...
+                medida['filas'] = len(df)
+        """
+        medida = {'filas': filas, 'errores': 0}
+        inicio = time.perf_counter()
+        try:
+            yield medida
+        finally:
+            self.registrar_etapa(nombre, time.perf_counter() - inicio, medida['filas'], medida['errores'])
+
+    def registrar_etapa(self, nombre, segundos, filas=0, errores=0):
+        acumulado = self.etapas.setdefault(nombre, {'segundos': 0.0, 'llamadas': 0, 'filas': 0, 'errores': 0})
+        acumulado['segundos'] += segundos
+        acumulado['llamadas'] += 1
+        acumulado['filas'] += int(filas)
+        acumulado['errores'] += int(errores)
+
+    def registrar_regla(self, columna, tipo, unidad, segundos, celdas, errores):
+        acumulado = self.reglas.setdefault((columna, tipo, unidad), {'segundos': 0.0, 'celdas': 0, 'errores': 0})
+        acumulado['segundos'] += segundos
+        acumulado['celdas'] += int(celdas)
+        acumulado['errores'] += int(errores)
+
+    def combinar(self, otro):
+        """Suma las métricas de otro registro (p. ej. las de un proceso trabajador)"""
+        for nombre, medida in otro.etapas.items():
+            self.registrar_etapa(nombre, medida['segundos'], medida['filas'], medida['errores'])
+            self.etapas[nombre]['llamadas'] += medida['llamadas'] - 1
+        for (columna, tipo, unidad), medida in otro.reglas.items():
+            self.registrar_regla(columna, tipo, unidad, medida['segundos'], medida['celdas'], medida['errores'])
+
+    def a_diccionario(self):
+        """
+        Returns:
+            dict: Etapas y reglas, estas ordenadas de la más costosa a la menos costosa
+        """
+        reglas = [{'columna': columna, 'tipo': tipo, 'unidad': unidad, **medida}
+                  for (columna, tipo, unidad), medida in self.reglas.items()]
+        reglas.sort(key=lambda regla: regla['segundos'], reverse=True)
+        return {'etapas': self.etapas, 'reglas': reglas}
+
+    def guardar_json(self, ruta_salida):
+        """Escribe las métricas en un archivo JSON"""
+        try:
+            with open(ruta_salida, 'w', encoding='utf-8') as archivo:
+                json.dump(self.a_diccionario(), archivo, indent=2, ensure_ascii=False)
+            logger.info(f"Métricas de rendimiento guardadas en: {ruta_salida}")
+            print(f"Métricas de rendimiento guardadas en: {ruta_salida}")
+        except Exception as e:
+            mensaje = f"Error al guardar las métricas {ruta_salida}: {str(e)}"
+            logger.error(mensaje)
+            print(mensaje)
+
+    def resumen(self, max_reglas=10):
+        """
+        Returns:
+            str: Tabla de etapas y de las reglas más costosas
+        """
+        datos = self.a_diccionario()
+        partes = []
+        if datos['etapas']:
+            etapas = pd.DataFrame.from_dict(datos['etapas'], orient='index')
+            etapas['segundos'] = etapas['segundos'].round(3)
+            partes.append("Etapas:\n" + etapas.to_string())
+        if datos['reglas']:
+            reglas = pd.DataFrame(datos['reglas'][:max_reglas])
+            reglas['unidad'] = reglas['unidad'].fillna('-')
+            reglas['segundos'] = reglas['segundos'].round(4)
+            partes.append(f"Reglas más costosas (máximo {max_reglas}):\n" + reglas.to_string(index=False))
+        return "\n\n".join(partes)
+
+
+def guardar_perfil(perfil, ruta_salida, max_funciones=15):
+    """
+    Guarda las estadísticas de un cProfile.Profile y muestra las funciones más costosas
+
+    Args:
+        perfil: Perfil ya detenido
+        ruta_salida (str): Archivo de estadísticas (se puede abrir con pstats o snakeviz)
+        max_funciones (int): Cantidad de funciones a mostrar por tiempo acumulado
+    """
+    try:
+        perfil.dump_stats(ruta_salida)
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(max_funciones)
+        logger.info(f"Perfil de ejecución guardado en: {ruta_salida}")
+        print(f"Perfil de ejecución guardado en: {ruta_salida}")
+        print(texto.getvalue())
+    except Exception as e:
+        mensaje = f"Error al guardar el perfil {ruta_salida}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+
+
+# Registro de la ejecución actual
+METRICAS = RegistroMetricas()
@@ -0,0 +1,109 @@
+"""
+Conversión de números escritos como texto ('1.234,5', ' 12 ', '-3e2') según los separadores
+decimal y de miles de config, igual para el motor por filas (un texto) y para el vectorizado
+(todos los textos de una columna en una pasada, sin una excepción por celda)
+"""
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from config import SEPARADOR_DECIMAL, SEPARADOR_MILES
+
+
+@lru_cache(maxsize=None)
+def _patrones(decimal, miles):
+    """
+    Expresiones regulares de un número y de un entero escritos como texto (sin espacios alrededor)
+
+    Returns:
+        tuple: (patrón de número, patrón de entero)
+    """
+    if not decimal or decimal == miles:
+        raise ValueError(f"Separadores numéricos no válidos: decimal {decimal!r}, miles {miles!r}")
+    if miles:
+        entera = rf"(?:[0-9]{{1,3}}(?:{re.escape(miles)}[0-9]{{3}})+|[0-9]+)"
+    else:
+        entera = r"[0-9]+"
+    separador = re.escape(decimal)
+    numero = (rf"[+-]?(?:(?:{entera}(?:{separador}[0-9]*)?|{separador}[0-9]+)(?:[eE][+-]?[0-9]+)?"
+              rf"|(?i:inf|infinity|nan))")
+    return re.compile(numero), re.compile(rf"[+-]?{entera}")
+
+
+def _normalizar(texto, decimal, miles):
+    """Texto de un número válido con punto decimal y sin separador de miles"""
+    if miles:
+        texto = texto.replace(miles, '')
+    return texto if decimal == '.' else texto.replace(decimal, '.')
+
+
+def convertir_texto(texto, decimal=SEPARADOR_DECIMAL, miles=SEPARADOR_MILES):
+    """
+    Convierte un número escrito como texto
+
+    Args:
+        texto (str): Texto a convertir
+        decimal (str): Separador decimal
+        miles (str): Separador de miles o None
+
+    Returns:
+        tuple: (número float o None si no es un número, indica si está escrito como entero)
+    """
+    numero, entero = _patrones(decimal, miles)
+    texto = texto.strip()
+    if not numero.fullmatch(texto):
+        return None, False
+    return float(_normalizar(texto, decimal, miles)), entero.fullmatch(texto) is not None
+
+
+def convertir_textos(textos, decimal=SEPARADOR_DECIMAL, miles=SEPARADOR_MILES):
+    """
+    Convierte un arreglo de textos en una sola pasada, evaluando una vez cada texto distinto
+
+    Args:
+        textos: Arreglo de objetos str
+        decimal (str): Separador decimal
+        miles (str): Separador de miles o None
+
+    Returns:
+        tuple: (arreglo float64 con NaN en los textos que no son números, máscara de textos que
+                son números, máscara de textos escritos como entero)
+    """
+    numero, entero = _patrones(decimal, miles)
+    codigos, unicos = pd.factorize(np.asarray(textos, dtype=object))
+    limpios = pd.Series(unicos, dtype=object).str.strip()
+    validos = limpios.str.fullmatch(numero).to_numpy(dtype=bool)
+    enteros = limpios.str.fullmatch(entero).to_numpy(dtype=bool)
+    numeros = np.full(len(unicos), np.nan)
+    normalizados = limpios[validos]
+    if miles:
+        normalizados = normalizados.str.replace(miles, '', regex=False)
+    if decimal != '.':
+        normalizados = normalizados.str.replace(decimal, '.', regex=False)
+    numeros[validos] = normalizados.to_numpy(dtype=np.float64)
+    return numeros[codigos], validos[codigos], enteros[codigos]
+
+
+def valores_numericos(serie):
+    """
+    Valores de una columna como float64 para los cálculos entre celdas (consistencia entre
+    columnas, anomalías): los números nativos se conservan, los números escritos como texto se
+    convierten con convertir_textos y el resto (vacíos y textos que no son números, que ya
+    revisan las reglas por celda) queda como NaN
+
+    Args:
+        serie (pd.Series): Columna de la hoja
+
+    Returns:
+        np.ndarray: Arreglo float64 alineado con la serie
+    """
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf':
+        return serie.to_numpy(dtype=np.float64)
+    valores = serie.to_numpy(dtype=object)
+    numeros = np.full(len(valores), np.nan)
+    es_numerico = np.fromiter((isinstance(v, (int, float)) for v in valores), dtype=bool, count=len(valores))
+    numeros[es_numerico] = valores[es_numerico].astype(np.float64)
+    es_texto = np.fromiter((type(v) is str for v in valores), dtype=bool, count=len(valores))
+    if es_texto.any():
+        numeros[es_texto] = convertir_textos(valores[es_texto])[0]
+    return numeros
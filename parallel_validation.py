@@ -0,0 +1,100 @@
+"""
+Validación en paralelo con un pool de procesos: cada hoja es una tarea y las
+hojas grandes se dividen en rangos de filas cuyos resultados se combinan en orden
+"""
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from config import MOTOR_VALIDACION, FILAS_POR_PARTICION
+from validation_engine import ejecutar_motor, combinar_resultados, agregar_validaciones_cruzadas, registrar_resumen
+from metrics import METRICAS
+from log_config import configurar_logging, LOGGER_DETALLE
+
+logger = logging.getLogger(__name__)
+
+
+def _inicializar_trabajador(detalle):
+    """
+    Configura el logging de cada proceso trabajador con el mismo archivo que el proceso principal;
+    cada trabajador solo registra resúmenes por regla, así que escribe directamente
+    """
+    # un proceso creado con fork hereda el QueueHandler del principal, cuya cola nadie lee aquí
+    raiz = logging.getLogger()
+    for manejador in list(raiz.handlers):
+        raiz.removeHandler(manejador)
+    configurar_logging(asincrono=False, detalle=detalle)
+
+
+def _validar_particion(df, motor):
+    """Valida una partición en un proceso trabajador y devuelve también sus métricas por regla"""
+    METRICAS.reiniciar()
+    matriz = ejecutar_motor(df, motor)
+    return matriz, METRICAS
+
+
+def particionar(df, filas_por_particion=FILAS_POR_PARTICION):
+    """
+    Divide un DataFrame en rangos consecutivos de filas
+
+    Args:
+        df: DataFrame a dividir
+        filas_por_particion (int): Cantidad máxima de filas por partición
+
+    Returns:
+        list: Particiones en el orden de las filas
+    """
+    return [df.iloc[inicio:inicio + filas_por_particion]
+            for inicio in range(0, len(df), filas_por_particion)]
+
+
+def validar_hojas_en_paralelo(hojas_cargadas, workers, motor=MOTOR_VALIDACION,
+                              filas_por_particion=FILAS_POR_PARTICION):
+    """
+    Valida varias hojas repartiendo sus particiones en un pool de procesos
+
+    Args:
+        hojas_cargadas (dict): Diccionario con hojas como claves y DataFrames (o None) como valores
+        workers (int): Cantidad de procesos del pool
+        motor (str): Motor de validación a usar en cada partición
+        filas_por_particion (int): Cantidad máxima de filas por tarea
+
+    Returns:
+        dict: Diccionario con hojas como claves y MatrizErrores (o None si la hoja no se cargó)
+              como valores, idénticas a las de una ejecución en serie
+    """
+    resultados = {}
+    inicio = time.perf_counter()
+    detalle = logging.getLogger(LOGGER_DETALLE).isEnabledFor(logging.WARNING)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_trabajador,
+                             initargs=(detalle,)) as pool:
+        tareas = {}
+        for hoja, df in hojas_cargadas.items():
+            if df is None:
+                continue
+            particiones = particionar(df, filas_por_particion)
+            logger.info(f"Hoja '{hoja}' dividida en {len(particiones)} particiones para {workers} procesos")
+            # cada partición conserva el índice original, y con él la 'Fila de error'
+            tareas[hoja] = [pool.submit(_validar_particion, particion, motor) for particion in particiones]
+
+        for hoja, df in hojas_cargadas.items():
+            if df is None:
+                resultados[hoja] = None
+                continue
+            print(f"\n{'='*50}")
+            print(f"Procesando hoja: {hoja}")
+            print(f"{'='*50}")
+            matrices = []
+            for tarea in tareas[hoja]:
+                matriz, metricas = tarea.result()
+                METRICAS.combinar(metricas)
+                matrices.append(matriz)
+            # las validaciones entre filas necesitan la hoja completa y se ejecutan aquí
+            matriz = agregar_validaciones_cruzadas(df, combinar_resultados(matrices))
+            registrar_resumen(hoja, len(matriz))
+            resultados[hoja] = matriz
+
+    # tiempo de pared del pool completo; el de cada regla es la suma de los procesos
+    METRICAS.registrar_etapa('validar', time.perf_counter() - inicio,
+                             sum(len(df) for df in hojas_cargadas.values() if df is not None),
+                             sum(len(matriz) for matriz in resultados.values() if matriz is not None))
+    return resultados
@@ -0,0 +1,355 @@
+"""
+Chequeo rápido de un libro antes de la validación completa: lee cada hoja por bloques y se
+detiene al llegar a un límite de errores por regla o por hoja, o valida una muestra
+estratificada por unidad y mes, y estima la tasa de error de cada regla con su intervalo de
+confianza de Wilson para rechazar en segundos una entrega con problemas de fondo
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from config import (HOJAS_POR_DEFECTO, MAX_ERRORES_POR_REGLA_CHEQUEO, MAX_ERRORES_POR_HOJA_CHEQUEO,
+                    FILAS_BLOQUE_CHEQUEO, FILAS_POR_ESTRATO_CHEQUEO, CONFIANZA_CHEQUEO, TASA_MAXIMA_CHEQUEO)
+from rule_compiler import columnas_requeridas
+from streaming_validation import leer_hoja_por_bloques, bloque_a_dataframe
+from validation_engine import ejecutar_motor
+from log_config import configurar_logging, detener_logging
+
+logger = logging.getLogger(__name__)
+
+EJEMPLOS_CHEQUEO = 3
+
+
+def intervalo_wilson(proporcion, n, confianza=CONFIANZA_CHEQUEO):
+    """
+    Intervalo de confianza de Wilson de una proporción (acepta arreglos)
+
+    Args:
+        proporcion: Proporción observada (o estimada) de filas con error
+        n: Cantidad de filas evaluadas
+        confianza (float): Nivel de confianza
+
+    Returns:
+        tuple: (cota inferior, cota superior); sin filas evaluadas el intervalo es (0, 1)
+    """
+    proporcion = np.asarray(proporcion, dtype=np.float64)
+    n = np.maximum(np.asarray(n, dtype=np.float64), 1e-12)
+    z = NormalDist().inv_cdf(0.5 + confianza / 2)
+    denominador = 1 + z ** 2 / n
+    centro = (proporcion + z ** 2 / (2 * n)) / denominador
+    margen = z * np.sqrt(proporcion * (1 - proporcion) / n + z ** 2 / (4 * n ** 2)) / denominador
+    return np.clip(centro - margen, 0, 1), np.clip(centro + margen, 0, 1)
+
+
+def _errores_por_regla(matriz):
+    """Errores de una matriz con su columna y regla, un renglón por error (posición en el bloque)"""
+    return pd.DataFrame({
+        'posicion': matriz.posiciones,
+        'columna': np.asarray(matriz.columnas_reglas, dtype=object)[matriz.ids_regla],
+        'regla': matriz.textos,
+        'fila': matriz.etiquetas[matriz.posiciones] + 2,
+        'valor': matriz.valores
+    })
+
+
+def _columnas_faltantes(columnas):
+    """Columnas que usan las reglas y no están en la hoja (columnas corridas o renombradas)"""
+    return sorted(columnas_requeridas() - set(columnas))
+
+
+def chequear_hoja_por_bloques(libro, nombre_hoja, max_por_regla=MAX_ERRORES_POR_REGLA_CHEQUEO,
+                              max_por_hoja=MAX_ERRORES_POR_HOJA_CHEQUEO, tamano_bloque=FILAS_BLOQUE_CHEQUEO):
+    """
+    Valida una hoja bloque por bloque desde el principio y deja de leer el libro cuando una
+    regla o la hoja llegan a su límite de errores
+
+    Args:
+        libro: Libro de openpyxl abierto en modo read_only
+        nombre_hoja (str): Hoja a revisar
+        max_por_regla (int): Errores de una misma columna y regla que detienen la revisión
+        max_por_hoja (int): Errores totales que detienen la revisión
+        tamano_bloque (int): Filas por bloque
+
+    Returns:
+        dict: Resultado con 'filas' leídas, 'detenida' (motivo o None), 'columnas_faltantes' y
+              'errores' (DataFrame con un renglón por error y sus pesos de estimación)
+    """
+    resultado = {'hoja': nombre_hoja, 'modo': 'bloques', 'filas': 0, 'detenida': None,
+                 'columnas_faltantes': [], 'errores': []}
+    conteos = {}
+    total = 0
+    for encabezado, inicio, filas in leer_hoja_por_bloques(libro[nombre_hoja], tamano_bloque):
+        if inicio == 0:
+            resultado['columnas_faltantes'] = _columnas_faltantes(encabezado)
+        errores = _errores_por_regla(ejecutar_motor(bloque_a_dataframe(encabezado, inicio, filas), 'vectorizado'))
+        resultado['filas'] += len(filas)
+        resultado['errores'].append(errores)
+        for clave, cantidad in errores.groupby(['columna', 'regla'], sort=False).size().items():
+            conteos[clave] = conteos.get(clave, 0) + cantidad
+        total += len(errores)
+        excedidas = [clave for clave, cantidad in conteos.items() if cantidad >= max_por_regla]
+        if excedidas:
+            columna, regla = excedidas[0]
+            resultado['detenida'] = f"{conteos[excedidas[0]]} errores en columna {columna} ({regla})"
+            break
+        if total >= max_por_hoja:
+            resultado['detenida'] = f"{total} errores en la hoja"
+            break
+    errores = (pd.concat(resultado['errores'], ignore_index=True) if resultado['errores']
+               else pd.DataFrame(columns=['posicion', 'columna', 'regla', 'fila', 'valor']))
+    # las filas leídas son el prefijo de la hoja: cada error pesa 1 sobre las filas leídas
+    resultado['errores'] = errores.assign(peso=1.0 / max(resultado['filas'], 1))
+    return resultado
+
+
+def _meses(fechas):
+    """
+    Mes (año * 12 + mes) de cada fecha, convirtiendo una sola vez cada valor distinto; las
+    fechas vacías o inválidas quedan en -1
+    """
+    codigos, unicos = pd.factorize(pd.Series(fechas, dtype=object), use_na_sentinel=False)
+    convertidas = pd.to_datetime(pd.Series(unicos, dtype=object), errors='coerce', format='mixed')
+    meses_unicos = np.where(convertidas.isna(), -1,
+                            convertidas.dt.year.fillna(0) * 12 + convertidas.dt.month.fillna(0)).astype(np.int64)
+    return meses_unicos[codigos]
+
+
+def muestra_estratificada(hoja, por_estrato=FILAS_POR_ESTRATO_CHEQUEO, semilla=0, tamano_bloque=FILAS_BLOQUE_CHEQUEO):
+    """
+    Elige al azar hasta `por_estrato` filas de cada combinación de unidad y mes de la fecha en
+    una sola lectura por bloques de la hoja: cada fila recibe un número aleatorio y de cada
+    estrato se conservan las `por_estrato` de menor número vistas hasta el momento, así que en
+    memoria solo quedan las filas candidatas
+
+    Args:
+        hoja: Worksheet de openpyxl abierta en modo read_only
+        por_estrato (int): Filas por estrato
+        semilla (int): Semilla del generador aleatorio
+        tamano_bloque (int): Filas por bloque de lectura
+
+    Returns:
+        tuple: (encabezado, posiciones elegidas en orden, sus filas, estrato de cada una, tamaño
+                de cada estrato, filas de la hoja); encabezado None si la hoja no tiene filas
+    """
+    aleatorio = np.random.default_rng(semilla)
+    estratos = {}
+    encabezado = None
+    tamanos = np.zeros(0, dtype=np.int64)
+    posiciones = np.zeros(0, dtype=np.int64)
+    claves = np.zeros(0)
+    estratos_elegidas = np.zeros(0, dtype=np.int64)
+    filas_elegidas = []
+    for encabezado, inicio, filas in leer_hoja_por_bloques(hoja, tamano_bloque):
+        columnas = {columna: j for j, columna in enumerate(encabezado)}
+        unidades = [fila[columnas['Unidad']] for fila in filas] if 'Unidad' in columnas else [None] * len(filas)
+        meses = (_meses([fila[columnas['Fecha']] for fila in filas]) if 'Fecha' in columnas
+                 else np.zeros(len(filas), dtype=np.int64))
+        estratos_bloque = np.fromiter((estratos.setdefault(par, len(estratos))
+                                       for par in zip(unidades, meses.tolist())), dtype=np.int64, count=len(filas))
+        # el tamaño de cada estrato cuenta todas sus filas, también las que no quedan en la muestra
+        conteos = np.bincount(estratos_bloque, minlength=len(estratos))
+        conteos[:len(tamanos)] += tamanos
+        tamanos = conteos
+
+        # candidatas anteriores más las del bloque; de cada estrato quedan las de menor clave
+        posiciones = np.concatenate((posiciones, np.arange(inicio, inicio + len(filas))))
+        claves = np.concatenate((claves, aleatorio.random(len(filas))))
+        estratos_elegidas = np.concatenate((estratos_elegidas, estratos_bloque))
+        filas_elegidas.extend(filas)
+        orden = np.lexsort((claves, estratos_elegidas))
+        ordenados = estratos_elegidas[orden]
+        inicios = np.flatnonzero(np.r_[True, ordenados[1:] != ordenados[:-1]])
+        rango = np.arange(len(orden)) - np.repeat(inicios, np.diff(np.r_[inicios, len(orden)]))
+        conservadas = np.sort(orden[rango < por_estrato])
+        posiciones, claves = posiciones[conservadas], claves[conservadas]
+        estratos_elegidas = estratos_elegidas[conservadas]
+        filas_elegidas = [filas_elegidas[k] for k in conservadas.tolist()]
+    return encabezado, posiciones, filas_elegidas, estratos_elegidas, tamanos, int(tamanos.sum())
+
+
+def chequear_hoja_muestra(libro, nombre_hoja, por_estrato=FILAS_POR_ESTRATO_CHEQUEO, semilla=0,
+                          tamano_bloque=FILAS_BLOQUE_CHEQUEO):
+    """
+    Valida una muestra estratificada por unidad y mes de una hoja, leída en modo solo lectura
+    sin cargar ni guardar la hoja completa
+
+    Args:
+        libro: Libro de openpyxl abierto en modo read_only
+        nombre_hoja (str): Hoja a revisar
+        por_estrato (int): Filas por estrato
+        semilla (int): Semilla del generador aleatorio
+        tamano_bloque (int): Filas por bloque de lectura
+
+    Returns:
+        dict: Resultado con las mismas claves que chequear_hoja_por_bloques; el peso de cada
+              error es la fracción de la hoja que representa su estrato sobre las filas
+              muestreadas del estrato, de modo que la suma de pesos estima la tasa de la hoja
+    """
+    encabezado, posiciones, filas, estratos, tamanos, filas_hoja = muestra_estratificada(
+        libro[nombre_hoja], por_estrato, semilla, tamano_bloque)
+    resultado = {'hoja': nombre_hoja, 'modo': 'muestra', 'filas': len(posiciones), 'filas_hoja': filas_hoja,
+                 'estratos': len(tamanos), 'detenida': None,
+                 'columnas_faltantes': [] if encabezado is None else _columnas_faltantes(encabezado)}
+    if not filas:
+        resultado['errores'] = pd.DataFrame(columns=['posicion', 'columna', 'regla', 'fila', 'valor', 'peso'])
+        return resultado
+    # la muestra se valida como un bloque cuyo índice es la posición de cada fila en la hoja
+    df = bloque_a_dataframe(encabezado, 0, filas)
+    df.index = pd.Index(posiciones)
+    errores = _errores_por_regla(ejecutar_motor(df, 'vectorizado'))
+    muestreadas = np.bincount(estratos, minlength=len(tamanos))
+    estrato_error = estratos[errores['posicion'].to_numpy()]
+    resultado['errores'] = errores.assign(
+        peso=tamanos[estrato_error] / filas_hoja / np.maximum(muestreadas[estrato_error], 1))
+    return resultado
+
+
+def resumir_resultado(resultado, confianza=CONFIANZA_CHEQUEO, tasa_maxima=TASA_MAXIMA_CHEQUEO):
+    """
+    Tasa estimada de error de cada columna y regla con su intervalo de Wilson, y decisión de la hoja
+
+    Returns:
+        tuple: (DataFrame con una fila por columna y regla, bool indicando si la hoja se rechaza)
+    """
+    errores = resultado['errores']
+    ejemplos = pd.Series([f"fila {fila}: {valor}" for fila, valor in zip(errores['fila'], errores['valor'])],
+                         index=errores.index, dtype=object)
+    # agg (y no apply) también funciona sin errores: la hoja limpia queda con un resumen vacío
+    resumen = errores.assign(ejemplo=ejemplos).groupby(['columna', 'regla'], sort=False).agg(
+        Errores=('peso', 'size'),
+        **{'Tasa estimada': ('peso', 'sum'),
+           'Ejemplos': ('ejemplo', lambda serie: "; ".join(serie.head(EJEMPLOS_CHEQUEO)))}
+    ).reset_index().rename(columns={'columna': 'Columna', 'regla': 'Regla'})
+    inferior, superior = intervalo_wilson(resumen['Tasa estimada'].to_numpy(), resultado['filas'], confianza)
+    resumen.insert(4, 'Cota inferior', inferior)
+    resumen.insert(5, 'Cota superior', superior)
+    resumen.insert(0, 'Hoja', resultado['hoja'])
+    resumen.insert(3, 'Filas evaluadas', resultado['filas'])
+    rechazada = (resultado['detenida'] is not None or bool(resultado['columnas_faltantes'])
+                 or bool((resumen['Cota inferior'] > tasa_maxima).any()))
+    return resumen, rechazada
+
+
+def chequear_archivo(ruta_archivo, hojas, muestra=False, por_estrato=FILAS_POR_ESTRATO_CHEQUEO, semilla=0,
+                     max_por_regla=MAX_ERRORES_POR_REGLA_CHEQUEO, max_por_hoja=MAX_ERRORES_POR_HOJA_CHEQUEO):
+    """
+    Chequeo rápido de las hojas de un libro
+
+    Args:
+        ruta_archivo (str): Libro Excel a revisar
+        hojas (list): Hojas a revisar
+        muestra (bool): Valida una muestra estratificada en lugar de leer por bloques hasta el límite
+        por_estrato (int): Filas por estrato de la muestra
+        semilla (int): Semilla de la muestra
+        max_por_regla (int): Límite de errores por regla de la lectura por bloques
+        max_por_hoja (int): Límite de errores por hoja de la lectura por bloques
+
+    Returns:
+        tuple: (DataFrame con el resumen por hoja, columna y regla, dict hoja -> 'aceptada',
+                'rechazada' o el motivo por el que no se pudo revisar)
+    """
+    resumenes = []
+    decisiones = {}
+    libro = load_workbook(ruta_archivo, read_only=True, data_only=True)
+    try:
+        for hoja in hojas:
+            inicio = time.perf_counter()
+            if hoja not in libro.sheetnames:
+                decisiones[hoja] = "hoja inexistente"
+                logger.error(f"Chequeo rápido de '{hoja}': {decisiones[hoja]}")
+                print(f"Hoja '{hoja}': {decisiones[hoja]}")
+                continue
+            if muestra:
+                resultado = chequear_hoja_muestra(libro, hoja, por_estrato, semilla)
+            else:
+                resultado = chequear_hoja_por_bloques(libro, hoja, max_por_regla, max_por_hoja)
+            resumen, rechazada = resumir_resultado(resultado)
+            resumenes.append(resumen)
+            decisiones[hoja] = 'rechazada' if rechazada else 'aceptada'
+
+            detalle = (f"muestra de {resultado['filas']} de {resultado['filas_hoja']} filas en "
+                       f"{resultado['estratos']} estratos" if resultado['modo'] == 'muestra'
+                       else f"{resultado['filas']} filas leídas")
+            mensaje = f"Hoja '{hoja}': {decisiones[hoja]} ({detalle}, {time.perf_counter() - inicio:.2f} s)"
+            if resultado['detenida']:
+                mensaje += f"; detenida por {resultado['detenida']}"
+            if resultado['columnas_faltantes']:
+                mensaje += f"; faltan columnas: {', '.join(resultado['columnas_faltantes'])}"
+            (logger.warning if rechazada else logger.info)(mensaje)
+            print(mensaje)
+    finally:
+        libro.close()
+    return (pd.concat(resumenes, ignore_index=True) if resumenes else pd.DataFrame([])), decisiones
+
+
+def parsear_argumentos(argv=None):
+    """
+    Lee las opciones de línea de comandos del chequeo rápido
+
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+
+    Returns:
+        argparse.Namespace: Opciones del chequeo
+    """
+    parser = argparse.ArgumentParser(description="Chequeo rápido de un libro antes de la validación completa")
+    parser.add_argument('--archivo', default="DATA_BASE.xlsx", help="Libro Excel a revisar")
+    parser.add_argument('--hojas', nargs='+', default=HOJAS_POR_DEFECTO, help="Hojas del libro a revisar")
+    parser.add_argument('--muestra', action='store_true',
+                        help="Valida una muestra estratificada por unidad y mes en lugar de leer hasta el límite de errores")
+    parser.add_argument('--filas-por-estrato', type=int, default=FILAS_POR_ESTRATO_CHEQUEO,
+                        help="Filas de la muestra por unidad y mes")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de la muestra")
+    parser.add_argument('--max-errores-regla', type=int, default=MAX_ERRORES_POR_REGLA_CHEQUEO,
+                        help="Errores de una misma regla que detienen la lectura de la hoja")
+    parser.add_argument('--max-errores-hoja', type=int, default=MAX_ERRORES_POR_HOJA_CHEQUEO,
+                        help="Errores totales que detienen la lectura de la hoja")
+    parser.add_argument('--directorio-salida', default='.', help="Directorio del resumen del chequeo")
+    args = parser.parse_args(argv)
+    if min(args.filas_por_estrato, args.max_errores_regla, args.max_errores_hoja) < 1:
+        parser.error("--filas-por-estrato, --max-errores-regla y --max-errores-hoja deben ser mayores o iguales a 1")
+    return args
+
+
+def main(argv=None):
+    """
+    Revisa el libro y guarda el resumen del chequeo
+
+    Returns:
+        int: 0 si todas las hojas se aceptan, 1 si alguna se rechaza o no se pudo revisar
+    """
+    args = parsear_argumentos(argv)
+    listener = configurar_logging()
+    try:
+        if not os.path.exists(args.archivo):
+            logger.error(f"El archivo {args.archivo} no existe.")
+            print(f"El archivo {args.archivo} no existe.")
+            return 1
+        try:
+            resumen, decisiones = chequear_archivo(args.archivo, args.hojas, args.muestra, args.filas_por_estrato,
+                                                   args.semilla, args.max_errores_regla, args.max_errores_hoja)
+        except Exception as e:
+            mensaje = f"Error al revisar el archivo {args.archivo}: {str(e)}"
+            logger.error(mensaje)
+            print(mensaje)
+            return 1
+
+        if not resumen.empty:
+            print("\n" + resumen.drop(columns='Ejemplos').to_string(index=False))
+            os.makedirs(args.directorio_salida, exist_ok=True)
+            base = os.path.splitext(os.path.basename(args.archivo))[0]
+            ruta_resumen = os.path.join(args.directorio_salida, f"chequeo_{base}.xlsx")
+            resumen.to_excel(ruta_resumen, index=False)
+            print(f"Resumen del chequeo guardado en: {ruta_resumen}")
+        return 0 if all(decision == 'aceptada' for decision in decisiones.values()) else 1
+    finally:
+        detener_logging(listener)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Historial de resultados en una base SQLite local: cada ejecución agrega sus metadatos (hash del
+archivo, versión de reglas, tiempos por etapa), los totales por hoja, los conteos por columna y
+regla y todos sus errores con inserciones por lotes en una sola transacción, y una pequeña CLI
+consulta la evolución de una columna entre ejecuciones
+"""
+import os
+import sys
+import hashlib
+import sqlite3
+import argparse
+import logging
+from itertools import repeat
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import VERSION_REGLAS, FILAS_POR_LOTE_SQLITE
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ejecuciones (
+    id INTEGER PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    archivo TEXT NOT NULL,
+    hash_archivo TEXT NOT NULL,
+    version_reglas TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS etapas (
+    ejecucion INTEGER NOT NULL REFERENCES ejecuciones(id),
+    etapa TEXT NOT NULL,
+    segundos REAL,
+    llamadas INTEGER,
+    filas INTEGER,
+    errores INTEGER
+);
+CREATE TABLE IF NOT EXISTS hojas (
+    ejecucion INTEGER NOT NULL REFERENCES ejecuciones(id),
+    hoja TEXT NOT NULL,
+    filas INTEGER,
+    errores INTEGER,
+    filas_con_errores INTEGER,
+    filas_limpias INTEGER
+);
+CREATE TABLE IF NOT EXISTS conteos_regla (
+    ejecucion INTEGER NOT NULL REFERENCES ejecuciones(id),
+    hoja TEXT NOT NULL,
+    unidad TEXT,
+    columna TEXT NOT NULL,
+    regla TEXT NOT NULL,
+    errores INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS errores (
+    ejecucion INTEGER NOT NULL REFERENCES ejecuciones(id),
+    hoja TEXT NOT NULL,
+    fila INTEGER NOT NULL,
+    unidad TEXT,
+    columna TEXT NOT NULL,
+    valor TEXT,
+    regla TEXT NOT NULL
+);
+-- único índice de errores, en el orden del historial de una columna: la consulta se detiene al
+-- llegar al límite sin ordenar, y cada ejecución solo mantiene este índice al insertar
+CREATE INDEX IF NOT EXISTS idx_errores ON errores (columna, ejecucion DESC, hoja, fila);
+CREATE INDEX IF NOT EXISTS idx_conteos_columna ON conteos_regla (columna, unidad, ejecucion);
+CREATE INDEX IF NOT EXISTS idx_hojas ON hojas (ejecucion, hoja);
+"""
+
+
+def hash_archivo(ruta_archivo, tamano_lectura=1 << 20):
+    """SHA-256 del contenido del archivo, leído por partes"""
+    digest = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as archivo:
+        for parte in iter(lambda: archivo.read(tamano_lectura), b''):
+            digest.update(parte)
+    return digest.hexdigest()
+
+
+def abrir_base(ruta_base):
+    """
+    Abre (o crea) la base de resultados con su esquema
+
+    Returns:
+        sqlite3.Connection: Conexión con journal WAL, para que las consultas no bloqueen las escrituras
+    """
+    conexion = sqlite3.connect(ruta_base)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+
+def _unidades_error(df, matriz):
+    """Unidad (texto) de la fila de cada error, None si está vacía o la hoja no tiene la columna Unidad"""
+    if 'Unidad' not in df.columns:
+        return np.full(len(matriz), None, dtype=object)
+    # una HojaCompacta restaura solo la columna Unidad
+    unidades = (df.restaurar(columnas=['Unidad']) if hasattr(df, 'restaurar') else df)['Unidad']
+    codigos, unicas = pd.factorize(unidades.to_numpy(dtype=object)[matriz.posiciones])
+    # el código -1 (celda vacía) toma el None agregado al final
+    return np.array([str(unidad) for unidad in unicas] + [None], dtype=object)[codigos]
+
+
+def _insertar_errores(conexion, ejecucion, hoja, matriz, unidades, tamano_lote=FILAS_POR_LOTE_SQLITE):
+    """
+    Inserta los errores de una hoja con un executemany por lote; cada lote recorre con zip
+    columnas ya convertidas, sin armar tuplas fila por fila en Python, en el orden (columna, fila)
+    del índice para que sus páginas se llenen al final en lugar de dividirse
+    """
+    nombres = np.asarray(matriz.columnas_reglas, dtype=object)
+    filas = matriz.etiquetas[matriz.posiciones] + 2
+    orden = np.lexsort((filas, np.argsort(np.argsort(nombres, kind='stable'))[matriz.ids_regla]))
+    filas = filas[orden]
+    columnas = nombres[matriz.ids_regla[orden]]
+    unidades = unidades[orden]
+    valores = matriz.valores[orden]
+    textos = matriz.textos[orden]
+    for inicio in range(0, len(matriz), tamano_lote):
+        fin = inicio + tamano_lote
+        conexion.executemany(
+            "INSERT INTO errores VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(repeat(ejecucion), repeat(hoja), filas[inicio:fin].tolist(), unidades[inicio:fin].tolist(),
+                columnas[inicio:fin].tolist(), map(str, valores[inicio:fin]), textos[inicio:fin].tolist()))
+
+
+def guardar_ejecucion(ruta_base, ruta_archivo, datos_originales, matrices_por_hoja, metricas=METRICAS):
+    """
+    Agrega una ejecución a la base de resultados en una sola transacción
+
+    Args:
+        ruta_base (str): Archivo SQLite
+        ruta_archivo (str): Archivo validado
+        datos_originales (dict): Hojas cargadas (DataFrame o HojaCompacta)
+        matrices_por_hoja (dict): MatrizErrores de cada hoja
+        metricas: RegistroMetricas con los tiempos de las etapas ya terminadas, o None
+
+    Returns:
+        int: Identificador de la ejecución, o None si no se pudo guardar
+    """
+    etapas = {} if metricas is None else metricas.a_diccionario()['etapas']
+    try:
+        conexion = abrir_base(ruta_base)
+        try:
+            with METRICAS.etapa('guardar_base') as medida, conexion:
+                cursor = conexion.execute(
+                    "INSERT INTO ejecuciones (fecha, archivo, hash_archivo, version_reglas) VALUES (?, ?, ?, ?)",
+                    (datetime.now().isoformat(timespec='seconds'), os.path.abspath(ruta_archivo),
+                     hash_archivo(ruta_archivo), VERSION_REGLAS))
+                ejecucion = cursor.lastrowid
+                conexion.executemany(
+                    "INSERT INTO etapas VALUES (?, ?, ?, ?, ?, ?)",
+                    [(ejecucion, etapa, totales.get('segundos'), totales.get('llamadas'), totales.get('filas'),
+                      totales.get('errores')) for etapa, totales in etapas.items()])
+                total_errores = 0
+                for hoja, df in datos_originales.items():
+                    matriz = matrices_por_hoja.get(hoja)
+                    if df is None or matriz is None:
+                        continue
+                    filas_limpias = int(matriz.seleccion_filas()[0].sum())
+                    conexion.execute("INSERT INTO hojas VALUES (?, ?, ?, ?, ?, ?)",
+                                     (ejecucion, hoja, len(df), len(matriz), len(df) - filas_limpias, filas_limpias))
+                    if len(matriz) == 0:
+                        continue
+                    unidades = _unidades_error(df, matriz)
+                    conteos = pd.DataFrame({
+                        'unidad': unidades,
+                        'columna': np.asarray(matriz.columnas_reglas, dtype=object)[matriz.ids_regla],
+                        'regla': matriz.textos
+                    }).groupby(['unidad', 'columna', 'regla'], dropna=False, sort=False).size()
+                    conexion.executemany(
+                        "INSERT INTO conteos_regla VALUES (?, ?, ?, ?, ?, ?)",
+                        [(ejecucion, hoja, None if pd.isna(unidad) else unidad, columna, regla, int(cantidad))
+                         for (unidad, columna, regla), cantidad in conteos.items()])
+                    _insertar_errores(conexion, ejecucion, hoja, matriz, unidades)
+                    total_errores += len(matriz)
+                medida['errores'] = total_errores
+        finally:
+            conexion.close()
+    except Exception as e:
+        mensaje = f"Error al guardar la ejecución en la base de resultados {ruta_base}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return None
+
+    logger.info(f"Ejecución {ejecucion} guardada en la base de resultados {ruta_base} ({total_errores} errores)")
+    print(f"Ejecución {ejecucion} guardada en la base de resultados {ruta_base} ({total_errores} errores)")
+    return ejecucion
+
+
+def consultar_ejecuciones(conexion, limite=20):
+    """Últimas ejecuciones con sus totales de filas y errores"""
+    return pd.read_sql_query(
+        "SELECT e.id AS ejecucion, e.fecha, e.archivo, e.version_reglas, "
+        "(SELECT ROUND(SUM(t.segundos), 2) FROM etapas t WHERE t.ejecucion = e.id AND t.etapa = 'validar') "
+        "AS segundos_validar, SUM(h.filas) AS filas, SUM(h.errores) AS errores, "
+        "SUM(h.filas_limpias) AS filas_limpias "
+        "FROM ejecuciones e LEFT JOIN hojas h ON h.ejecucion = e.id "
+        "GROUP BY e.id ORDER BY e.id DESC LIMIT ?", conexion, params=(limite,))
+
+
+def consultar_tendencia(conexion, columna, unidad=None, hoja=None):
+    """
+    Errores de una columna en cada ejecución, por regla (0 en las ejecuciones sin errores)
+
+    Returns:
+        pd.DataFrame: Una fila por ejecución y regla, en orden cronológico
+    """
+    filtros = ["c.columna = ?"]
+    parametros = [columna]
+    if unidad is not None:
+        filtros.append("c.unidad = ?")
+        parametros.append(unidad)
+    if hoja is not None:
+        filtros.append("c.hoja = ?")
+        parametros.append(hoja)
+    return pd.read_sql_query(
+        "SELECT e.id AS ejecucion, e.fecha, e.archivo, COALESCE(t.regla, '') AS regla, "
+        "COALESCE(t.errores, 0) AS errores FROM ejecuciones e LEFT JOIN ("
+        f"  SELECT c.ejecucion, c.regla, SUM(c.errores) AS errores FROM conteos_regla c "
+        f"  WHERE {' AND '.join(filtros)} GROUP BY c.ejecucion, c.regla"
+        ") t ON t.ejecucion = e.id ORDER BY e.id, t.regla", conexion, params=parametros)
+
+
+def consultar_historial(conexion, columna, unidad=None, hoja=None, limite=100):
+    """
+    Errores individuales de una columna en todas las ejecuciones, del más reciente al más antiguo
+
+    Returns:
+        pd.DataFrame: Ejecución, fecha, hoja, fila, unidad, valor y regla de cada error
+    """
+    filtros = ["r.columna = ?"]
+    parametros = [columna]
+    if unidad is not None:
+        filtros.append("r.unidad = ?")
+        parametros.append(unidad)
+    if hoja is not None:
+        filtros.append("r.hoja = ?")
+        parametros.append(hoja)
+    return pd.read_sql_query(
+        "SELECT r.ejecucion, e.fecha, r.hoja, r.fila, r.unidad, r.valor, r.regla "
+        f"FROM errores r JOIN ejecuciones e ON e.id = r.ejecucion WHERE {' AND '.join(filtros)} "
+        "ORDER BY r.ejecucion DESC, r.hoja, r.fila LIMIT ?", conexion, params=parametros + [limite])
+
+
+def parsear_argumentos(argv=None):
+    """
+    Lee las opciones de la CLI de consultas
+
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+
+    Returns:
+        argparse.Namespace: Consulta y sus opciones
+    """
+    parser = argparse.ArgumentParser(description="Consultas sobre el historial de resultados de validación")
+    parser.add_argument('--base', required=True, help="Archivo SQLite de resultados (opción --base-resultados)")
+    consultas = parser.add_subparsers(dest='consulta', required=True)
+    ejecuciones = consultas.add_parser('ejecuciones', help="Últimas ejecuciones con sus totales")
+    ejecuciones.add_argument('--limite', type=int, default=20)
+    for nombre, ayuda in (('tendencia', "Errores de una columna en cada ejecución, por regla"),
+                          ('historial', "Errores individuales de una columna en todas las ejecuciones")):
+        consulta = consultas.add_parser(nombre, help=ayuda)
+        consulta.add_argument('--columna', required=True)
+        consulta.add_argument('--unidad')
+        consulta.add_argument('--hoja')
+        if nombre == 'historial':
+            consulta.add_argument('--limite', type=int, default=100)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Ejecuta una consulta sobre la base de resultados y muestra su tabla
+
+    Returns:
+        int: 0 si la consulta se ejecutó, 1 si la base no existe
+    """
+    args = parsear_argumentos(argv)
+    if not os.path.exists(args.base):
+        print(f"La base de resultados {args.base} no existe.")
+        return 1
+    conexion = sqlite3.connect(args.base)
+    try:
+        if args.consulta == 'ejecuciones':
+            resultado = consultar_ejecuciones(conexion, args.limite)
+        elif args.consulta == 'tendencia':
+            resultado = consultar_tendencia(conexion, args.columna, args.unidad, args.hoja)
+        else:
+            resultado = consultar_historial(conexion, args.columna, args.unidad, args.hoja, args.limite)
+    finally:
+        conexion.close()
+    print(resultado.to_string(index=False) if not resultado.empty else "Sin resultados.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
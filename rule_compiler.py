@@ -0,0 +1,133 @@
+"""
+Compilador de la especificación declarativa de reglas (config.REGLAS)
+en un plan de ejecución por esquema de hoja
+"""
+from collections import namedtuple
+from functools import lru_cache
+from config import REGLAS, LIMITES_POR_UNIDAD
+
+# Regla expandida para una columna; orden es su posición en el reporte de una fila
+# y unidad es None cuando la regla aplica a todas las filas
+Regla = namedtuple('Regla', ['orden', 'columna', 'tipo', 'parametros', 'unidad'])
+
+# Operación por lotes: misma regla y límites sobre varias columnas a la vez
+PasoPlan = namedtuple('PasoPlan', ['tipo', 'parametros', 'unidad', 'columnas', 'ordenes'])
+
+PlanValidacion = namedtuple('PlanValidacion', ['reglas', 'pasos', 'columnas', 'columnas_por_orden'])
+
+
+def _parametros_regla(spec, minimo, maximo):
+    """Construye los parámetros de una regla a partir de su especificación"""
+    if spec['tipo'] == 'enum':
+        return {'valores': tuple(spec['valores']), 'separador': spec.get('separador', ', ')}
+    if spec['tipo'] == 'fecha':
+        return {}
+    parametros = {'min': minimo, 'max': maximo}
+    if spec.get('es_porcentaje', False):
+        parametros['es_porcentaje'] = True
+    return parametros
+
+
+def _variantes_por_unidad(spec):
+    """
+    Devuelve las variantes (unidad, mínimo, máximo) de una especificación;
+    unidad es None cuando la regla no depende de la unidad
+    """
+    unidades = spec.get('unidades')
+    if 'limite_unidad' in spec:
+        variantes = []
+        for unidad, limites in LIMITES_POR_UNIDAD.items():
+            maximo = limites.get(spec['limite_unidad'])
+            if maximo is None or (unidades is not None and unidad not in unidades):
+                continue
+            minimo = -maximo if spec.get('simetrico', False) else 0
+            variantes.append((unidad, minimo, maximo))
+        return variantes
+
+    minimo, maximo = spec.get('rango', (None, None))
+    if unidades is None:
+        return [(None, minimo, maximo)]
+    return [(unidad, minimo, maximo) for unidad in unidades]
+
+
+def expandir_reglas(df_columns):
+    """
+    Expande la especificación en reglas individuales para las columnas presentes
+
+    Args:
+        df_columns: Columnas de la hoja
+
+    Returns:
+        list: Reglas en el orden en que se reportan los errores de una fila
+    """
+    reglas = []
+    orden = 0
+    for spec in REGLAS:
+        variantes = _variantes_por_unidad(spec)
+        if not variantes:
+            continue
+        depende_unidad = any(unidad is not None for unidad, _, _ in variantes)
+        for columna in spec['columnas']:
+            if columna not in df_columns:
+                continue
+            # las reglas por unidad necesitan la columna Unidad para decidir a qué filas aplican
+            if depende_unidad and 'Unidad' not in df_columns:
+                continue
+            for unidad, minimo, maximo in variantes:
+                reglas.append(Regla(orden, columna, spec['tipo'],
+                                    _parametros_regla(spec, minimo, maximo), unidad))
+            orden += 1
+    return reglas
+
+
+def _agrupar_pasos(reglas):
+    """Agrupa las reglas que comparten tipo, límites y unidad en una sola operación"""
+    grupos = {}
+    for regla in reglas:
+        clave = (regla.tipo, tuple(sorted(regla.parametros.items())), regla.unidad)
+        if clave not in grupos:
+            grupos[clave] = PasoPlan(regla.tipo, regla.parametros, regla.unidad, [], [])
+        grupos[clave].columnas.append(regla.columna)
+        grupos[clave].ordenes.append(regla.orden)
+    return list(grupos.values())
+
+
+@lru_cache(maxsize=32)
+def _compilar(columnas):
+    reglas = expandir_reglas(columnas)
+    columnas_usadas = {regla.columna for regla in reglas}
+    if any(regla.unidad is not None for regla in reglas):
+        columnas_usadas.add('Unidad')
+    columnas_por_orden = {regla.orden: regla.columna for regla in reglas}
+    return PlanValidacion(reglas, _agrupar_pasos(reglas), frozenset(columnas_usadas),
+                          [columnas_por_orden[orden] for orden in sorted(columnas_por_orden)])
+
+
+def compilar_plan(df_columns):
+    """
+    Compila (o recupera de la caché) el plan de validación para un conjunto de columnas
+
+    Args:
+        df_columns: Columnas de la hoja
+
+    Returns:
+        PlanValidacion: Reglas expandidas, pasos agrupados, columnas que usa el plan
+                        y columna validada por cada orden de regla
+    """
+    return _compilar(frozenset(df_columns))
+
+
+def columnas_requeridas(columnas_adicionales=()):
+    """
+    Columnas que alguna regla de config.REGLAS necesita leer, más las indicadas
+
+    Args:
+        columnas_adicionales: Columnas que se deben conservar aunque ninguna regla las use
+
+    Returns:
+        set: Nombres de columnas
+    """
+    columnas = {columna for spec in REGLAS for columna in spec['columnas']}
+    if any('limite_unidad' in spec or 'unidades' in spec for spec in REGLAS):
+        columnas.add('Unidad')
+    return columnas | set(columnas_adicionales)
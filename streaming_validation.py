@@ -0,0 +1,306 @@
+"""
+Validación en streaming con memoria acotada para libros muy grandes:
+lee las filas por bloques con el iterador de solo lectura de openpyxl y
+escribe los resultados a medida que se validan
+"""
+import time
+import numpy as np
+import pandas as pd
+import logging
+from pandas.io.parsers import TextParser
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+from config import TAMANO_BLOQUE_STREAMING, VALIDACIONES_CRUZADAS, VALIDACIONES_ANOMALIAS
+from validation_engine import ejecutar_motor, registrar_resumen
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_ERRORES = ['Fila de error', 'Columna problema', 'Valor original incorrecto', 'Reglas de negocio']
+
+# Texto no numérico de la fila auxiliar de bloque_a_dataframe
+CENTINELA = '\x00centinela'
+
+
+def _convertir_valor(valor):
+    """Convierte un valor de openpyxl como lo hace pd.read_excel (floats enteros a int)"""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def leer_hoja_por_bloques(hoja, tamano_bloque):
+    """
+    Lee una hoja en modo solo lectura y entrega sus filas por bloques
+
+    Args:
+        hoja: Worksheet de openpyxl abierta en modo read_only
+        tamano_bloque (int): Cantidad máxima de filas por bloque
+
+    Yields:
+        tuple: (encabezado, índice de la primera fila del bloque (0-based), lista de filas)
+    """
+    filas_hoja = hoja.iter_rows(values_only=True)
+    primera = next(filas_hoja, None)
+    if primera is None:
+        return
+    encabezado = [col if col is not None else f'Unnamed: {j}' for j, col in enumerate(primera)]
+    ancho = len(encabezado)
+
+    bloque = []
+    inicio = 0
+    vacias = []
+    for fila in filas_hoja:
+        fila = tuple(fila[:ancho]) + (None,) * (ancho - len(fila))
+        # las filas vacías al final de la hoja se descartan, como en pd.read_excel
+        if all(valor is None for valor in fila):
+            vacias.append(fila)
+            continue
+        bloque.extend(vacias)
+        vacias = []
+        bloque.append(fila)
+        if len(bloque) >= tamano_bloque:
+            yield encabezado, inicio, bloque
+            inicio += len(bloque)
+            bloque = []
+    if bloque:
+        yield encabezado, inicio, bloque
+
+
+def bloque_a_dataframe(encabezado, inicio, filas, tipos=None, representantes=None):
+    """
+    Convierte un bloque de leer_hoja_por_bloques en un DataFrame con el mismo parser (y por lo
+    tanto los mismos valores) que pd.read_excel y con el índice de sus filas en la hoja completa
+
+    Args:
+        tipos (list): Tipo de cada columna en la hoja completa (tipos_columnas); None deja los
+                      tipos que el parser infiere del bloque, que pueden no ser los de la hoja
+        representantes (list): Primer 0 y primer 1 de cada columna en la hoja (tipos_columnas)
+    """
+    valores = np.array([[_convertir_valor(v) for v in fila] for fila in filas], dtype=object)
+    if tipos is not None:
+        for j, tipo in enumerate(tipos):
+            if not _tipo_no_texto(tipo):
+                # en una columna de texto el parser muestra cada 0/1 (o False/True) como el
+                # primero que encuentra, así que todos toman el primero de la hoja completa
+                columna = valores[:, j]
+                for clave, valor in representantes[j].items():
+                    columna[columna == clave] = valor
+        # una fila con un texto no numérico en las columnas de texto de la hoja completa hace que
+        # el parser tampoco convierta a número las de este bloque; la fila se descarta después
+        centinela = [None if _tipo_no_texto(tipo) else CENTINELA for tipo in tipos]
+        valores = np.vstack([valores, np.array([centinela], dtype=object)])
+    df = TextParser([list(encabezado)] + valores.tolist(), header=0, skip_blank_lines=False).read()
+    if tipos is not None:
+        df = df.iloc[:-1]
+        for j, tipo in enumerate(tipos):
+            if df.dtypes.iloc[j] != tipo:
+                df.isetitem(j, df.iloc[:, j].astype(tipo))
+    df.index = pd.RangeIndex(inicio, inicio + len(filas))
+    return df
+
+
+def _tipo_no_texto(tipo):
+    """Indica si un dtype es numérico, booleano o de fecha (el parser ya lo decidió por el valor)"""
+    return isinstance(tipo, np.dtype) and tipo.kind in 'biufM'
+
+
+def tipos_columnas(hoja, tamano_bloque):
+    """
+    Primera pasada de solo lectura sobre la hoja: tipo que pd.read_excel daría a cada columna de
+    la hoja completa y el primer 0 y el primer 1 de cada una (enteros o booleanos, que el parser
+    unifica), para que todos los bloques muestren y validen cada celda igual que sin streaming,
+    sin importar en qué bloque caiga
+
+    Args:
+        hoja: Worksheet de openpyxl abierta en modo read_only
+        tamano_bloque (int): Cantidad máxima de filas por bloque
+
+    Returns:
+        tuple: (dtype de cada columna, diccionario {0: valor, 1: valor} de cada columna), en el
+               orden del encabezado; listas vacías si la hoja no tiene filas
+    """
+    tipos, con_vacias, representantes = {}, set(), []
+    for encabezado, inicio, filas in leer_hoja_por_bloques(hoja, tamano_bloque):
+        if not representantes:
+            representantes = [{} for _ in encabezado]
+        valores = np.array([[_convertir_valor(v) for v in fila] for fila in filas], dtype=object)
+        for j, vistos in enumerate(representantes):
+            for clave in (0, 1):
+                if clave not in vistos:
+                    iguales = np.flatnonzero(valores[:, j] == clave)
+                    if len(iguales):
+                        vistos[clave] = valores[iguales[0], j]
+        df = bloque_a_dataframe(encabezado, inicio, filas)
+        for j in range(df.shape[1]):
+            serie = df.iloc[:, j]
+            vacias = serie.isna()
+            if vacias.any():
+                con_vacias.add(j)
+            if vacias.all():
+                # un bloque sin valores no aporta tipo (solo las celdas vacías)
+                continue
+            # tipo común de pandas, el mismo que resulta al concatenar los bloques
+            tipos[j] = (serie.dtype if j not in tipos else pd.concat(
+                [pd.Series(dtype=tipos[j]), pd.Series(dtype=serie.dtype)]).dtype)
+    resultado = []
+    for j in range(len(representantes)):
+        # una columna sin valores queda en float64 (NaN); las vacías convierten enteros en
+        # float64 y booleanos en object, como en la hoja completa
+        tipo = tipos.get(j, np.dtype(np.float64))
+        if j in con_vacias and isinstance(tipo, np.dtype) and tipo.kind in 'iub':
+            tipo = np.dtype(np.float64) if tipo.kind in 'iu' else np.dtype(object)
+        resultado.append(tipo)
+    return resultado, representantes
+
+
+def _hoja_salida(libro, hojas, nombre, encabezado):
+    """Crea la hoja de salida la primera vez que se necesita y escribe su encabezado"""
+    if nombre not in hojas:
+        hojas[nombre] = libro.create_sheet(nombre)
+        hojas[nombre].append(encabezado)
+    return hojas[nombre]
+
+
+def validar_hoja_streaming(libro_entrada, nombre_hoja, salidas, tamano_bloque=TAMANO_BLOQUE_STREAMING):
+    """
+    Valida una hoja bloque por bloque y agrega los resultados a los libros de salida
+
+    Args:
+        libro_entrada: Libro de openpyxl abierto en modo read_only
+        nombre_hoja (str): Nombre de la hoja a validar
+        salidas (dict): Libros de salida en modo write_only ('errores', 'multiples', 'limpios')
+                        y las hojas ya creadas en cada uno ('hojas')
+        tamano_bloque (int): Cantidad de filas por bloque
+
+    Returns:
+        dict: Totales de la hoja ('filas', 'errores', 'filas_con_errores', 'filas_limpias') o None si hay error
+    """
+    try:
+        hoja = libro_entrada[nombre_hoja]
+    except KeyError as e:
+        mensaje = f"Error al cargar la hoja '{nombre_hoja}': {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return None
+
+    if VALIDACIONES_CRUZADAS or VALIDACIONES_ANOMALIAS:
+        # cada bloque se escribe antes de leer el siguiente y estas validaciones necesitan la hoja completa
+        logger.info(f"Hoja '{nombre_hoja}': las validaciones entre filas y de anomalías no se aplican "
+                    f"en modo streaming")
+
+    hoja_sin_punto = nombre_hoja.replace(".", "")
+    relleno = salidas['relleno']
+    totales = {'filas': 0, 'errores': 0, 'filas_con_errores': 0, 'filas_limpias': 0}
+
+    inicio_lectura = time.perf_counter()
+    tipos, representantes = tipos_columnas(hoja, tamano_bloque)
+    for encabezado, inicio, filas in leer_hoja_por_bloques(hoja, tamano_bloque):
+        df = bloque_a_dataframe(encabezado, inicio, filas, tipos, representantes)
+        METRICAS.registrar_etapa('cargar', time.perf_counter() - inicio_lectura, len(filas))
+        with METRICAS.etapa('validar', len(filas)) as medida:
+            matriz = ejecutar_motor(df, 'vectorizado')
+            medida['errores'] = len(matriz)
+        df_errores = matriz.a_dataframe_errores()
+        del df
+
+        if len(df_errores):
+            hoja_errores = _hoja_salida(salidas['errores'], salidas['hojas']['errores'],
+                                        hoja_sin_punto, COLUMNAS_ERRORES)
+            for error in df_errores.itertuples(index=False):
+                hoja_errores.append(list(error))
+
+        for posicion, columnas in matriz.columnas_por_posicion(matriz.mascara_filas_multiples()).items():
+            hoja_multiples = _hoja_salida(salidas['multiples'], salidas['hojas']['multiples'],
+                                          hoja_sin_punto, encabezado + ['Cantidad_Errores'])
+            celdas = []
+            for columna, valor in zip(encabezado, filas[posicion]):
+                celda = WriteOnlyCell(hoja_multiples, valor)
+                if columna in columnas:
+                    celda.fill = relleno
+                celdas.append(celda)
+            hoja_multiples.append(celdas + [len(columnas)])
+
+        hoja_limpios = _hoja_salida(salidas['limpios'], salidas['hojas']['limpios'], hoja_sin_punto, encabezado)
+        limpias = matriz.mascara_filas_limpias()
+        for posicion, fila in enumerate(filas):
+            if limpias[posicion]:
+                hoja_limpios.append(fila)
+
+        filas_limpias = int(limpias.sum())
+        totales['filas'] += len(filas)
+        totales['errores'] += len(matriz)
+        totales['filas_con_errores'] += len(filas) - filas_limpias
+        totales['filas_limpias'] += filas_limpias
+        logger.info(f"Hoja '{nombre_hoja}': {totales['filas']} filas validadas")
+        inicio_lectura = time.perf_counter()
+
+    registrar_resumen(nombre_hoja, totales['errores'])
+    return totales
+
+
+def validar_archivo_streaming(ruta_archivo, nombres_hojas, ruta_errores, ruta_multiples, ruta_limpios,
+                              tamano_bloque=TAMANO_BLOQUE_STREAMING):
+    """
+    Valida varias hojas en streaming y escribe los tres archivos de resultados sin
+    mantener la hoja completa ni la lista de errores en memoria
+
+    Args:
+        ruta_archivo (str): Ruta al archivo Excel
+        nombres_hojas (list): Nombres de las hojas a validar
+        ruta_errores (str): Ruta del archivo de errores consolidado
+        ruta_multiples (str): Ruta del archivo con filas de múltiples errores
+        ruta_limpios (str): Ruta del archivo de datos limpios
+        tamano_bloque (int): Cantidad de filas por bloque
+
+    Returns:
+        dict: Diccionario con hojas como claves y totales de validación como valores
+    """
+    salidas = {
+        'errores': Workbook(write_only=True),
+        'multiples': Workbook(write_only=True),
+        'limpios': Workbook(write_only=True),
+        'hojas': {'errores': {}, 'multiples': {}, 'limpios': {}},
+        'relleno': PatternFill(start_color='D8BFD8', end_color='D8BFD8', fill_type='solid')
+    }
+
+    try:
+        libro_entrada = load_workbook(ruta_archivo, read_only=True, data_only=True)
+    except Exception as e:
+        mensaje = f"Error al abrir el archivo {ruta_archivo}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return {}
+
+    totales_por_hoja = {}
+    try:
+        for nombre_hoja in nombres_hojas:
+            print(f"\n{'='*50}")
+            print(f"Procesando hoja (streaming): {nombre_hoja}")
+            print(f"{'='*50}")
+            totales_por_hoja[nombre_hoja] = validar_hoja_streaming(libro_entrada, nombre_hoja, salidas, tamano_bloque)
+    finally:
+        libro_entrada.close()
+
+    destinos = [
+        ('errores', ruta_errores, "Archivo de errores consolidado"),
+        ('multiples', ruta_multiples, "Archivo con filas de múltiples errores"),
+        ('limpios', ruta_limpios, "Archivo de datos limpios")
+    ]
+    for clave, ruta_salida, descripcion in destinos:
+        if not salidas['hojas'][clave]:
+            logger.info(f"No hay datos para guardar en el archivo: {ruta_salida}")
+            print(f"No hay datos para guardar en el archivo: {ruta_salida}")
+            continue
+        try:
+            with METRICAS.etapa(f'guardar_{clave}'):
+                salidas[clave].save(ruta_salida)
+            logger.info(f"{descripcion} guardado correctamente en: {ruta_salida}")
+            print(f"{descripcion} guardado correctamente en: {ruta_salida}")
+        except Exception as e:
+            mensaje = f"Error al guardar el archivo {ruta_salida}: {str(e)}"
+            logger.error(mensaje)
+            print(mensaje)
+
+    return totales_por_hoja
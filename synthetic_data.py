@@ -0,0 +1,163 @@
+"""
+Generador de hojas sintéticas G3.0/G3.2 con las columnas que validan las reglas,
+datos horarios plausibles y una tasa configurable de filas con errores
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from config import REGLAS, REGLAS_CONSISTENCIA
+from rule_compiler import expandir_reglas
+from file_operations import valores_para_excel
+
+# Hoja del libro y unidad de generación de sus filas
+HOJAS_UNIDADES = {'G3.0': 'UG3.0', 'G3.2': 'UG3.2'}
+
+# Máximo de filas de datos de una hoja de Excel (1.048.576 menos el encabezado)
+MAX_FILAS_EXCEL = 1048575
+
+
+def columnas_hoja():
+    """Columnas de una hoja sintética, en el orden de config.REGLAS"""
+    return [columna for spec in REGLAS for columna in spec['columnas']]
+
+
+def _reglas_unidad(columnas, unidad):
+    """
+    Regla de cada columna para generar sus valores: la que aplica a las filas de la
+    unidad o, si no la hay (p. ej. G-LN764 en UG3.2), la de otra unidad
+
+    Returns:
+        tuple: (diccionario columna -> regla, columnas validadas para la unidad)
+    """
+    reglas = {}
+    validadas = []
+    for regla in expandir_reglas(columnas):
+        if regla.unidad in (None, unidad) and regla.columna not in validadas:
+            reglas[regla.columna] = regla
+            validadas.append(regla.columna)
+        reglas.setdefault(regla.columna, regla)
+    return reglas, validadas
+
+
+def _valores_validos(regla, n_filas, horas, unidad, rng):
+    """Columna de valores válidos para una regla"""
+    if regla.columna == 'Fecha':
+        return horas.normalize().to_numpy()
+    if regla.columna == 'Periodo':
+        return horas.hour.to_numpy() + 1
+    if regla.columna == 'Unidad':
+        return np.full(n_filas, unidad, dtype=object)
+    if regla.tipo == 'fecha':
+        return horas.to_numpy()
+    if regla.tipo == 'enum':
+        return rng.choice(np.array(regla.parametros['valores']), n_filas)
+    if regla.tipo == 'entero':
+        return rng.integers(regla.parametros['min'], regla.parametros['max'] + 1, n_filas)
+    return np.round(rng.uniform(regla.parametros['min'], regla.parametros['max'], n_filas), 2)
+
+
+def _aplicar_consistencia(datos, reglas):
+    """
+    Deriva las columnas de config.REGLAS_CONSISTENCIA de sus operandos, para que las filas
+    sin errores inyectados cumplan también esas reglas. Los sumandos se escalan para que la
+    suma no supere el máximo de su columna, y el minuendo se limita a dos veces el sustraendo
+    para que un porcentaje calculado sobre la diferencia quede dentro de ±100%
+    """
+    for consistencia in REGLAS_CONSISTENCIA:
+        columna = consistencia['columna']
+        if consistencia['tipo'] == 'suma':
+            sumandos = np.array([datos[c] for c in consistencia['sumandos']], dtype=np.float64)
+            escala = np.minimum(1.0, reglas[columna].parametros['max'] / np.maximum(sumandos.sum(axis=0), 1e-9))
+            for c, valores in zip(consistencia['sumandos'], sumandos):
+                # truncar (y no redondear) evita que la suma redondeada pase del máximo
+                datos[c] = np.where(escala < 1, np.floor(valores * escala * 100) / 100, valores)
+            datos[columna] = np.round(np.sum([datos[c] for c in consistencia['sumandos']], axis=0), 2)
+        elif consistencia['tipo'] == 'diferencia':
+            sustraendo = datos[consistencia['sustraendo']]
+            datos[consistencia['minuendo']] = np.minimum(datos[consistencia['minuendo']], np.round(2 * sustraendo, 2))
+            datos[columna] = np.round(datos[consistencia['minuendo']] - sustraendo, 2)
+        else:
+            numerador, denominador = datos[consistencia['numerador']], datos[consistencia['denominador']]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                datos[columna] = np.round(np.where(denominador != 0, 100 * numerador / denominador, 0.0), 2)
+
+
+def _valor_invalido(regla, rng):
+    """Valor que incumple la regla: fuera de rango o texto no convertible"""
+    texto = rng.random() < 0.3
+    if regla.tipo == 'fecha':
+        return 'sin fecha' if texto else '2021-13-45'
+    if regla.tipo == 'enum':
+        return 'N/D' if texto else (7 if all(isinstance(v, int) for v in regla.parametros['valores']) else 'UG9.9')
+    if texto:
+        return 'N/D'
+    minimo, maximo = regla.parametros['min'], regla.parametros['max']
+    fuera = maximo + (maximo - minimo) * rng.uniform(0.1, 1.0) + 1
+    return int(fuera) if regla.tipo == 'entero' else round(fuera, 2)
+
+
+def generar_hoja(n_filas, unidad, tasa_errores=0.01, semilla=0, fecha_inicio='2015-01-01'):
+    """
+    Genera una hoja con una fila por hora desde fecha_inicio
+
+    Args:
+        n_filas (int): Cantidad de filas
+        unidad (str): Unidad de todas las filas ('UG3.0' o 'UG3.2')
+        tasa_errores (float): Fracción de filas con al menos un valor inválido;
+                              una de cada cinco de esas filas tiene dos
+        semilla (int): Semilla del generador aleatorio
+        fecha_inicio (str): Fecha y hora de la primera fila
+
+    Returns:
+        pd.DataFrame: Hoja sintética con las columnas de columnas_hoja()
+    """
+    rng = np.random.default_rng(semilla)
+    columnas = columnas_hoja()
+    reglas, validadas = _reglas_unidad(columnas, unidad)
+    horas = pd.date_range(fecha_inicio, periods=n_filas, freq='h')
+    datos = {columna: _valores_validos(reglas[columna], n_filas, horas, unidad, rng) for columna in columnas}
+    _aplicar_consistencia(datos, reglas)
+
+    filas_error = rng.choice(n_filas, int(round(n_filas * tasa_errores)), replace=False)
+    dobles = filas_error[:len(filas_error) // 5]
+    celdas = np.concatenate([filas_error, dobles])
+    columnas_error = rng.integers(0, len(validadas), len(celdas))
+    for fila, indice in zip(celdas.tolist(), columnas_error.tolist()):
+        columna = validadas[indice]
+        valor = _valor_invalido(reglas[columna], rng)
+        if datos[columna].dtype != object and (isinstance(valor, str) or datos[columna].dtype.kind == 'M'):
+            # las fechas pasan a Timestamp y no a enteros de nanosegundos
+            datos[columna] = np.array(pd.Series(datos[columna]).astype(object), dtype=object)
+        datos[columna][fila] = valor
+
+    return pd.DataFrame(datos, columns=columnas)
+
+
+def generar_hojas(n_filas, tasa_errores=0.01, semilla=0):
+    """
+    Genera las hojas G3.0 y G3.2 repartiendo las filas entre ambas
+
+    Returns:
+        dict: Diccionario con hojas como claves y DataFrames sintéticos como valores
+    """
+    mitad = n_filas // 2
+    cantidades = {'G3.0': n_filas - mitad, 'G3.2': mitad}
+    return {hoja: generar_hoja(cantidades[hoja], unidad, tasa_errores, semilla + i)
+            for i, (hoja, unidad) in enumerate(HOJAS_UNIDADES.items())}
+
+
+def guardar_libro_sintetico(hojas, ruta_salida):
+    """
+    Escribe las hojas sintéticas en un libro Excel con hojas de solo escritura
+
+    Args:
+        hojas (dict): Diccionario con hojas como claves y DataFrames como valores
+        ruta_salida (str): Ruta del libro a crear
+    """
+    libro = Workbook(write_only=True)
+    for hoja, df in hojas.items():
+        hoja_libro = libro.create_sheet(hoja)
+        hoja_libro.append(list(df.columns))
+        for fila in zip(*valores_para_excel(df)):
+            hoja_libro.append(fila)
+    libro.save(ruta_salida)
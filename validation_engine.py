@@ -2,26 +2,34 @@
 """
 Módulo principal del motor de validación
 """
-import pandas as pd
+import time
 import logging
-from collections import defaultdict
-from validators import (
-    validar_fecha, validar_entero_rango, validar_numero_rango,
-    validar_unidad, validar_tipo_evento, obtener_limites
-)
-from config import RANGOS
+import numpy as np
+from validators import validar_segun_regla
+from config import MOTOR_VALIDACION, EJEMPLOS_POR_REGLA, FILAS_POR_PARTICION
+from rule_compiler import compilar_plan
+from vectorized_engine import validar_dataframe_vectorizado
+from error_matrix import MatrizErrores
+from cross_row_validation import COLUMNAS_CLAVE, validar_hoja_cruzada, periodos_faltantes
+from anomaly_detection import columnas_anomalias, validar_hoja_anomalias
+from consistency_rules import validar_consistencia
+from metrics import METRICAS
+from log_config import LOGGER_DETALLE
 
 logger = logging.getLogger(__name__)
+logger_detalle = logging.getLogger(LOGGER_DETALLE)
 
 
-def validar_fila(fila, fila_num, df_columns):
+def validar_fila(fila, fila_num, plan, acumulado=None):
     """
     Valida una fila completa del DataFrame
     
     Args:
         fila: Serie de pandas con los datos de la fila
         fila_num: Número de fila en Excel (1-based)
-        df_columns: Columnas del DataFrame
+        plan: PlanValidacion de las columnas de la hoja, compilado una vez por hoja
+        acumulado: Lista opcional con [segundos, celdas, errores] por regla del plan,
+                   que se incrementa con lo evaluado en esta fila
     
     Returns:
         list: Lista de errores encontrados
@@ -30,218 +38,234 @@ def validar_fila(fila, fila_num, df_columns):
     errores_fila = []
     columnas_con_error = []
     
-    # límites según la unidad
+    # las reglas por unidad solo aplican a las filas de esa unidad
     unidad = fila.get('Unidad', None)
-    limites = obtener_limites(unidad)
     
-    # validar Fecha
-    if 'Fecha' in df_columns:
-        valido, error = validar_fecha(fila['Fecha'], 'Fecha')
+    for i, regla in enumerate(plan.reglas):
+        if regla.unidad is not None and unidad != regla.unidad:
+            continue
+        inicio = time.perf_counter()
+        valido, error = validar_segun_regla(fila[regla.columna], regla.columna, regla.tipo, regla.parametros)
+        if acumulado is not None:
+            acumulado[i][0] += time.perf_counter() - inicio
+            acumulado[i][1] += 1
+            acumulado[i][2] += not valido
         if not valido:
             errores_fila.append(error)
-            columnas_con_error.append('Fecha')
-    
-    # validar Periodo
-    if 'Periodo' in df_columns:
-        valido, error = validar_entero_rango(fila['Periodo'], RANGOS['periodo'][0], 
-                                            RANGOS['periodo'][1], 'Periodo')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Periodo')
-    
-    # validar Unidad
-    if 'Unidad' in df_columns:
-        valido, error = validar_unidad(fila['Unidad'])
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Unidad')
-    
-    # validar columnas numéricas con límites según unidad
-    columnas_con_limite_disponibilidad = [
-        'Disponibilidad declarada(MWh)',
-        'Despacho programado(MWh)',
-        'Despacho final(real)(MWh)',
-        'Energía neta despachada (MWh)'
-    ]
-    
-    for col in columnas_con_limite_disponibilidad:
-        if col in df_columns and limites['disponibilidad_max'] is not None:
-            valido, error = validar_numero_rango(fila[col], 0, limites['disponibilidad_max'], col)
-            if not valido:
-                errores_fila.append(error)
-                columnas_con_error.append(col)
-    
-    # validar Energía desviada (puede ser negativa)
-    if 'Energía desviada (MWh)' in df_columns and limites['disponibilidad_max'] is not None:
-        valido, error = validar_numero_rango(fila['Energía desviada (MWh)'], 
-                                           -limites['disponibilidad_max'], 
-                                           limites['disponibilidad_max'], 
-                                           'Energía desviada (MWh)')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Energía desviada (MWh)')
-    
-    # validar %Desviación
-    if '%Desviación (%)' in df_columns:
-        valido, error = validar_numero_rango(fila['%Desviación (%)'], 
-                                           RANGOS['porcentaje_desviacion'][0], 
-                                           RANGOS['porcentaje_desviacion'][1], 
-                                           '%Desviación (%)', es_porcentaje=True)
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('%Desviación (%)')
-    
-    # validar columnas con límite bruta_max
-    columnas_con_limite_bruta = [
-        'Energía bruta generada (kWh)',
-        'Energía consumida (kWh)',
-        'Energía reactiva generada (kVAr)',
-        'Energía reactiva consumida (kVAr)'
-    ]
-    
-    for col in columnas_con_limite_bruta:
-        if col in df_columns and limites['bruta_max'] is not None:
-            valido, error = validar_numero_rango(fila[col], 0, limites['bruta_max'], col)
-            if not valido:
-                errores_fila.append(error)
-                columnas_con_error.append(col)
-    
-    # validar alimentadores de carbón
-    for i in range(1, 9):
-        col_name = f'Alimentador {i} de carbón (Ton)'
-        if col_name in df_columns:
-            valido, error = validar_numero_rango(fila.get(col_name), 
-                                               RANGOS['alimentador_carbon'][0], 
-                                               RANGOS['alimentador_carbon'][1], 
-                                               col_name)
-            if not valido:
-                errores_fila.append(error)
-                columnas_con_error.append(col_name)
-    
-    # validar Total carbón
-    if 'Total carbón Alimentado caldera (Ton)' in df_columns and limites['total_carbon_max'] is not None:
-        valido, error = validar_numero_rango(fila['Total carbón Alimentado caldera (Ton)'], 
-                                           0, limites['total_carbon_max'], 
-                                           'Total carbón Alimentado caldera (Ton)')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Total carbón Alimentado caldera (Ton)')
-    
-    # validar Suministro caliza
-    if 'Suministro caliza (Ton)' in df_columns:
-        valido, error = validar_numero_rango(fila['Suministro caliza (Ton)'], 
-                                           RANGOS['suministro_caliza'][0], 
-                                           RANGOS['suministro_caliza'][1], 
-                                           'Suministro caliza (Ton)')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Suministro caliza (Ton)')
-    
-    # validar Consumo combustible
-    if 'Consumo combustible líquido FO (gal)' in df_columns:
-        valido, error = validar_numero_rango(fila['Consumo combustible líquido FO (gal)'], 
-                                           RANGOS['combustible_liquido'][0], 
-                                           RANGOS['combustible_liquido'][1], 
-                                           'Consumo combustible líquido FO (gal)')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Consumo combustible líquido FO (gal)')
-    
-    # validaciones específicas para UG3.0
-    if unidad == "UG3.0":
-        for col in ['G-LN764', 'G-LN765']:
-            if col in df_columns:
-                valido, error = validar_numero_rango(fila[col], 
-                                                   RANGOS['g_ln'][0], 
-                                                   RANGOS['g_ln'][1], col)
-                if not valido:
-                    errores_fila.append(error)
-                    columnas_con_error.append(col)
-        
-        for col in ['A-LN764', 'A-LN765']:
-            if col in df_columns:
-                valido, error = validar_numero_rango(fila[col], 
-                                                   RANGOS['a_ln'][0], 
-                                                   RANGOS['a_ln'][1], col)
-                if not valido:
-                    errores_fila.append(error)
-                    columnas_con_error.append(col)
-    
-    # validar Fecha Evento
-    if 'Fecha Evento' in df_columns:
-        valido, error = validar_fecha(fila['Fecha Evento'], 'Fecha Evento')
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Fecha Evento')
-    
-    # validar Tipo de evento
-    if 'Tipo de evento' in df_columns:
-        valido, error = validar_tipo_evento(fila['Tipo de evento'])
-        if not valido:
-            errores_fila.append(error)
-            columnas_con_error.append('Tipo de evento')
+            columnas_con_error.append(regla.columna)
     
     return errores_fila, columnas_con_error
 
 
-def validar_dataframe(df, nombre_hoja):
+def _validar_dataframe_filas(df):
     """
-    Valida un DataFrame completo
+    Valida un DataFrame recorriéndolo fila por fila con validar_fila
     
     Args:
         df: DataFrame a validar
-        nombre_hoja: Nombre de la hoja para logging
     
     Returns:
-        tuple: (DataFrame con errores, DataFrame con filas múltiples errores, 
-                DataFrame original, diccionario de celdas con errores)
+        MatrizErrores: Errores de la hoja
     """
-    errores = []
-    errores_por_fila = defaultdict(int)
-    celdas_con_errores = defaultdict(list)
+    plan = compilar_plan(df.columns)
+    orden_por_columna = {regla.columna: regla.orden for regla in plan.reglas}
+    posiciones, ordenes, valores, textos = [], [], [], []
+    acumulado = [[0.0, 0, 0] for _ in plan.reglas]
     
-    for idx, fila in df.iterrows():
+    for posicion, (idx, fila) in enumerate(df.iterrows()):
         fila_num = idx + 2  # +2 porque idx es 0-based y Excel ajá, los encabezados
         
-        errores_fila, columnas_con_error = validar_fila(fila, fila_num, df.columns)
+        errores_fila, _ = validar_fila(fila, fila_num, plan, acumulado)
         
         # Procesar errores encontrados
         for error in errores_fila:
-            errores.append({
-                'Fila de error': fila_num,
-                'Columna problema': error['columna'],
-                'Valor original incorrecto': error['valor'],
-                'Reglas de negocio': error['regla']
-            })
-            errores_por_fila[fila_num] += 1
-            logger.warning(f"Error en fila {fila_num}, columna {error['columna']}: {error['valor']} - {error['regla']}")
-        
-        if columnas_con_error:
-            celdas_con_errores[fila_num] = columnas_con_error
-    
-    df_errores = pd.DataFrame(errores)
-    
-    filas_multiples_errores = []
-    for fila_num, cantidad in errores_por_fila.items():
-        if cantidad > 1:
-            errores_fila = [e for e in errores if e['Fila de error'] == fila_num]
-            for error in errores_fila:
-                filas_multiples_errores.append({
-                    'Fila de error': error['Fila de error'],
-                    'Columna problema': error['Columna problema'],
-                    'Valor original incorrecto': error['Valor original incorrecto'],
-                    'Reglas de negocio': error['Reglas de negocio'],
-                    'Cantidad de errores en fila': cantidad
-                })
-    
-    df_multiples_errores = pd.DataFrame(filas_multiples_errores)
-    
-    cantidad_errores = len(errores)
+            posiciones.append(posicion)
+            ordenes.append(orden_por_columna[error['columna']])
+            valores.append(error['valor'])
+            textos.append(error['regla'])
+    
+    for regla, (segundos, celdas, errores) in zip(plan.reglas, acumulado):
+        METRICAS.registrar_regla(regla.columna, regla.tipo, regla.unidad, segundos, celdas, errores)
+    
+    return MatrizErrores(df.index, plan.columnas_por_orden, posiciones, ordenes, valores, textos)
+
+
+def registrar_errores(matriz, max_ejemplos=EJEMPLOS_POR_REGLA):
+    """
+    Registra en el log un resumen por columna y regla (cantidad y primeros ejemplos) y,
+    solo si el logger de detalle está activo, una línea por cada celda con error
+    
+    Args:
+        matriz: MatrizErrores de una hoja o partición
+        max_ejemplos (int): Cantidad de ejemplos por regla en el resumen
+    """
+    if len(matriz) == 0:
+        return
+    
+    if logger_detalle.isEnabledFor(logging.WARNING):
+        filas = matriz.etiquetas[matriz.posiciones] + 2
+        columnas = np.asarray(matriz.columnas_reglas, dtype=object)[matriz.ids_regla]
+        for fila_num, columna, valor, regla in zip(filas.tolist(), columnas, matriz.valores, matriz.textos):
+            logger_detalle.warning(f"Error en fila {fila_num}, columna {columna}: {valor} - {regla}")
+    
+    if not logger.isEnabledFor(logging.WARNING):
+        return
+    for columna, regla, cantidad, ejemplos in matriz.resumen_por_regla(max_ejemplos):
+        texto_ejemplos = "; ".join(f"fila {fila_num}: {valor}" for fila_num, valor in ejemplos)
+        logger.warning(f"{cantidad} errores en columna {columna} ({regla}). Primeros: {texto_ejemplos}")
+
+
+def ejecutar_motor(df, motor=MOTOR_VALIDACION):
+    """
+    Ejecuta el motor de validación indicado sobre un DataFrame (o una partición de filas)
+    
+    Args:
+        df: DataFrame a validar; su índice determina la 'Fila de error'
+        motor: 'vectorizado' (una máscara por regla y columna) o 'filas'
+               (recorrido con iterrows); ambos devuelven los mismos resultados
+    
+    Returns:
+        MatrizErrores: Errores de la hoja o partición; en cada fila, los de las reglas por celda
+                       seguidos de los de las reglas de consistencia entre columnas
+    """
+    if motor == 'vectorizado':
+        matriz = validar_dataframe_vectorizado(df)
+    elif motor == 'filas':
+        matriz = _validar_dataframe_filas(df)
+    else:
+        raise ValueError(f"Motor de validación desconocido: {motor}")
+    # las reglas entre columnas son columnares con cualquiera de los dos motores
+    consistencia = validar_consistencia(df)
+    if consistencia is not None:
+        matriz = matriz.unir_reglas(consistencia)
+    registrar_errores(matriz)
+    return matriz
+
+
+def agregar_validaciones_cruzadas(df, matriz):
+    """
+    Agrega a los errores por celda de una hoja completa los de las validaciones entre filas
+    (clave horaria duplicada, filas fuera de orden) y los de la detección de anomalías en la
+    serie de cada unidad
+    
+    Args:
+        df: DataFrame de la hoja completa (no una partición)
+        matriz: MatrizErrores de las reglas por celda de la hoja
+    
+    Returns:
+        MatrizErrores: Errores por celda seguidos, en cada fila, de los errores entre filas y
+                       de las anomalías
+    """
+    for validacion in (validar_hoja_cruzada, validar_hoja_anomalias):
+        errores = validacion(df)
+        if errores is not None:
+            registrar_errores(errores)
+            matriz = matriz.unir_reglas(errores)
+    return matriz
+
+
+def periodos_faltantes_por_hoja(datos):
+    """
+    Periodos faltantes por fecha y unidad de cada hoja cargada, que se reportan como hallazgos
+    de la hoja y no como errores de sus filas
+    
+    Args:
+        datos (dict): Diccionario con hojas como claves y DataFrames (o HojaCompacta, o None)
+                      como valores
+    
+    Returns:
+        dict: Diccionario con hojas como claves y el DataFrame de periodos_faltantes (o None)
+              como valores
+    """
+    periodos = {}
+    for hoja, df in datos.items():
+        if df is not None and hasattr(df, 'restaurar'):
+            # solo necesita la clave horaria de la hoja completa
+            df = df.restaurar(columnas=list(COLUMNAS_CLAVE))
+        periodos[hoja] = None if df is None else periodos_faltantes(df)
+    return periodos
+
+
+def combinar_resultados(matrices):
+    """
+    Combina los resultados de particiones consecutivas de filas de una misma hoja
+    
+    Args:
+        matrices: Lista de MatrizErrores devueltas por ejecutar_motor, en el orden de las filas
+    
+    Returns:
+        MatrizErrores: Igual a la de una sola ejecución sobre la hoja completa
+    """
+    return MatrizErrores.concatenar(matrices)
+
+
+def registrar_resumen(nombre_hoja, cantidad_errores):
+    """Registra y muestra la cantidad de errores encontrados en una hoja"""
     if cantidad_errores > 0:
         logger.info(f"Se encontraron {cantidad_errores} errores en la hoja '{nombre_hoja}'.")
         print(f"Se encontraron {cantidad_errores} errores en la hoja '{nombre_hoja}'.")
     else:
         logger.info(f"No se encontraron errores en la hoja '{nombre_hoja}'.")
         print(f"No se encontraron errores en la hoja '{nombre_hoja}'.")
+
+
+def validar_dataframe_matriz(df, nombre_hoja, motor=MOTOR_VALIDACION):
+    """
+    Valida un DataFrame completo y devuelve sus errores en forma columnar
     
-    return df_errores, df_multiples_errores, df, celdas_con_errores
\ No newline at end of file
+    Args:
+        df: DataFrame a validar
+        nombre_hoja: Nombre de la hoja para logging
+        motor: 'vectorizado' o 'filas'
+    
+    Returns:
+        MatrizErrores: Errores de la hoja
+    """
+    with METRICAS.etapa('validar', len(df)) as medida:
+        matriz = agregar_validaciones_cruzadas(df, ejecutar_motor(df, motor))
+        medida['errores'] = len(matriz)
+    registrar_resumen(nombre_hoja, len(matriz))
+    return matriz
+
+
+def validar_hoja_compacta(hoja, nombre_hoja, motor=MOTOR_VALIDACION):
+    """
+    Valida una HojaCompacta restaurando sus filas por bloques de FILAS_POR_PARTICION, de modo
+    que nunca se reconstruye la hoja completa con sus tipos originales
+    
+    Args:
+        hoja: HojaCompacta a validar
+        nombre_hoja: Nombre de la hoja para logging
+        motor: 'vectorizado' o 'filas'
+    
+    Returns:
+        MatrizErrores: Igual a la de validar_dataframe_matriz sobre la hoja original
+    """
+    with METRICAS.etapa('validar', len(hoja)) as medida:
+        matriz = combinar_resultados([ejecutar_motor(hoja.restaurar(inicio, inicio + FILAS_POR_PARTICION), motor)
+                                      for inicio in range(0, len(hoja), FILAS_POR_PARTICION)])
+        # las validaciones entre filas solo necesitan la clave de la hoja completa y las
+        # anomalías, además, sus columnas numéricas
+        columnas = columnas_anomalias(hoja.columns) or list(COLUMNAS_CLAVE)
+        matriz = agregar_validaciones_cruzadas(hoja.restaurar(columnas=columnas), matriz)
+        medida['errores'] = len(matriz)
+    registrar_resumen(nombre_hoja, len(matriz))
+    return matriz
+
+
+def validar_dataframe(df, nombre_hoja, motor=MOTOR_VALIDACION):
+    """
+    Valida un DataFrame completo
+    
+    Args:
+        df: DataFrame a validar
+        nombre_hoja: Nombre de la hoja para logging
+        motor: 'vectorizado' (una máscara por regla y columna) o 'filas'
+               (recorrido con iterrows); ambos devuelven los mismos resultados
+    
+    Returns:
+        tuple: (DataFrame con errores, DataFrame con filas múltiples errores, 
+                DataFrame original, diccionario de celdas con errores)
+    """
+    matriz = validar_dataframe_matriz(df, nombre_hoja, motor)
+    return matriz.a_dataframe_errores(), matriz.a_dataframe_multiples(), df, matriz.celdas_con_errores()
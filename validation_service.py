@@ -0,0 +1,372 @@
+"""
+Servicio de validación de larga duración: mantiene procesos trabajadores con los módulos
+importados y los planes de reglas compilados, recibe trabajos por un endpoint HTTP local
+y puede vigilar una carpeta de entrada para validar los libros que se dejen en ella
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import itertools
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ProcessPoolExecutor, wait
+from config import (HOJAS_POR_DEFECTO, ARCHIVO_METRICAS, HOST_SERVICIO, PUERTO_SERVICIO, WORKERS_SERVICIO,
+                    INTERVALO_CARPETA_ENTRADA)
+from batch_validation import expandir_entradas, asignar_directorio, validar_archivo_lote, validar_opciones_archivo
+from parallel_validation import _inicializar_trabajador
+from vectorized_engine import validar_dataframe_vectorizado
+from synthetic_data import generar_hojas
+from metrics import METRICAS
+from log_config import configurar_logging, detener_logging, LOGGER_DETALLE
+
+logger = logging.getLogger(__name__)
+
+
+def _inicializar_servicio(detalle):
+    """
+    Prepara un proceso trabajador del servicio: configura su logging y valida una hoja
+    sintética pequeña para compilar el plan de reglas y recorrer una vez el motor vectorizado
+    """
+    _inicializar_trabajador(detalle)
+    for df in generar_hojas(48, tasa_errores=0.1).values():
+        validar_dataframe_vectorizado(df)
+    METRICAS.reiniciar()
+
+
+def _trabajador_listo():
+    """Tarea vacía para arrancar los procesos del pool antes del primer trabajo"""
+    return os.getpid()
+
+
+class ServicioValidacion:
+    """
+    Pool de procesos precalentados que valida archivos como trabajos independientes;
+    cada trabajo escribe sus resultados en un subdirectorio propio del directorio de salida
+    """
+
+    def __init__(self, workers=WORKERS_SERVICIO, hojas=HOJAS_POR_DEFECTO, directorio_salida='resultados_servicio',
+                 opciones=(), detalle=False):
+        """
+        Args:
+            workers (int): Cantidad de procesos trabajadores
+            hojas (list): Hojas que se validan cuando un trabajo no las indica
+            directorio_salida (str): Directorio de resultados cuando un trabajo no lo indica
+            opciones (tuple): Opciones de main.py que se aplican cuando un trabajo no las indica
+            detalle (bool): Registra en el log una línea por cada celda con error
+        """
+        self.workers = workers
+        self.hojas = list(hojas)
+        self.directorio_salida = directorio_salida
+        self.opciones = tuple(opciones)
+        self.detalle = detalle
+        self.pool = None
+        self.trabajos = {}
+        self._contador = itertools.count(1)
+        self._duenos_directorios = {}
+        self._bloqueo = threading.Lock()
+
+    def iniciar(self):
+        """Crea el pool y espera a que todos los trabajadores terminen de precalentarse"""
+        inicio = time.perf_counter()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_inicializar_servicio,
+                                        initargs=(self.detalle,))
+        wait([self.pool.submit(_trabajador_listo) for _ in range(self.workers)])
+        mensaje = (f"Servicio de validación listo con {self.workers} procesos "
+                   f"({time.perf_counter() - inicio:.1f} s de arranque)")
+        logger.info(mensaje)
+        print(mensaje)
+
+    def enviar(self, ruta_archivo, hojas=None, directorio_salida=None, opciones=None):
+        """
+        Encola la validación de un archivo
+
+        Args:
+            ruta_archivo (str): Archivo a validar
+            hojas (list): Hojas a validar; None usa las del servicio
+            directorio_salida (str): Directorio de resultados; None usa el del servicio
+            opciones (list): Opciones de main.py; None usa las del servicio
+
+        Returns:
+            int: Identificador del trabajo
+
+        Raises:
+            ValueError: Si las opciones no son válidas
+        """
+        hojas = self.hojas if not hojas else list(hojas)
+        directorio_salida = directorio_salida or self.directorio_salida
+        opciones = self.opciones if opciones is None else tuple(opciones)
+        validar_opciones_archivo(opciones)
+
+        # el trabajo se publica ya con su futuro, para que consultar y estado nunca lo vean sin él;
+        # el callback se registra fuera del bloqueo porque corre en este hilo si el futuro ya terminó
+        with self._bloqueo:
+            id_trabajo = next(self._contador)
+            directorio = asignar_directorio(ruta_archivo, directorio_salida, self._duenos_directorios)
+            trabajo = {'trabajo': id_trabajo, 'archivo': ruta_archivo, 'directorio': directorio, 'estado': 'en cola',
+                       'enviado': time.perf_counter(), 'terminado': threading.Event()}
+            trabajo['futuro'] = self.pool.submit(validar_archivo_lote, ruta_archivo, hojas, directorio, opciones)
+            self.trabajos[id_trabajo] = trabajo
+        logger.info(f"Trabajo {id_trabajo} recibido: {ruta_archivo}")
+        trabajo['futuro'].add_done_callback(lambda futuro: self._terminar_trabajo(id_trabajo, futuro))
+        return id_trabajo
+
+    def _terminar_trabajo(self, id_trabajo, futuro):
+        """Guarda el resultado de un trabajo y suma sus métricas a las del servicio"""
+        trabajo = self.trabajos[id_trabajo]
+        if futuro.cancelled():
+            resultado = {'hojas': {}, 'estado': 'cancelado', 'segundos': None, 'metricas': None}
+        else:
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                resultado = {'hojas': {}, 'estado': f"error: {str(e)}", 'segundos': None, 'metricas': None}
+        with self._bloqueo:
+            if resultado['metricas'] is not None:
+                METRICAS.combinar(resultado['metricas'])
+            trabajo.update(estado=resultado['estado'], hojas=resultado['hojas'], segundos=resultado['segundos'],
+                           segundos_total=round(time.perf_counter() - trabajo['enviado'], 3))
+        trabajo['terminado'].set()
+        mensaje = (f"Trabajo {id_trabajo} ({trabajo['archivo']}): {trabajo['estado']} "
+                   f"en {trabajo['segundos_total']:.2f} s")
+        logger.info(mensaje)
+        print(mensaje)
+
+    def esperar(self, id_trabajo, tiempo_maximo=None):
+        """Espera a que termine un trabajo y devuelve su estado"""
+        self.trabajos[id_trabajo]['terminado'].wait(tiempo_maximo)
+        return self.consultar(id_trabajo)
+
+    def consultar(self, id_trabajo):
+        """
+        Returns:
+            dict: Estado del trabajo ('en cola', 'en proceso', 'ok', 'cancelado', 'error: ...') y sus
+                  totales por hoja, o None si el trabajo no existe
+        """
+        with self._bloqueo:
+            trabajo = self.trabajos.get(id_trabajo)
+            if trabajo is None:
+                return None
+            estado = {clave: valor for clave, valor in trabajo.items()
+                      if clave not in ('futuro', 'enviado', 'terminado')}
+        if estado['estado'] == 'en cola' and trabajo['futuro'].running():
+            estado['estado'] = 'en proceso'
+        return estado
+
+    def estado(self):
+        """
+        Returns:
+            dict: Procesos del servicio y cantidad de trabajos pendientes y terminados
+        """
+        with self._bloqueo:
+            pendientes = sum(1 for trabajo in self.trabajos.values() if not trabajo['futuro'].done())
+            total = len(self.trabajos)
+        return {'workers': self.workers, 'trabajos_pendientes': pendientes,
+                'trabajos_terminados': total - pendientes}
+
+    def detener(self):
+        """Espera los trabajos en curso, cancela los que siguen en cola y cierra el pool"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+
+class _ManejadorHTTP(BaseHTTPRequestHandler):
+    """
+    Endpoint HTTP del servicio:
+        POST /validar          {"archivo": ..., "hojas": [...], "directorio_salida": ..., "opciones": [...],
+                                "esperar": true}
+        GET  /trabajos/<id>    estado de un trabajo
+        GET  /estado           procesos y trabajos del servicio
+        GET  /metricas         métricas acumuladas de todos los trabajos
+    """
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        servicio = self.server.servicio
+        if self.path == '/estado':
+            self._responder(200, servicio.estado())
+        elif self.path == '/metricas':
+            self._responder(200, METRICAS.a_diccionario())
+        elif self.path.startswith('/trabajos/') and self.path[len('/trabajos/'):].isdigit():
+            estado = servicio.consultar(int(self.path[len('/trabajos/'):]))
+            self._responder(200 if estado is not None else 404, estado or {'error': "trabajo no encontrado"})
+        else:
+            self._responder(404, {'error': f"ruta no encontrada: {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/validar':
+            self._responder(404, {'error': f"ruta no encontrada: {self.path}"})
+            return
+        try:
+            longitud = int(self.headers.get('Content-Length', 0))
+            datos = json.loads(self.rfile.read(longitud) or b'{}')
+            if not isinstance(datos, dict) or not datos.get('archivo'):
+                raise ValueError("falta el campo 'archivo'")
+            id_trabajo = self.server.servicio.enviar(datos['archivo'], datos.get('hojas'),
+                                                     datos.get('directorio_salida'), datos.get('opciones'))
+        except ValueError as e:
+            self._responder(400, {'error': str(e)})
+            return
+        if datos.get('esperar', True):
+            self._responder(200, self.server.servicio.esperar(id_trabajo))
+        else:
+            self._responder(202, {'trabajo': id_trabajo})
+
+    def log_message(self, formato, *args):
+        logger.info(f"HTTP {self.address_string()} {formato % args}")
+
+
+def crear_servidor_http(servicio, host=HOST_SERVICIO, puerto=PUERTO_SERVICIO):
+    """
+    Crea el servidor HTTP local del servicio (cada petición se atiende en un hilo)
+
+    Returns:
+        ThreadingHTTPServer: Servidor listo para serve_forever()
+    """
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorHTTP)
+    servidor.servicio = servicio
+    return servidor
+
+
+def vigilar_carpeta(servicio, carpeta, evento_fin, intervalo=INTERVALO_CARPETA_ENTRADA):
+    """
+    Revisa una carpeta cada `intervalo` segundos y envía al servicio los archivos nuevos o modificados;
+    un archivo se envía cuando su tamaño y fecha no cambian entre dos revisiones, para no leer
+    libros que todavía se están copiando
+
+    Args:
+        servicio (ServicioValidacion): Servicio que valida los archivos
+        carpeta (str): Carpeta de entrada
+        evento_fin (threading.Event): Detiene la vigilancia cuando se activa
+        intervalo (float): Segundos entre revisiones
+    """
+    enviados = {}
+    candidatos = {}
+    while True:
+        for ruta in expandir_entradas([carpeta], servicio.directorio_salida):
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                continue
+            firma = (info.st_mtime_ns, info.st_size)
+            if enviados.get(ruta) == firma:
+                continue
+            if candidatos.get(ruta) != firma:
+                candidatos[ruta] = firma
+                continue
+            del candidatos[ruta]
+            enviados[ruta] = firma
+            try:
+                servicio.enviar(ruta)
+            except Exception as e:
+                logger.error(f"Error al enviar el archivo {ruta} de la carpeta de entrada: {str(e)}")
+                print(f"Error al enviar el archivo {ruta} de la carpeta de entrada: {str(e)}")
+        if evento_fin.wait(intervalo):
+            return
+
+
+def _terminar(numero_senal, marco):
+    """Convierte SIGTERM en KeyboardInterrupt para cerrar el servicio ordenadamente"""
+    raise KeyboardInterrupt
+
+
+def parsear_argumentos(argv=None):
+    """
+    Lee las opciones de línea de comandos del servicio
+
+    Args:
+        argv (list): Argumentos a interpretar; None usa sys.argv
+
+    Returns:
+        tuple: (argparse.Namespace con las opciones del servicio, lista de opciones por defecto de cada trabajo)
+    """
+    parser = argparse.ArgumentParser(
+        description="Servicio de validación con procesos precalentados",
+        epilog="Las opciones no reconocidas (p. ej. --incremental o --sin-snapshot) se aplican a cada trabajo")
+    parser.add_argument('--host', default=HOST_SERVICIO, help="Dirección del endpoint HTTP")
+    parser.add_argument('--puerto', type=int, default=PUERTO_SERVICIO, help="Puerto del endpoint HTTP")
+    parser.add_argument('--sin-http', action='store_true', help="No abre el endpoint HTTP (solo carpeta de entrada)")
+    parser.add_argument('--carpeta-entrada', help="Carpeta que se vigila para validar los libros que se dejen en ella")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_CARPETA_ENTRADA,
+                        help="Segundos entre revisiones de la carpeta de entrada")
+    parser.add_argument('--workers', type=int, default=WORKERS_SERVICIO, help="Cantidad de procesos precalentados")
+    parser.add_argument('--hojas', nargs='+', default=HOJAS_POR_DEFECTO,
+                        help="Hojas a validar cuando un trabajo no las indica")
+    parser.add_argument('--directorio-salida', default='resultados_servicio',
+                        help="Directorio de resultados; cada archivo escribe en un subdirectorio propio")
+    parser.add_argument('--log-detallado', action='store_true',
+                        help="Registra en el log una línea por cada celda con error")
+    args, opciones = parser.parse_known_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser mayor o igual a 1")
+    if args.sin_http and not args.carpeta_entrada:
+        parser.error("--sin-http requiere --carpeta-entrada")
+    try:
+        validar_opciones_archivo(opciones)
+    except ValueError as e:
+        parser.error(str(e))
+    return args, opciones
+
+
+def main(argv=None):
+    """
+    Arranca el servicio y atiende trabajos hasta recibir Ctrl+C o SIGTERM
+
+    Returns:
+        int: 0 al detenerse normalmente, 1 si no se pudo abrir el endpoint HTTP
+    """
+    args, opciones = parsear_argumentos(argv)
+    listener = configurar_logging(detalle=args.log_detallado)
+    METRICAS.reiniciar()
+    signal.signal(signal.SIGTERM, _terminar)
+
+    servicio = ServicioValidacion(args.workers, args.hojas, args.directorio_salida, opciones,
+                                  logging.getLogger(LOGGER_DETALLE).isEnabledFor(logging.WARNING))
+    evento_fin = threading.Event()
+    servidor = None
+    try:
+        servicio.iniciar()
+        if args.carpeta_entrada:
+            os.makedirs(args.carpeta_entrada, exist_ok=True)
+            threading.Thread(target=vigilar_carpeta, daemon=True,
+                             args=(servicio, args.carpeta_entrada, evento_fin, args.intervalo)).start()
+            print(f"Vigilando la carpeta de entrada: {args.carpeta_entrada}")
+        if args.sin_http:
+            evento_fin.wait()
+        else:
+            servidor = crear_servidor_http(servicio, args.host, args.puerto)
+            print(f"Escuchando en http://{args.host}:{servidor.server_address[1]}/validar")
+            logger.info(f"Servicio escuchando en {args.host}:{servidor.server_address[1]}")
+            servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nDeteniendo el servicio...")
+    except OSError as e:
+        mensaje = f"Error al abrir el endpoint HTTP {args.host}:{args.puerto}: {str(e)}"
+        logger.error(mensaje)
+        print(mensaje)
+        return 1
+    finally:
+        evento_fin.set()
+        if servidor is not None:
+            servidor.server_close()
+        servicio.detener()
+        os.makedirs(args.directorio_salida, exist_ok=True)
+        METRICAS.guardar_json(os.path.join(args.directorio_salida, ARCHIVO_METRICAS))
+        logger.info("Servicio de validación detenido.")
+        detener_logging(listener)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,15 +3,14 @@
 Módulo con todas las funciones de validación específicas
 """
 import pandas as pd
-from config import LIMITES_UG30, LIMITES_UG32, UNIDADES_VALIDAS, TIPOS_EVENTO_VALIDOS, RANGOS
+from config import LIMITES_POR_UNIDAD, UNIDADES_VALIDAS, TIPOS_EVENTO_VALIDOS, RANGOS
+from numeric_coercion import convertir_texto
 
 
 def obtener_limites(unidad):
     """Obtiene los límites según la unidad"""
-    if unidad == "UG3.0":
-        return LIMITES_UG30
-    elif unidad == "UG3.2":
-        return LIMITES_UG32
+    if isinstance(unidad, str) and unidad in LIMITES_POR_UNIDAD:
+        return LIMITES_POR_UNIDAD[unidad]
     return {'disponibilidad_max': None, 'bruta_max': None, 'total_carbon_max': None}
 
 
@@ -30,12 +29,20 @@ def validar_fecha(valor, nombre_columna):
         }
 
 
+def _entero_de_texto(valor):
+    """Convierte un texto escrito como entero (según los separadores de config); ValueError si no lo es"""
+    numero, es_entero = convertir_texto(valor)
+    if not es_entero:
+        raise ValueError(f"No es un entero: {valor!r}")
+    return int(numero)
+
+
 def validar_entero_rango(valor, min_val, max_val, nombre_columna):
     """Valida si un valor es un entero dentro de un rango"""
     if pd.isna(valor):
         return True, None
     try:
-        num = int(valor)
+        num = _entero_de_texto(valor) if isinstance(valor, str) else int(valor)
         if num < min_val or num > max_val:
             return False, {
                 'columna': nombre_columna,
@@ -56,7 +63,12 @@ def validar_numero_rango(valor, min_val, max_val, nombre_columna, es_porcentaje=
     if pd.isna(valor) or (isinstance(valor, str) and valor.strip() == ''):
         return True, None
     try:
-        num = float(valor)
+        if isinstance(valor, str):
+            num = convertir_texto(valor)[0]
+            if num is None:
+                raise ValueError(f"No es un número: {valor!r}")
+        else:
+            num = float(valor)
         if num < min_val or num > max_val:
             if es_porcentaje:
                 return False, {
@@ -86,35 +98,42 @@ def validar_numero_rango(valor, min_val, max_val, nombre_columna, es_porcentaje=
             }
 
 
-def validar_unidad(valor):
-    """Valida si la unidad es válida"""
+def validar_enum(valor, valores_validos, nombre_columna, separador=', '):
+    """Valida si un valor está entre los permitidos (convertido a entero si los permitidos son enteros)"""
     if pd.isna(valor):
         return True, None
-    if valor not in UNIDADES_VALIDAS:
-        return False, {
-            'columna': 'Unidad',
-            'valor': str(valor),
-            'regla': ' o '.join(UNIDADES_VALIDAS)
-        }
+    error = {
+        'columna': nombre_columna,
+        'valor': str(valor),
+        'regla': separador.join(map(str, valores_validos))
+    }
+    if all(isinstance(v, int) for v in valores_validos):
+        try:
+            valor = _entero_de_texto(valor) if isinstance(valor, str) else int(valor)
+        except:
+            return False, error
+    if valor not in valores_validos:
+        return False, error
     return True, None
 
 
+def validar_unidad(valor):
+    """Valida si la unidad es válida"""
+    return validar_enum(valor, UNIDADES_VALIDAS, 'Unidad', ' o ')
+
+
 def validar_tipo_evento(valor):
     """Valida si el tipo de evento es válido"""
-    if pd.isna(valor):
-        return True, None
-    try:
-        tipo = int(valor)
-        if tipo not in TIPOS_EVENTO_VALIDOS:
-            return False, {
-                'columna': 'Tipo de evento',
-                'valor': str(valor),
-                'regla': ', '.join(map(str, TIPOS_EVENTO_VALIDOS))
-            }
-        return True, None
-    except:
-        return False, {
-            'columna': 'Tipo de evento',
-            'valor': str(valor),
-            'regla': ', '.join(map(str, TIPOS_EVENTO_VALIDOS))
-        }
\ No newline at end of file
+    return validar_enum(valor, TIPOS_EVENTO_VALIDOS, 'Tipo de evento')
+
+
+def validar_segun_regla(valor, nombre_columna, tipo, parametros):
+    """Valida un valor con el validador correspondiente al tipo de regla compilada"""
+    if tipo == 'fecha':
+        return validar_fecha(valor, nombre_columna)
+    if tipo == 'entero':
+        return validar_entero_rango(valor, parametros['min'], parametros['max'], nombre_columna)
+    if tipo == 'numero':
+        return validar_numero_rango(valor, parametros['min'], parametros['max'], nombre_columna,
+                                    es_porcentaje=parametros.get('es_porcentaje', False))
+    return validar_enum(valor, parametros['valores'], nombre_columna, parametros.get('separador', ', '))
@@ -0,0 +1,303 @@
+"""
+Motor de validación vectorizado: evalúa cada regla una vez por columna
+con máscaras booleanas de NumPy/pandas en lugar de recorrer fila por fila
+"""
+import numpy as np
+import pandas as pd
+import time
+import logging
+from datetime import datetime
+from config import FORMATOS_FECHA
+from validators import validar_segun_regla
+from numeric_coercion import convertir_textos
+from rule_compiler import compilar_plan
+from error_matrix import MatrizErrores
+from metrics import METRICAS
+
+logger = logging.getLogger(__name__)
+
+
+def _evaluar_escalar(valores, validador):
+    """
+    Aplica un validador escalar a un arreglo de objetos, evaluando una sola vez
+    cada valor distinto (la clave incluye el tipo para no mezclar 1, 1.0 y True)
+
+    Returns:
+        tuple: (máscara de error, arreglo con la regla incumplida por elemento)
+    """
+    cache = {}
+    mascara = np.zeros(len(valores), dtype=bool)
+    reglas = np.empty(len(valores), dtype=object)
+    for i, valor in enumerate(valores):
+        clave = (type(valor), valor)
+        resultado = cache.get(clave)
+        if resultado is None:
+            valido, error = validador(valor)
+            resultado = cache[clave] = (valido, None if valido else error['regla'])
+        if not resultado[0]:
+            mascara[i] = True
+            reglas[i] = resultado[1]
+    return mascara, reglas
+
+
+def _mascara_numericos(valores):
+    """
+    Marca los elementos numéricos nativos (int, float, bool) de un arreglo de objetos,
+    que se pueden evaluar como float64; el resto requiere el validador escalar
+    """
+    return np.fromiter((isinstance(v, (int, float)) for v in valores),
+                       dtype=bool, count=len(valores))
+
+
+def _enum_entero(parametros):
+    """Indica si un enum compara enteros (int(valor)) en lugar de valores exactos"""
+    return all(isinstance(v, int) for v in parametros['valores'])
+
+
+def _errores_tipados(numeros, tipo, parametros):
+    """
+    Evalúa una regla sobre un arreglo float64 (1D o 2D); los NaN nunca son error
+
+    Returns:
+        np.ndarray: Máscara de error; la regla incumplida es siempre la del rango
+    """
+    if tipo == 'numero':
+        return (numeros < parametros['min']) | (numeros > parametros['max'])
+    if tipo == 'enum' and not _enum_entero(parametros):
+        # ningún número es igual a un código de texto
+        return ~np.isnan(numeros)
+
+    # int() trunca los decimales y falla con infinitos
+    enteros = np.trunc(numeros)
+    infinitos = np.isinf(numeros)
+    if tipo == 'entero':
+        return infinitos | (enteros < parametros['min']) | (enteros > parametros['max'])
+    return infinitos | (~np.isnan(numeros) & ~np.isin(enteros, parametros['valores']))
+
+
+def _fechas_validas(valores):
+    """
+    Marca las fechas que se reconocen sin inferir el formato: objetos datetime y textos
+    con alguno de FORMATOS_FECHA. Cada texto distinto se parsea una sola vez y cada
+    formato se aplica a la vez sobre todos los textos que siguen pendientes
+
+    Returns:
+        np.ndarray: Máscara de valores válidos; el resto requiere pd.to_datetime con inferencia
+    """
+    validas = np.fromiter((isinstance(v, datetime) for v in valores), dtype=bool, count=len(valores))
+    es_texto = np.fromiter((type(v) is str for v in valores), dtype=bool, count=len(valores))
+    if not es_texto.any():
+        return validas
+
+    codigos, textos = pd.factorize(valores[es_texto])
+    textos_validos = np.zeros(len(textos), dtype=bool)
+    for formato in FORMATOS_FECHA:
+        pendientes = np.flatnonzero(~textos_validos)
+        if not len(pendientes):
+            break
+        fechas = pd.to_datetime(pd.Series(textos[pendientes], dtype=object), format=formato, errors='coerce')
+        textos_validos[pendientes[fechas.notna().to_numpy()]] = True
+    validas[es_texto] = textos_validos[codigos]
+    return validas
+
+
+def _regla_rango(tipo, parametros):
+    """Texto de la regla incumplida cuando el valor numérico está fuera de rango"""
+    if tipo == 'numero':
+        if parametros.get('es_porcentaje', False):
+            return f"{parametros['min']}% a {parametros['max']}%"
+        return f"{parametros['min']} - {parametros['max']}"
+    if tipo == 'entero':
+        return f"Entero del {parametros['min']} al {parametros['max']}"
+    return parametros['separador'].join(map(str, parametros['valores']))
+
+
+def _regla_tipo(tipo, parametros):
+    """Texto de la regla incumplida cuando el valor no es un número (o un entero) válido"""
+    if tipo == 'numero':
+        return f"Número entre {parametros['min']} y {parametros['max']}"
+    return _regla_rango(tipo, parametros)
+
+
+def _errores_textos(textos, tipo, parametros):
+    """
+    Evalúa una regla numérica sobre textos convertidos en una sola pasada; los textos que no
+    son números (o enteros, en las reglas enteras) son error de tipo sin lanzar excepciones
+
+    Returns:
+        tuple: (máscara de error, arreglo con la regla incumplida por elemento)
+    """
+    numeros, validos, enteros = convertir_textos(textos)
+    reglas = np.empty(len(textos), dtype=object)
+    if tipo == 'numero':
+        # los textos en blanco son celdas vacías
+        vacios = np.fromiter((not t.strip() for t in textos), dtype=bool, count=len(textos))
+        convertibles = validos
+        tipo_invalido = ~validos & ~vacios
+    else:
+        convertibles = enteros
+        tipo_invalido = ~enteros
+    fuera_de_rango = np.zeros(len(textos), dtype=bool)
+    fuera_de_rango[convertibles] = _errores_tipados(numeros[convertibles], tipo, parametros)
+    reglas[fuera_de_rango] = _regla_rango(tipo, parametros)
+    reglas[tipo_invalido] = _regla_tipo(tipo, parametros)
+    return fuera_de_rango | tipo_invalido, reglas
+
+
+def _es_tipado(serie, tipo):
+    """Indica si la regla se puede evaluar directamente sobre el arreglo numérico de la serie"""
+    return tipo != 'fecha' and isinstance(serie.dtype, np.dtype) and serie.dtype.kind in 'biuf'
+
+
+def evaluar_regla(serie, tipo, parametros, columna):
+    """
+    Evalúa una regla sobre una columna completa
+
+    Args:
+        serie: Serie de pandas con los valores de la columna
+        tipo: Tipo de regla ('fecha', 'entero', 'numero', 'enum')
+        parametros: Parámetros de la regla compilada
+        columna: Nombre de la columna
+
+    Returns:
+        tuple: (máscara de error, arreglo con la regla incumplida por fila)
+    """
+    n = len(serie)
+    mascara = np.zeros(n, dtype=bool)
+    reglas = np.empty(n, dtype=object)
+
+    if tipo == 'fecha' and serie.dtype.kind == 'M':
+        return mascara, reglas
+
+    if _es_tipado(serie, tipo):
+        mascara = _errores_tipados(serie.to_numpy(dtype=np.float64), tipo, parametros)
+        reglas[mascara] = _regla_rango(tipo, parametros)
+        return mascara, reglas
+
+    valores = serie.to_numpy(dtype=object)
+    posiciones = np.flatnonzero(~pd.isna(valores))
+    valores = valores[posiciones]
+
+    if tipo == 'enum' and not _enum_entero(parametros):
+        sub_mascara = ~pd.Series(valores, dtype=object).isin(parametros['valores']).to_numpy()
+        mascara[posiciones[sub_mascara]] = True
+        reglas[mascara] = _regla_rango(tipo, parametros)
+        return mascara, reglas
+
+    if tipo != 'fecha':
+        es_numerico = _mascara_numericos(valores)
+        pos_numericos = posiciones[es_numerico]
+        if len(pos_numericos):
+            sub_mascara = _errores_tipados(valores[es_numerico].astype(np.float64), tipo, parametros)
+            mascara[pos_numericos[sub_mascara]] = True
+            reglas[pos_numericos[sub_mascara]] = _regla_rango(tipo, parametros)
+        posiciones = posiciones[~es_numerico]
+        valores = valores[~es_numerico]
+        es_texto = np.fromiter((type(v) is str for v in valores), dtype=bool, count=len(valores))
+        if es_texto.any():
+            sub_mascara, sub_reglas = _errores_textos(valores[es_texto], tipo, parametros)
+            pos_textos = posiciones[es_texto]
+            mascara[pos_textos[sub_mascara]] = True
+            reglas[pos_textos[sub_mascara]] = sub_reglas[sub_mascara]
+            posiciones = posiciones[~es_texto]
+            valores = valores[~es_texto]
+    else:
+        # solo las celdas que no tienen un formato conocido pasan por la inferencia
+        pendientes = ~_fechas_validas(valores)
+        posiciones = posiciones[pendientes]
+        valores = valores[pendientes]
+
+    if len(posiciones):
+        sub_mascara, sub_reglas = _evaluar_escalar(
+            valores, lambda valor: validar_segun_regla(valor, columna, tipo, parametros))
+        mascara[posiciones[sub_mascara]] = True
+        reglas[posiciones[sub_mascara]] = sub_reglas[sub_mascara]
+    return mascara, reglas
+
+
+def evaluar_paso(df, paso):
+    """
+    Evalúa un paso del plan sobre todas sus columnas; las columnas numéricas
+    se apilan en una matriz y se comparan contra los límites en una sola operación
+
+    Args:
+        df: DataFrame (o subconjunto de filas de una unidad) a validar
+        paso: PasoPlan con el tipo, los parámetros y las columnas
+
+    Yields:
+        tuple: (columna, orden, máscara de error, arreglo con la regla incumplida por fila)
+    """
+    tipadas = [col for col in paso.columnas if _es_tipado(df[col], paso.tipo)]
+    mascaras = {}
+    if len(tipadas) > 1:
+        matriz = _errores_tipados(df[tipadas].to_numpy(dtype=np.float64), paso.tipo, paso.parametros)
+        mascaras = dict(zip(tipadas, matriz.T))
+
+    for columna, orden in zip(paso.columnas, paso.ordenes):
+        if columna in mascaras:
+            mascara = mascaras[columna]
+            reglas = np.empty(len(mascara), dtype=object)
+            reglas[mascara] = _regla_rango(paso.tipo, paso.parametros)
+        else:
+            mascara, reglas = evaluar_regla(df[columna], paso.tipo, paso.parametros, columna)
+        yield columna, orden, mascara, reglas
+
+
+def _mascara_unidad(df, unidad):
+    """Máscara de filas cuya columna Unidad es igual a la unidad indicada"""
+    return (df['Unidad'].astype(object) == unidad).to_numpy(dtype=bool)
+
+
+def validar_dataframe_vectorizado(df):
+    """
+    Valida un DataFrame completo ejecutando el plan compilado para sus columnas
+
+    Args:
+        df: DataFrame a validar
+
+    Returns:
+        MatrizErrores: Errores de la hoja, en el mismo orden que el motor por filas
+    """
+    plan = compilar_plan(df.columns)
+
+    # tipo común con el que iterrows entregaría cada fila, para reproducir str(valor)
+    tipo_comun = df.iloc[:0].to_numpy().dtype
+    filas_por_unidad = {}
+
+    bloques = []
+    for paso in plan.pasos:
+        datos = df
+        if paso.unidad is not None:
+            if paso.unidad not in filas_por_unidad:
+                filas_por_unidad[paso.unidad] = np.flatnonzero(_mascara_unidad(df, paso.unidad))
+            datos = df.iloc[filas_por_unidad[paso.unidad]]
+
+        # el tiempo de cada columna incluye su parte de la evaluación y el texto de sus errores
+        inicio = time.perf_counter()
+        for columna, orden, mascara, textos_regla in evaluar_paso(datos, paso):
+            posiciones = np.flatnonzero(mascara)
+            if len(posiciones):
+                textos_regla = textos_regla[posiciones]
+                if paso.unidad is not None:
+                    posiciones = filas_por_unidad[paso.unidad][posiciones]
+
+                valores = df[columna].iloc[posiciones].to_numpy(dtype=tipo_comun)
+                bloques.append((posiciones, np.full(len(posiciones), orden),
+                                np.array([str(v) for v in valores], dtype=object), textos_regla))
+
+            METRICAS.registrar_regla(columna, paso.tipo, paso.unidad, time.perf_counter() - inicio,
+                                     len(datos), len(posiciones))
+            inicio = time.perf_counter()
+
+    if not bloques:
+        return MatrizErrores(df.index, plan.columnas_por_orden, [], [], [], [])
+
+    posiciones = np.concatenate([b[0] for b in bloques])
+    ordenes = np.concatenate([b[1] for b in bloques])
+
+    # mismo orden que el recorrido por filas: fila y luego orden de la regla
+    indice = np.lexsort((ordenes, posiciones))
+    return MatrizErrores(
+        df.index, plan.columnas_por_orden, posiciones[indice], ordenes[indice],
+        np.concatenate([b[2] for b in bloques])[indice], np.concatenate([b[3] for b in bloques])[indice]
+    )